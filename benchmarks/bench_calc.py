@@ -0,0 +1,50 @@
+"""Benchmarks for SASA calculations."""
+
+import freesasa
+
+from .common import bundledFile, bundledFiles, checkParameters, sizes, syntheticFile
+
+
+class CalcLeeRichards:
+    params = [sizes(), [10, 20, 50], [1, 4]]
+    param_names = ['atoms', 'n-slices', 'n-threads']
+
+    def setup(self, atoms, nSlices, nThreads):
+        self.structure = freesasa.Structure(syntheticFile(atoms))
+        self.parameters = freesasa.Parameters({'algorithm' : freesasa.LeeRichards,
+                                               'n-slices' : nSlices,
+                                               'n-threads' : nThreads})
+        checkParameters(self.parameters)
+        self.atoms = atoms
+
+    def time_calc(self, atoms, nSlices, nThreads):
+        freesasa.calc(self.structure, self.parameters)
+
+
+class CalcShrakeRupley:
+    params = [sizes(), [50, 100, 200], [1, 4]]
+    param_names = ['atoms', 'n-points', 'n-threads']
+
+    def setup(self, atoms, nPoints, nThreads):
+        self.structure = freesasa.Structure(syntheticFile(atoms))
+        self.parameters = freesasa.Parameters({'algorithm' : freesasa.ShrakeRupley,
+                                               'n-points' : nPoints,
+                                               'n-threads' : nThreads})
+        checkParameters(self.parameters)
+        self.atoms = atoms
+
+    def time_calc(self, atoms, nPoints, nThreads):
+        freesasa.calc(self.structure, self.parameters)
+
+
+class CalcBundled:
+    params = [bundledFiles, [freesasa.LeeRichards, freesasa.ShrakeRupley]]
+    param_names = ['file', 'algorithm']
+
+    def setup(self, fileName, algorithm):
+        self.structure = freesasa.Structure(bundledFile(fileName))
+        self.parameters = freesasa.Parameters({'algorithm' : algorithm})
+        self.atoms = self.structure.nAtoms()
+
+    def time_calc(self, fileName, algorithm):
+        freesasa.calc(self.structure, self.parameters)
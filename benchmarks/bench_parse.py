@@ -0,0 +1,32 @@
+"""Benchmarks for reading PDB files."""
+
+import freesasa
+
+from .common import bundledFile, bundledFiles, sizes, syntheticFile
+
+
+class Parse:
+    params = [sizes()]
+    param_names = ['atoms']
+
+    def setup(self, atoms):
+        self.fileName = syntheticFile(atoms)
+        self.atoms = atoms
+
+    def time_structure(self, atoms):
+        freesasa.Structure(self.fileName)
+
+    def time_structure_array(self, atoms):
+        freesasa.structureArray(self.fileName, {'separate-chains' : True})
+
+
+class ParseBundled:
+    params = [bundledFiles]
+    param_names = ['file']
+
+    def setup(self, fileName):
+        self.fileName = bundledFile(fileName)
+        self.atoms = freesasa.Structure(self.fileName).nAtoms()
+
+    def time_structure(self, fileName):
+        freesasa.Structure(self.fileName)
@@ -0,0 +1,42 @@
+"""Benchmarks for extracting and writing results."""
+
+import os
+import tempfile
+
+import freesasa
+
+from .common import sizes, syntheticFile
+
+
+class Results:
+    params = [sizes()]
+    param_names = ['atoms']
+
+    # residue areas are cached by the result, setup() is run before
+    # each repeat, and each repeat makes a single call
+    number = 1
+
+    selections = ('polar, symbol O+N', 'alanines, resn ala',
+                  'chainA, chain A', 'first, resi 1-10')
+
+    def setup(self, atoms):
+        self.structure = freesasa.Structure(syntheticFile(atoms))
+        self.result = freesasa.calc(self.structure)
+        self.atoms = atoms
+
+    def time_classify_results(self, atoms):
+        freesasa.classifyResults(self.result, self.structure)
+
+    def time_residue_areas(self, atoms):
+        self.result.residueAreas()
+
+    def time_select_area(self, atoms):
+        freesasa.selectArea(self.selections, self.structure, self.result)
+
+    def time_write_pdb(self, atoms):
+        fd, fileName = tempfile.mkstemp(suffix='.pdb')
+        os.close(fd)
+        try:
+            self.result.write_pdb(fileName)
+        finally:
+            os.remove(fileName)
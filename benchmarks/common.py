@@ -0,0 +1,118 @@
+"""
+Structures used by the benchmarks.
+
+The bundled structures are the PDB files in ``lib/tests/data``.
+Synthetic structures of any size are made by placing copies of
+1UBQ on a cubic grid, they have realistic atom densities and residue
+compositions, and are cached as PDB files in a temporary directory.
+"""
+
+import math
+import os
+import tempfile
+
+import freesasa
+
+dataDir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       os.pardir, 'lib', 'tests', 'data')
+
+cacheDir = os.path.join(tempfile.gettempdir(), 'freesasa-benchmarks')
+
+## Default sizes of synthetic structures, can be overridden by the
+## environment variable FREESASA_BENCHMARK_SIZES (comma-separated)
+defaultSizes = [1000, 10000, 100000, 1000000]
+
+## Bundled structures used by the benchmarks
+bundledFiles = ['1ubq.pdb', '1a0q.pdb']
+
+_chainLabels = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+
+# distance between the copies of the template on the grid, in Å
+_spacing = 45.0
+
+# the synthetic structures are only read with the default options,
+# unknown atoms (such as OXT) would otherwise give one warning per copy
+freesasa.setVerbosity(freesasa.nowarnings)
+
+
+def sizes():
+    """The sizes of synthetic structures to benchmark (number of atoms)."""
+    value = os.environ.get('FREESASA_BENCHMARK_SIZES')
+    if value:
+        return [int(size) for size in value.split(',')]
+    return defaultSizes
+
+
+def checkParameters(parameters):
+    """
+    Skip benchmarks with parameters the C library doesn't support.
+
+    Raises NotImplementedError, which asv and the runner treat as a
+    skipped benchmark, for example for several threads if the library
+    was built without thread support.
+    """
+    verbosity = freesasa.getVerbosity()
+    freesasa.setVerbosity(freesasa.silent)
+    try:
+        freesasa.calcCoord([0, 0, 0, 2, 0, 0], [1, 1], parameters)
+    except Exception:
+        raise NotImplementedError("Parameters not supported by this build")
+    finally:
+        freesasa.setVerbosity(verbosity)
+
+
+def bundledFile(name):
+    """Path to a bundled PDB file."""
+    return os.path.join(dataDir, name)
+
+
+def _templateAtoms():
+    atoms = []
+    with open(bundledFile('1ubq.pdb')) as f:
+        for line in f:
+            if line.startswith('ENDMDL'):
+                break
+            if line.startswith('ATOM'):
+                atoms.append(line.rstrip('\n').ljust(80))
+    return atoms
+
+
+def syntheticFile(nAtoms):
+    """
+    Path to a PDB file with exactly nAtoms atoms.
+
+    Each chain holds as many copies of the template as fit with
+    four-digit residue numbers.
+    """
+    fileName = os.path.join(cacheDir, 'synthetic-%d.pdb' % nAtoms)
+    if os.path.exists(fileName):
+        return fileName
+
+    atoms = _templateAtoms()
+    residues = sorted(set(int(line[22:26]) for line in atoms))
+    first, nResidues = residues[0], residues[-1] - residues[0] + 1
+    copiesPerChain = 9999 // nResidues
+    nCopies = -(-nAtoms // len(atoms))
+    side = int(math.ceil(nCopies ** (1.0/3)))
+    assert nCopies <= copiesPerChain * len(_chainLabels), "Too many atoms"
+
+    os.makedirs(cacheDir, exist_ok=True)
+    temporary = fileName + '.%d' % os.getpid()
+    with open(temporary, 'w') as f:
+        n = 0
+        for copy in range(nCopies):
+            chain = _chainLabels[copy // copiesPerChain]
+            offset = (copy % copiesPerChain) * nResidues - first + 1
+            dx, dy, dz = [_spacing * v for v in (copy % side, (copy // side) % side, copy // side**2)]
+            for line in atoms:
+                if n == nAtoms:
+                    break
+                n += 1
+                f.write('%s%5d%s%s%4d%s%8.3f%8.3f%8.3f%s\n' %
+                        (line[:6], (n - 1) % 99999 + 1, line[11:21], chain,
+                         int(line[22:26]) + offset, line[26:30],
+                         float(line[30:38]) + dx, float(line[38:46]) + dy,
+                         float(line[46:54]) + dz, line[54:]))
+        f.write('END\n')
+    os.replace(temporary, fileName)
+    return fileName
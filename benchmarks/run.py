@@ -0,0 +1,276 @@
+"""
+Runs the benchmarks and records the results as JSON.
+
+The benchmarks follow the conventions of asv_ (classes with
+``params``, ``setup()`` and ``time_*()`` methods in ``bench_*.py``),
+and can also be run with asv. This script runs them without other
+dependencies than the freesasa module itself. Each benchmark and set
+of parameters is run in a fresh process, so that the peak memory can
+be measured.
+
+Usage::
+
+    python benchmarks/run.py -o before.json
+    python benchmarks/run.py --sizes 1000,10000 --bench Calc -o after.json
+    python benchmarks/run.py --compare before.json after.json
+
+.. _asv: https://asv.readthedocs.io/
+"""
+
+import argparse
+import datetime
+import importlib
+import inspect
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+import traceback
+
+benchmarkDir = os.path.dirname(os.path.abspath(__file__))
+
+# the benchmarks are imported as the package 'benchmarks', like asv does
+sys.path.insert(0, os.path.dirname(benchmarkDir))
+
+
+def _peakMemory():
+    # peak resident set size of this process in bytes, None if unknown
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def findBenchmarks(pattern=None):
+    """
+    Find the benchmarks.
+
+    Args:
+        pattern (str): Only return benchmarks whose name matches this
+            regular expression.
+
+    Returns:
+        list: Tuples (name, module, class, method, params), with one
+        item per combination of parameters.
+    """
+    benchmarks = []
+    for fileName in sorted(os.listdir(benchmarkDir)):
+        if not (fileName.startswith('bench_') and fileName.endswith('.py')):
+            continue
+        moduleName = 'benchmarks.' + fileName[:-3]
+        module = importlib.import_module(moduleName)
+        for className, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != moduleName:
+                continue
+            for methodName in sorted(dir(cls)):
+                if not methodName.startswith('time_'):
+                    continue
+                name = '%s.%s.%s' % (fileName[:-3], className, methodName)
+                if pattern is not None and not re.search(pattern, name):
+                    continue
+                for params in itertools.product(*getattr(cls, 'params', [])):
+                    benchmarks.append((name, moduleName, className, methodName, params))
+    return benchmarks
+
+
+def _runBenchmark(moduleName, className, methodName, params, repeat, connection):
+    try:
+        cls = getattr(importlib.import_module(moduleName), className)
+        benchmark = cls()
+        method = getattr(benchmark, methodName)
+        number = getattr(cls, 'number', 1)
+        times = []
+        memoryBefore = None
+        for i in range(repeat):
+            if hasattr(benchmark, 'setup'):
+                benchmark.setup(*params)
+            if memoryBefore is None:
+                memoryBefore = _peakMemory()
+            start = time.perf_counter()
+            for j in range(number):
+                method(*params)
+            times.append((time.perf_counter() - start) / number)
+            if hasattr(benchmark, 'teardown'):
+                benchmark.teardown(*params)
+        memoryAfter = _peakMemory()
+        connection.send({
+            'times' : times,
+            'atoms' : getattr(benchmark, 'atoms', None),
+            'peakMemory' : memoryAfter,
+            'peakMemoryIncrease' : memoryAfter - memoryBefore if memoryAfter is not None else None
+        })
+    except NotImplementedError as e:
+        connection.send({'skipped' : str(e)})
+    except BaseException:
+        connection.send({'error' : traceback.format_exc()})
+    finally:
+        connection.close()
+
+
+def runBenchmark(benchmark, repeat=5):
+    """
+    Run a benchmark from :py:func:`findBenchmarks()` in a new process.
+
+    Args:
+        benchmark (tuple): The benchmark.
+        repeat (int): Number of times to time the benchmark.
+
+    Returns:
+        dict: The results, see :py:func:`main()`.
+    """
+    name, moduleName, className, methodName, params = benchmark
+    cls = getattr(importlib.import_module(moduleName), className)
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_runBenchmark,
+                              args=(moduleName, className, methodName, params, repeat, sender))
+    process.start()
+    sender.close()
+    try:
+        outcome = receiver.recv()
+    except EOFError:
+        outcome = {'error' : 'Process exited with code %s' % process.exitcode}
+    process.join()
+
+    result = {'name' : name,
+              'params' : dict(zip(getattr(cls, 'param_names', []), params))}
+    result.update(outcome)
+    if 'times' in outcome:
+        result['time'] = min(outcome['times'])
+        result['atomsPerSecond'] = outcome['atoms'] / result['time'] \
+            if outcome['atoms'] and result['time'] > 0 else None
+    return result
+
+
+def _version():
+    try:
+        from importlib.metadata import version
+        return version('freesasa')
+    except Exception:
+        return None
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=benchmarkDir,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def _formatParams(params):
+    return ', '.join(['%s=%s' % item for item in params.items()])
+
+
+def _formatResult(result):
+    if 'error' in result:
+        return 'failed'
+    if 'skipped' in result:
+        return 'skipped (%s)' % result['skipped']
+    text = '%10.3f ms' % (1000 * result['time'])
+    if result['atomsPerSecond'] is not None:
+        text += '  %12.0f atoms/s' % result['atomsPerSecond']
+    if result['peakMemory'] is not None:
+        text += '  %8.1f MB peak' % (result['peakMemory'] / 2.0**20)
+    return text
+
+
+def compare(before, after, threshold=0.1):
+    """
+    Compare two result files and print the change in run time.
+
+    Args:
+        before (str): Name of the JSON file with the old results.
+        after (str): Name of the JSON file with the new results.
+        threshold (float): Relative change in time that is reported
+            as slower or faster.
+
+    Returns:
+        int: Number of benchmarks that became slower.
+    """
+    with open(before) as f:
+        old = dict(((r['name'], _formatParams(r['params'])), r) for r in json.load(f)['benchmarks'])
+    with open(after) as f:
+        new = json.load(f)['benchmarks']
+    slower = 0
+    for result in new:
+        key = (result['name'], _formatParams(result['params']))
+        if key not in old or 'time' not in old[key] or 'time' not in result:
+            continue
+        ratio = result['time'] / old[key]['time']
+        change = ''
+        if ratio > 1 + threshold:
+            change = 'slower'
+            slower += 1
+        elif ratio < 1 - threshold:
+            change = 'faster'
+        print('%-50s %-40s %10.3f ms %10.3f ms %6.2f  %s' %
+              (key + (1000 * old[key]['time'], 1000 * result['time'], ratio, change)))
+    return slower
+
+
+def main(argv=None):
+    """
+    Run the benchmarks, or compare results.
+
+    The JSON output has information about the environment, and a list
+    ``'benchmarks'`` with one item per benchmark and set of parameters,
+    with the keys ``'name'``, ``'params'``, ``'times'`` (seconds per
+    call, for each repeat), ``'time'`` (the minimum), ``'atoms'``,
+    ``'atomsPerSecond'``, ``'peakMemory'`` and ``'peakMemoryIncrease'``
+    (bytes, the peak resident set size of the process, and how much it
+    grew while timing). Benchmarks that failed have an ``'error'``
+    instead, and benchmarks that aren't supported by the build (their
+    ``setup()`` raised ``NotImplementedError``) have ``'skipped'``.
+    """
+    parser = argparse.ArgumentParser(description='Run the freesasa benchmarks.')
+    parser.add_argument('-o', '--output', help='write results to this JSON file')
+    parser.add_argument('-b', '--bench', help='only run benchmarks matching this regular expression')
+    parser.add_argument('--sizes', help='comma-separated sizes of synthetic structures (number of atoms)')
+    parser.add_argument('--repeat', type=int, default=5, help='number of times each benchmark is timed')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two result files instead of running benchmarks')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change reported as slower or faster when comparing')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(args.compare[0], args.compare[1], args.threshold) > 0 else 0
+
+    if args.sizes:
+        # read by the benchmarks when imported, also in the child processes
+        os.environ['FREESASA_BENCHMARK_SIZES'] = args.sizes
+
+    results = []
+    for benchmark in findBenchmarks(args.bench):
+        result = runBenchmark(benchmark, args.repeat)
+        results.append(result)
+        print('%-50s %-40s %s' % (result['name'], _formatParams(result['params']),
+                                  _formatResult(result)))
+        if 'error' in result:
+            print(result['error'], file=sys.stderr)
+        sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'date' : datetime.datetime.now().isoformat(),
+                       'freesasa' : _version(),
+                       'commit' : _commit(),
+                       'python' : sys.version,
+                       'platform' : platform.platform(),
+                       'cpuCount' : os.cpu_count(),
+                       'repeat' : args.repeat,
+                       'benchmarks' : results}, f, indent=1)
+
+    return 1 if any('error' in result for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+import asyncio
+import types
+import weakref
+
+# Coroutine counterparts of the blocking functions, they are exported
+# as the submodule freesasa.aio (see the end of this file). The work
+# is done by a shared pool of threads, the C library releases the GIL
+# while calculating. The number of calculations in progress is bounded
+# per event loop by a semaphore, that is only released when the work
+# is done (not when the caller stops waiting for it).
+
+# maximum number of calculations in progress per event loop, see
+# setMaxInFlight()
+cdef int _aio_max_in_flight = 0
+
+cdef object _aio_executor = None
+cdef object _aio_lock = threading.Lock()
+
+# semaphores bounding the calculations in progress, by event loop
+cdef object _aio_semaphores = weakref.WeakKeyDictionary()
+
+def _aioSetMaxInFlight(n):
+    """
+    Set the maximum number of calculations in progress.
+
+    Coroutines that would exceed it wait for a calculation to finish
+    before they start, without blocking the event loop. The limit
+    applies per event loop, and is also the number of threads that
+    do the work. Defaults to the number of CPUs.
+
+    Calculations already in progress are not affected.
+
+    Args:
+        n (int): Maximum number of calculations, or None for the default.
+
+    Raises:
+        AssertionError: if n isn't positive
+    """
+    global _aio_max_in_flight, _aio_executor
+    assert n is None or n > 0, "Maximum must be positive"
+    with _aio_lock:
+        _aio_max_in_flight = n or 0
+        if _aio_executor is not None:
+            _aio_executor.shutdown(wait=False)
+        _aio_executor = None
+        _aio_semaphores.clear()
+
+def _aioGetMaxInFlight():
+    """
+    The maximum number of calculations in progress, see :py:func:`.aio.setMaxInFlight`.
+
+    Returns:
+        int: The maximum.
+    """
+    return _aio_max_in_flight or os.cpu_count() or 1
+
+# The semaphore for the loop and the executor
+cdef tuple _aio_slots(loop):
+    global _aio_executor
+    with _aio_lock:
+        if _aio_executor is None:
+            _aio_executor = ThreadPoolExecutor(max_workers=_aioGetMaxInFlight(),
+                                               thread_name_prefix='freesasa-aio')
+        semaphore = _aio_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = _aio_semaphores[loop] = asyncio.Semaphore(_aioGetMaxInFlight())
+        return semaphore, _aio_executor
+
+cdef _aio_release(loop, semaphore):
+    try:
+        loop.call_soon_threadsafe(semaphore.release)
+    except RuntimeError:
+        # the loop is closed
+        pass
+
+async def _aioRun(function, *args, timeout=None, **kwargs):
+    """
+    Call a function in a worker thread.
+
+    Waits until fewer than :py:func:`.aio.getMaxInFlight` calculations
+    are in progress first.
+
+    If the coroutine is cancelled, or the timeout expires, before the
+    function has started, it isn't called. A function that has started
+    can't be interrupted, it runs to completion in the background and
+    its result is discarded. It counts towards the maximum until done.
+
+    Args:
+        function: The function.
+        args: Its positional arguments.
+        timeout (float): Seconds to wait, for a free slot and the result
+            together, no limit if None.
+        kwargs: Its keyword arguments.
+
+    Returns:
+        The return value of the function.
+
+    Raises:
+        asyncio.TimeoutError: if the timeout expires
+        asyncio.CancelledError: if cancelled
+        Exception: what the function raises
+    """
+    loop = asyncio.get_running_loop()
+    semaphore, executor = _aio_slots(loop)
+
+    async def submit():
+        await semaphore.acquire()
+        try:
+            future = executor.submit(function, *args, **kwargs)
+        except BaseException:
+            semaphore.release()
+            raise
+        future.add_done_callback(lambda _: _aio_release(loop, semaphore))
+        return await asyncio.wrap_future(future)
+
+    # one deadline for waiting for a slot and for the result
+    return await asyncio.wait_for(submit(), timeout)
+
+async def _aioLoadStructure(input, classifier=None, options=Structure.defaultOptions,
+                            timeout=None):
+    """
+    Read a structure, see :py:class:`.Structure`.
+
+    Args:
+        input: File name or file-like object, see :py:class:`.Structure`.
+        classifier: :py:class:`.Classifier` to use (default if not specified).
+        options (dict): Options, see :py:attr:`.Structure.defaultOptions`.
+        timeout (float): Seconds to wait, no limit if None.
+
+    Returns:
+        :py:class:`.Structure`: The structure.
+    """
+    return await _aioRun(Structure, input, classifier, options, timeout=timeout)
+
+async def _aioCalc(structure, parameters=None, incremental=False, tree=True, timeout=None):
+    """
+    Calculate SASA, see :py:func:`freesasa.calc`.
+
+    Args:
+        structure: :py:class:`.Structure` to use.
+        parameters: :py:class:`.Parameters` to use (defaults if not specified).
+        incremental (bool): See :py:func:`freesasa.calc`.
+        tree (bool): See :py:func:`freesasa.calc`.
+        timeout (float): Seconds to wait, no limit if None.
+
+    Returns:
+        :py:class:`.Result`: The result.
+    """
+    return await _aioRun(calc, structure, parameters, incremental, tree, timeout=timeout)
+
+async def _aioCalcCoord(coord, radii, parameters=None, timeout=None):
+    """
+    Calculate SASA for coordinates and radii, see :py:func:`freesasa.calcCoord`.
+
+    Args:
+        coord: Coordinates, see :py:func:`freesasa.calcCoord`.
+        radii: Radii, see :py:func:`freesasa.calcCoord`.
+        parameters: :py:class:`.Parameters` to use (defaults if not specified).
+        timeout (float): Seconds to wait, no limit if None.
+
+    Returns:
+        :py:class:`.Result`: The result.
+    """
+    return await _aioRun(calcCoord, coord, radii, parameters, timeout=timeout)
+
+async def _aioResidueAreas(result, timeout=None):
+    """
+    Residue areas of a result, see :py:meth:`.Result.residueAreas`.
+
+    Args:
+        result: :py:class:`.Result` from :py:func:`.aio.calc`.
+        timeout (float): Seconds to wait, no limit if None.
+
+    Returns:
+        dict: See :py:meth:`.Result.residueAreas`.
+    """
+    return await _aioRun(result.residueAreas, timeout=timeout)
+
+async def _aioClassifyResults(result, structure, classifier=None, timeout=None):
+    """
+    Break a result down into classes, see :py:func:`freesasa.classifyResults`.
+
+    Args:
+        result: :py:class:`.Result` to classify.
+        structure: :py:class:`.Structure` used in the calculation.
+        classifier: :py:class:`.Classifier` to use (default if not specified).
+        timeout (float): Seconds to wait, no limit if None.
+
+    Returns:
+        dict: See :py:func:`freesasa.classifyResults`.
+    """
+    return await _aioRun(classifyResults, result, structure, classifier, timeout=timeout)
+
+async def _aioSelectArea(commands, structure, result, timeout=None):
+    """
+    Area of selections, see :py:func:`freesasa.selectArea`.
+
+    Args:
+        commands (list): Selection commands.
+        structure: :py:class:`.Structure` used in the calculation.
+        result: :py:class:`.Result`.
+        timeout (float): Seconds to wait, no limit if None.
+
+    Returns:
+        dict: See :py:func:`freesasa.selectArea`.
+    """
+    return await _aioRun(selectArea, commands, structure, result, timeout=timeout)
+
+aio = types.ModuleType('freesasa.aio', """
+Coroutines for asyncio applications
+
+The blocking functions of the module, with coroutine counterparts that
+do the work in a pool of threads, so that the event loop isn't
+blocked. The number of calculations in progress is bounded, see
+:py:func:`.aio.setMaxInFlight`, and each coroutine accepts a timeout.
+""")
+for _name, _function in (('calc', _aioCalc),
+                         ('calcCoord', _aioCalcCoord),
+                         ('classifyResults', _aioClassifyResults),
+                         ('getMaxInFlight', _aioGetMaxInFlight),
+                         ('loadStructure', _aioLoadStructure),
+                         ('residueAreas', _aioResidueAreas),
+                         ('run', _aioRun),
+                         ('selectArea', _aioSelectArea),
+                         ('setMaxInFlight', _aioSetMaxInFlight)):
+    _function.__name__ = _function.__qualname__ = _name
+    _function.__module__ = aio.__name__
+    setattr(aio, _name, _function)
+del _name, _function
+sys.modules[aio.__name__] = aio
@@ -0,0 +1,129 @@
+import sys
+from array import array
+from cpython.buffer cimport PyBUF_WRITABLE
+
+# Formats a memoryview can report for native float64 data
+_double_formats = ('d', '@d', '=d', '<d' if sys.byteorder == 'little' else '>d')
+
+# Returns a flat read-only float64 memoryview of obj. Objects that
+# export a C-contiguous float64 buffer (NumPy arrays, array.array('d'),
+# memoryviews, ...) are used without copying, any number of
+# dimensions is accepted. Everything else is treated as a flat
+# sequence of numbers and copied.
+cdef object _double_view(obj):
+    try:
+        view = memoryview(obj)
+    except TypeError:
+        return memoryview(array('d', obj))
+
+    if view.format in _double_formats and view.c_contiguous:
+        if view.ndim != 1:
+            view = view.cast('B').cast('d')
+        return view
+
+    if view.ndim > 1:
+        raise ValueError("Multidimensional arrays need to be C-contiguous with dtype float64")
+
+    return memoryview(array('d', view.tolist()))
+
+# Returns the strings in values as a tuple (data, width), where data
+# is a flat byte buffer with one string per width bytes, shorter
+# strings padded by null bytes. One-dimensional fixed-width byte
+# arrays (struct format '<width>s', for example from
+# Structure.atomNames() or NumPy arrays with dtype 'S4') are used
+# without copying. Other sequences may contain str or bytes, and
+# int if allow_int is set.
+cdef object _string_array(values, bint allow_int=False):
+    try:
+        view = memoryview(values)
+    except TypeError:
+        view = None
+
+    if view is not None and view.ndim == 1 and view.c_contiguous and \
+       view.format.lstrip('@=<>!').rstrip('s').isdigit() and view.format.endswith('s'):
+        return view.cast('B'), view.itemsize
+
+    encoded = []
+    for value in values:
+        if isinstance(value, bytes):
+            encoded.append(value)
+        elif isinstance(value, str):
+            encoded.append(value.encode('ascii'))
+        elif allow_int and isinstance(value, int):
+            encoded.append(b'%d' % value)
+        else:
+            raise Exception("Invalid value '%s', must be a string" % (value,)
+                            + (" or integer" if allow_int else ""))
+
+    width = max([1] + [len(value) for value in encoded])
+    return b''.join([value.ljust(width, b'\0') for value in encoded]), width
+
+# Read-only buffer exporter for memory owned by another object (for
+# example the per-atom areas of a Result). The owner is kept alive
+# as long as the buffer is in use. If exports is set, the counter it
+# points to (in the owner) is incremented while the buffer is in use,
+# so that the owner can refuse to reallocate the memory.
+cdef class _ArrayView:
+    cdef object _owner
+    cdef const void *_data
+    cdef Py_ssize_t *_exports
+    cdef bytes _format
+    cdef Py_ssize_t _itemsize
+    cdef int _ndim
+    cdef Py_ssize_t _shape[3]
+    cdef Py_ssize_t _strides[3]
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        cdef Py_ssize_t length = self._itemsize
+        cdef int i
+
+        if flags & PyBUF_WRITABLE:
+            raise BufferError("Array is read-only")
+
+        for i in range(self._ndim):
+            length *= self._shape[i]
+
+        buffer.buf = <void*> self._data
+        buffer.obj = self
+        buffer.len = length
+        buffer.readonly = 1
+        buffer.itemsize = self._itemsize
+        buffer.format = <char*> self._format
+        buffer.ndim = self._ndim
+        buffer.shape = self._shape
+        buffer.strides = self._strides
+        buffer.suboffsets = NULL
+        buffer.internal = NULL
+
+        if self._exports is not NULL:
+            self._exports[0] += 1
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        if self._exports is not NULL:
+            self._exports[0] -= 1
+
+cdef double _empty_array[1]
+
+# Returns a read-only memoryview of the C-contiguous array data
+# with the given struct format and shape (at most 3 dimensions).
+# See _ArrayView for exports.
+cdef object _array_view(owner, const void *data, format, Py_ssize_t itemsize, shape,
+                        Py_ssize_t *exports=NULL):
+    cdef _ArrayView view = _ArrayView()
+    cdef Py_ssize_t stride = itemsize
+    cdef int i
+
+    assert(len(shape) <= 3)
+
+    view._owner = owner
+    view._data = data if data is not NULL else <void*> _empty_array
+    view._exports = exports
+    view._format = format.encode('ascii')
+    view._itemsize = itemsize
+    view._ndim = len(shape)
+    for i in reversed(range(view._ndim)):
+        view._shape[i] = shape[i]
+        view._strides[i] = stride
+        stride *= shape[i]
+
+    return memoryview(view)
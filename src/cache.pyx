@@ -0,0 +1,334 @@
+import hashlib
+import mmap
+import struct
+import threading
+from cfreesasa cimport *
+
+# Cache files start with a magic string (which includes the format
+# version), the number of atoms and the total area, followed by the
+# atom areas as native doubles. The header is 24 bytes so that the
+# areas are aligned when the file is memory-mapped.
+_cache_header = struct.Struct('=8sqd')
+_cache_magic = b'FSASAC01'
+_cache_suffix = '.sasa'
+
+# When the cache is too large, entries are removed until it is below
+# this fraction of the maximum size
+_cache_low_water = 0.9
+
+# Other processes (or Cache objects) can write to the same directory,
+# the total size is read from the directory again each time this
+# fraction of the maximum size has been written by this object
+_cache_rescan_fraction = 0.05
+
+# the cache consulted by calc(), see setCache()
+cdef object _result_cache = None
+
+def setCache(cache):
+    """
+    Set the cache of results used by :py:func:`.calc`.
+
+    While a cache is set, :py:func:`.calc` (and thereby also
+    :py:func:`.calcMany` and :py:func:`.calcBioPDB`) first looks for
+    the result in the cache, and stores the results it calculates
+    there. See :py:class:`.Cache`. No cache is used by default.
+
+    Args:
+        cache: A :py:class:`.Cache`, or None to stop using a cache.
+    """
+    global _result_cache
+    assert cache is None or isinstance(cache, Cache), "Not a Cache"
+    _result_cache = cache
+
+def getCache():
+    """
+    Get the cache of results used by :py:func:`.calc`.
+
+    Returns:
+        :py:class:`.Cache`: The cache, or None if no cache is set.
+    """
+    return _result_cache
+
+# What identifies the classifier of a structure (the one used to
+# classify the atoms in the result tree, radii are hashed separately)
+cdef object _classifier_identity(Structure structure):
+    cdef Classifier classifier = structure._classifier
+    if classifier is None:
+        return 'default'
+    if classifier._standard is not None:
+        return ('standard', classifier._standard)
+    if classifier._config is not None:
+        return ('config', hashlib.sha256(classifier._config).hexdigest())
+    return 'default'
+
+# A result with the atom areas sasa (which are copied), for the
+# structure and parameters it was calculated for
+cdef Result _cached_result(const double[::1] sasa, double total, structure, parameters):
+    cdef Result result = Result()
+    cdef freesasa_result c_result
+
+    c_result.n_atoms = sasa.shape[0]
+    c_result.total = total
+    c_result.sasa = <double*> &sasa[0]
+    if parameters is not None:
+        c_result.parameters = (<Parameters> parameters)._c_param
+    else:
+        c_result.parameters = freesasa_default_parameters
+    result._c_result = freesasa_result_clone(&c_result)
+    if result._c_result is NULL:
+        raise MemoryError()
+    result._setStructure(structure)
+    return result
+
+class Cache:
+    """
+    A persistent cache of results on disk.
+
+    Results are stored by a hash of everything that determines them:
+    the coordinates, radii, atom and residue names and numbers, and
+    chain labels of the structure, the classifier that classifies the
+    atoms (the default, a standard or a config-file classifier), the
+    algorithm, probe radius and resolution. The number of threads
+    doesn't change the results and is not included. A result found in
+    the cache is returned without calculating anything.
+
+    Each entry is a file in the cache directory, with the atom areas
+    stored as an array of native doubles, that is memory-mapped when
+    read. Residue areas are derived from the atom areas and the
+    structure when used, as for any result (see :py:func:`.calc`).
+
+    The cache is consulted by :py:func:`.calc` once set with
+    :py:func:`.setCache`, and can also be used directly ::
+
+        cache = freesasa.Cache('/tmp/sasa-cache', maxSize=2**30)
+        freesasa.setCache(cache)
+        result = freesasa.calc(structure)   # calculated and stored
+        result = freesasa.calc(structure)   # from the cache
+
+    Several threads and processes can use the same directory at the
+    same time. Entries are written to temporary files that are renamed
+    when complete, so that entries are never read partially written,
+    and entries removed by another process while being looked up are
+    treated as missing. When the total size of the entries exceeds
+    `maxSize` the least recently used entries are removed. Each
+    :py:class:`.Cache` object counts what it writes, and reads the
+    total size from the directory again after writing a twentieth of
+    `maxSize`, so that writers sharing a directory together exceed
+    `maxSize` by at most a twentieth of it each.
+
+    Args:
+        directory (str): The cache directory, created if needed.
+        maxSize (int): The maximum total size of the entries in bytes.
+
+    Raises:
+        AssertionError: if `maxSize` isn't positive
+        OSError: if the directory can't be created
+    """
+
+    def __init__(self, directory, maxSize=2**30):
+        assert maxSize > 0, "Maximum size must be positive"
+        self.directory = os.fspath(directory)
+        self.maxSize = maxSize
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        # estimated total size, updated when entries are written
+        # here and from the directory when entries are evicted or
+        # after writing _cache_rescan_fraction * maxSize bytes
+        self._size = self._scan()[0]
+        self._written = 0
+
+    def key(self, structure, parameters=None):
+        """
+        The key of the result for a structure and parameters.
+
+        Args:
+            structure: A :py:class:`.Structure`.
+            parameters: :py:class:`.Parameters` (defaults if not specified).
+
+        Returns:
+            str: A hexadecimal SHA-256 hash.
+        """
+        if parameters is None:
+            parameters = Parameters()
+        header, parts = _structureState(structure)
+        algorithm = parameters.algorithm()
+        resolution = parameters.nSlices() if algorithm == LeeRichards else parameters.nPoints()
+        h = hashlib.sha256()
+        h.update(repr((_cache_magic, sys.byteorder, structure.nAtoms(), header[3],
+                       _classifier_identity(structure), algorithm,
+                       parameters.probeRadius(), resolution)).encode('ascii'))
+        for part in parts:
+            h.update(part)
+        return h.hexdigest()
+
+    def get(self, structure, parameters=None):
+        """
+        Look up the result for a structure and parameters.
+
+        Args:
+            structure: A :py:class:`.Structure`.
+            parameters: :py:class:`.Parameters` (defaults if not specified).
+
+        Returns:
+            :py:class:`.Result`: The result, or None if it isn't in the cache.
+        """
+        path = self._path(self.key(structure, parameters))
+        result = None
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size > _cache_header.size:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    try:
+                        magic, n, total = _cache_header.unpack_from(data)
+                        if magic == _cache_magic and n == structure.nAtoms() and \
+                           size == _cache_header.size + n * sizeof(double):
+                            with memoryview(data) as view:
+                                with view[_cache_header.size:].cast('d') as areas:
+                                    result = _cached_result(areas, total, structure, parameters)
+                    finally:
+                        data.close()
+        except FileNotFoundError:
+            pass
+        if result is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        try:
+            # the modification time orders the entries for eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    def put(self, structure, parameters, result):
+        """
+        Store the result for a structure and parameters.
+
+        Args:
+            structure: The :py:class:`.Structure` the result was calculated for.
+            parameters: The :py:class:`.Parameters` used (None for defaults).
+            result: The :py:class:`.Result`.
+
+        Raises:
+            AssertionError: if the result doesn't have one area per atom
+            OSError: if the entry can't be written
+        """
+        assert result.nAtoms() == structure.nAtoms(), "Result doesn't match the structure"
+        path = self._path(self.key(structure, parameters))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        size = _cache_header.size + result.nAtoms() * sizeof(double)
+        try:
+            with open(temporary, 'wb') as f:
+                f.write(_cache_header.pack(_cache_magic, result.nAtoms(), result.totalArea()))
+                with result.atomAreas() as areas:
+                    f.write(areas)
+            try:
+                # an entry that is replaced doesn't add to the size
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(temporary, path)
+        except BaseException:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._size += size - replaced
+            self._written += size
+            rescan = self._written >= _cache_rescan_fraction * self.maxSize
+            if rescan:
+                self._written = 0
+        if rescan:
+            size = self._scan()[0]
+            with self._lock:
+                self._size = size
+        if self._size > self.maxSize:
+            self._evict()
+
+    def cacheInfo(self):
+        """
+        Statistics for the cache.
+
+        Returns:
+            dict: Number of results found (``'hits'``) and not found
+            (``'misses'``) by :py:meth:`.Cache.get()` in this process,
+            the number of entries (``'entries'``), their total size in
+            bytes (``'size'``) and :py:attr:`.maxSize` (``'maxSize'``).
+        """
+        size, entries = self._scan()
+        return {'hits' : self._hits,
+                'misses' : self._misses,
+                'entries' : len(entries),
+                'size' : size,
+                'maxSize' : self.maxSize}
+
+    def clear(self):
+        """Remove all entries and reset the statistics."""
+        with self._lock:
+            for mtime, size, path in self._scan()[1]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
+            self._written = 0
+            self._hits = 0
+            self._misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + _cache_suffix)
+
+    # The total size of the entries, and a list of (modification
+    # time, size, path) for each entry
+    def _scan(self):
+        entries = []
+        total = 0
+        for directory in os.scandir(self.directory):
+            if len(directory.name) != 2 or not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if not entry.name.endswith(_cache_suffix):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        return total, entries
+
+    # Removes the least recently used entries until the cache is
+    # smaller than _cache_low_water * maxSize
+    def _evict(self):
+        with self._lock:
+            self._written = 0
+            size, entries = self._scan()
+            if size > self.maxSize:
+                entries.sort()
+                for mtime, entry_size, path in entries:
+                    if size <= _cache_low_water * self.maxSize:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        # in use (on Windows)
+                        continue
+                    size -= entry_size
+            self._size = size
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
@@ -1,6 +1,6 @@
 from libc.stdio cimport FILE
 
-cdef extern from "freesasa.h":
+cdef extern from "freesasa.h" nogil:
     ctypedef enum freesasa_algorithm:
         FREESASA_LEE_RICHARDS, FREESASA_SHRAKE_RUPLEY
 
@@ -35,6 +35,7 @@ cdef extern from "freesasa.h":
         double total
         double *sasa
         int n_atoms
+        freesasa_parameters parameters
 
     ctypedef struct freesasa_nodearea:
         const char *name
@@ -49,7 +50,9 @@ cdef extern from "freesasa.h":
         pass
 
     ctypedef enum freesasa_nodetype:
-        pass
+        FREESASA_NODE_ATOM, FREESASA_NODE_RESIDUE, FREESASA_NODE_CHAIN,
+        FREESASA_NODE_STRUCTURE, FREESASA_NODE_RESULT, FREESASA_NODE_ROOT,
+        FREESASA_NODE_NONE
 
     ctypedef struct freesasa_classifier:
         pass
@@ -144,6 +147,13 @@ cdef extern from "freesasa.h":
 
     int freesasa_structure_n(freesasa_structure *structure)
 
+    int freesasa_structure_n_residues(const freesasa_structure *structure)
+
+    int freesasa_structure_residue_atoms(const freesasa_structure *structure,
+                                         int r_i,
+                                         int *first,
+                                         int *last)
+
     void freesasa_structure_free(freesasa_structure* structure)
 
     const double* freesasa_structure_radius(const freesasa_structure *structure)
@@ -186,6 +196,9 @@ cdef extern from "freesasa.h":
 
     char freesasa_structure_atom_chain(const freesasa_structure *structure, int i)
 
+    const char* freesasa_structure_atom_symbol(const freesasa_structure *structure,
+                                               int i)
+
     const double* freesasa_structure_coord_array(const freesasa_structure *structure)
 
 
@@ -238,5 +251,80 @@ cdef extern from "freesasa.h":
 
     const freesasa_result * freesasa_node_structure_result(const freesasa_node *node)
 
-cdef extern from "freesasa_internal.h":
+cdef extern from "coord.h" nogil:
+    ctypedef struct coord_t:
+        pass
+
+    coord_t* freesasa_coord_new_linked(const double *xyz, int n)
+
+    void freesasa_coord_free(coord_t *coord)
+
+cdef extern from "nb.h" nogil:
+    ctypedef struct nb_list:
+        int n
+        int **nb
+        int *nn
+
+    nb_list *freesasa_nb_new(const coord_t *coord, const double *radii)
+
+    void freesasa_nb_free(nb_list *nb)
+
+cdef extern from "freesasa_internal.h" nogil:
     int freesasa_write_pdb(FILE *output, freesasa_node *structure)
+
+    int freesasa_warn(const char *format, ...)
+
+    freesasa_result* freesasa_result_clone(const freesasa_result *result)
+
+    const freesasa_nodearea freesasa_nodearea_null
+
+    int freesasa_atom_nodearea(freesasa_nodearea *area,
+                               const freesasa_structure *structure,
+                               const freesasa_result *result,
+                               int atom_index)
+
+    void freesasa_add_nodearea(freesasa_nodearea *sum,
+                               const freesasa_nodearea *term)
+
+    const coord_t* freesasa_structure_xyz(const freesasa_structure *structure)
+
+    int freesasa_shrake_rupley(double *sasa,
+                               const coord_t *c,
+                               const double *radii,
+                               const freesasa_parameters *param)
+
+    int freesasa_lee_richards(double *sasa,
+                              const coord_t *c,
+                              const double *radii,
+                              const freesasa_parameters *param)
+
+cdef extern from "selection.h" nogil:
+    ctypedef enum expression_type:
+        E_SELECTION, E_SYMBOL, E_NAME, E_RESN, E_RESI, E_CHAIN,
+        E_ID, E_NUMBER, E_NEGNUM, E_AND, E_OR, E_NOT,
+        E_PLUS, E_RANGE, E_RANGE_OPEN_L, E_RANGE_OPEN_R
+
+    ctypedef struct expression:
+        expression *left
+        expression *right
+        expression_type type
+        char *value
+
+cdef extern from "parser.h" nogil:
+    ctypedef void* freesasa_yyscan_t
+
+    int freesasa_yyparse(expression **expression, freesasa_yyscan_t scanner)
+
+cdef extern from "lexer.h" nogil:
+    ctypedef struct yy_buffer_state:
+        pass
+
+    ctypedef yy_buffer_state *YY_BUFFER_STATE
+
+    int freesasa_yylex_init(freesasa_yyscan_t *scanner)
+
+    YY_BUFFER_STATE freesasa_yy_scan_string(const char *yy_str, freesasa_yyscan_t scanner)
+
+    void freesasa_yy_delete_buffer(YY_BUFFER_STATE b, freesasa_yyscan_t scanner)
+
+    int freesasa_yylex_destroy(freesasa_yyscan_t scanner)
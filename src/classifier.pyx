@@ -1,5 +1,8 @@
+import copyreg
+from collections import OrderedDict
 from cfreesasa cimport *
-from libc.stdio cimport FILE, fopen, fclose
+from libc.stdio cimport FILE
+from cpython cimport array as carray
 
 cdef class Classifier:
     """
@@ -15,6 +18,23 @@ cdef class Classifier:
 
     Residue names should be of the format ``"ALA"``, ``"ARG"``, etc.
     Atom names should be of the format ``"CA"``, ``"N"``, etc.
+
+    When the radii and classes of a derived classifier are used by
+    the module (:py:meth:`.Structure.setRadiiWithClassifier()`,
+    :py:func:`.classifyResults()`, :py:func:`.structureFromBioPDB()`)
+    they can be cached by residue and atom name, so that
+    :py:meth:`.Classifier.radius()` and :py:meth:`.Classifier.classify()`
+    are only called once per distinct atom. The cache is off by
+    default, derived classifiers whose output only depends on the two
+    names can enable it by setting :py:attr:`.cacheSize`. The cache
+    then holds at most :py:attr:`.cacheSize` atoms, when it's full the
+    least recently used atom is dropped. Call
+    :py:meth:`.Classifier.clearCache()` if the output changes.
+
+    Attributes:
+        purePython: Set to ``True`` in derived classifiers
+        cacheSize: Maximum number of atoms in the cache of a derived
+            classifier, 0 (the default) disables the cache
     """
     # this reference is used for classification
     cdef const freesasa_classifier *_c_classifier
@@ -23,36 +43,69 @@ cdef class Classifier:
     # with a reference in _c_classifier (for the sake of const-correctness)
     cdef freesasa_classifier *_dynamic_c_classifier
 
+    # the configuration _dynamic_c_classifier was read from, and the
+    # name of standard classifiers, see __reduce__()
+    cdef bytes _config
+    cdef str _standard
+
+    # cache for derived classifiers, maps residue and atom name to a
+    # slot in the arrays below, least recently used first, see
+    # _cacheSlot()
+    cdef object _cache
+
+    # radius of each slot (NaN if not looked up yet)
+    cdef carray.array _cache_radius
+
+    # class of each slot (None if not looked up yet)
+    cdef list _cache_class
+
+    cdef Py_ssize_t _cache_hits
+    cdef Py_ssize_t _cache_misses
+
     # to be used by derived classes
     purePython = False
 
+    cacheSize = 0
+
+    def __cinit__(self, *args, **kwargs):
+        self._cache = OrderedDict()
+        self._cache_radius = array('d')
+        self._cache_class = []
+        self._cache_hits = 0
+        self._cache_misses = 0
+
     def __init__ (self, fileName=None):
         """Constructor.
 
         If no file is provided the default classifier is used.
 
         Args:
-            fileName (str): Name of file with classifier configuration.
+            fileName: Name of file with classifier configuration, or
+                the configuration in a buffer or file-like object
+                (see :py:class:`.Structure` for the types supported).
 
         Raises:
             IOError:   Problem opening/reading file
             Exception: Problem parsing provided configuration or
                        initializing defaults
         """
-        cdef FILE *config
+        cdef _Input config
 
         self._c_classifier = NULL
         self._dynamic_c_classifier = NULL
 
         if fileName is not None:
-            config = fopen(fileName, 'rb')
-            if config is NULL:
-                raise IOError("File '%s' could not be opened." % fileName)
-            self._dynamic_c_classifier = freesasa_classifier_from_file(config)
-            fclose(config)
+            config = _Input(fileName)
+            self._dynamic_c_classifier = freesasa_classifier_from_file(config.file())
+            if config._source is not None:
+                self._config = bytes(config._source)
+            config.close()
             self._c_classifier = self._dynamic_c_classifier;
             if self._c_classifier is NULL:
-                raise Exception("Error parsing configuration in '%s'." % fileName)
+                raise Exception("Error parsing configuration in '%s'." % config.name)
+            if self._config is None:
+                with open(config.name, 'rb') as f:
+                    self._config = f.read()
 
         else:
             self._c_classifier = &freesasa_default_classifier
@@ -85,8 +138,21 @@ cdef class Classifier:
             classifier._c_classifier = &freesasa_protor_classifier
         else:
             raise Exception("Uknown classifier '%s'" % type)
+        classifier._standard = type
         return classifier
 
+    def __reduce__(self):
+        # derived classifiers are pickled as normal Python objects,
+        # C classifiers by the configuration they were created from
+        if not self._isCClassifier():
+            return (copyreg.__newobj__, (type(self),), getattr(self, '__dict__', None))
+        if self._standard is not None:
+            return (Classifier.getStandardClassifier, (self._standard,))
+        if self._config is not None:
+            # bytes would be read as a file name
+            return (Classifier, (bytearray(self._config),))
+        return (Classifier, ())
+
     # This is used internally to determine if a Classifier wraps a C
     # classifier or not (necessary when generating structures)
     # returns Boolean
@@ -126,6 +192,101 @@ cdef class Classifier:
         """
         return freesasa_classifier_radius(self._c_classifier, residueName, atomName)
 
+    def cacheInfo(self):
+        """Statistics for the radius and class cache.
+
+        Only derived classifiers use the cache (see above).
+
+        Returns:
+            dict: Number of lookups found in the cache (``'hits'``),
+            number of calls to :py:meth:`.Classifier.radius()` or
+            :py:meth:`.Classifier.classify()` (``'misses'``), current
+            number of atoms in cache (``'size'``) and
+            :py:attr:`.cacheSize` (``'maxSize'``).
+        """
+        return {'hits' : self._cache_hits,
+                'misses' : self._cache_misses,
+                'size' : len(self._cache),
+                'maxSize' : self.cacheSize}
+
+    def clearCache(self):
+        """Empty the radius and class cache and reset its statistics."""
+        self._clearCache()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    cdef _clearCache(self):
+        self._cache.clear()
+        carray.resize(self._cache_radius, 0)
+        del self._cache_class[:]
+
+    # Returns the cache slot of the given atom, adding it if
+    # necessary, in the slot of the least recently used atom if the
+    # cache is full. Returns -1 if the cache is disabled. Slots are
+    # only valid until the next call to Python code (that could
+    # reuse them).
+    cdef Py_ssize_t _cacheSlot(self, atom) except -2:
+        cdef Py_ssize_t slot = self._cache.get(atom, -1)
+        if slot >= 0:
+            self._cache.move_to_end(atom)
+            return slot
+        if self.cacheSize <= 0:
+            if len(self._cache) > 0:
+                self._clearCache()
+            return -1
+        if len(self._cache) > self.cacheSize:
+            # cacheSize was lowered
+            self._clearCache()
+        if len(self._cache) == self.cacheSize:
+            slot = self._cache.popitem(last=False)[1]
+            self._cache_radius.data.as_doubles[slot] = float('nan')
+            self._cache_class[slot] = None
+        else:
+            slot = len(self._cache)
+            self._cache_radius.append(float('nan'))
+            self._cache_class.append(None)
+        self._cache[atom] = slot
+        return slot
+
+    # Radius of atom, for derived classifiers cached
+    cdef double _cachedRadius(self, residueName, atomName) except? -1:
+        cdef Py_ssize_t slot
+        cdef double radius
+        if self._isCClassifier():
+            return freesasa_classifier_radius(self._c_classifier, residueName, atomName)
+        atom = (residueName, atomName)
+        slot = self._cache.get(atom, -1)
+        if slot >= 0:
+            radius = self._cache_radius.data.as_doubles[slot]
+            if radius == radius: # not NaN
+                self._cache_hits += 1
+                self._cache.move_to_end(atom)
+                return radius
+        self._cache_misses += 1
+        radius = self.radius(residueName, atomName)
+        slot = self._cacheSlot(atom)
+        if slot >= 0:
+            self._cache_radius.data.as_doubles[slot] = radius
+        return radius
+
+    # Class of atom, for derived classifiers cached
+    cdef _cachedClass(self, residueName, atomName):
+        cdef Py_ssize_t slot
+        if self._isCClassifier():
+            return self.classify(residueName, atomName)
+        atom = (residueName, atomName)
+        slot = self._cache.get(atom, -1)
+        if slot >= 0 and self._cache_class[slot] is not None:
+            self._cache_hits += 1
+            self._cache.move_to_end(atom)
+            return self._cache_class[slot]
+        self._cache_misses += 1
+        name = self.classify(residueName, atomName)
+        slot = self._cacheSlot(atom)
+        if slot >= 0:
+            self._cache_class[slot] = name
+        return name
+
     # the address obtained is a pointer to const
     def _get_address(self, size_t ptr2ptr):
         cdef freesasa_classifier **p = <freesasa_classifier**> ptr2ptr
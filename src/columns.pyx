@@ -0,0 +1,341 @@
+import ast
+import tempfile
+import time
+import zipfile
+from cfreesasa cimport *
+from libc.string cimport memset
+
+# The tables and columns written by ColumnWriter, with the struct
+# format of each column ('s' for fixed-width byte strings, as wide as
+# the longest value)
+_column_tables = (
+    ('structures', (('name', 's'), ('nAtoms', 'q'), ('nResidues', 'q'), ('totalArea', 'd'),
+                    ('firstAtom', 'q'), ('firstResidue', 'q'))),
+    ('atoms', (('structure', 'i'), ('chain', 's'), ('residueNumber', 's'), ('residueName', 's'),
+               ('atomName', 's'), ('radius', 'd'), ('area', 'd'))),
+    ('residues', (('structure', 'i'), ('chain', 's'), ('residueNumber', 's'), ('residueType', 's'))
+                 + tuple([(field, 'd') for field in _residue_area_fields])
+                 + (('hasRelativeAreas', '?'),)),
+)
+
+_npy_magic = b'\x93NUMPY'
+
+# Fixed size of zip local file headers, and of the zip64 extra field
+# in the local header of members written with force_zip64
+_zip_header_size = 30
+_zip64_extra_size = 20
+
+# Id of the extra field used to pad local headers (as by zipalign)
+_zip_padding_id = 0xd935
+_npy_order = '<' if sys.byteorder == 'little' else '>'
+
+# NumPy type descriptions of the column formats, and back
+_npy_descr = {'d' : _npy_order + 'f8', 'q' : _npy_order + 'i8', 'i' : _npy_order + 'i4', '?' : '|b1'}
+_npy_format = {descr : format for format, descr in _npy_descr.items()}
+
+# Header of a version 1.0 .npy file for a one-dimensional array,
+# padded so that the data is aligned to 64 bytes
+cdef bytes _npy_header(format, Py_ssize_t width, Py_ssize_t n):
+    descr = '|S%d' % width if format == 's' else _npy_descr[format]
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (descr, n)
+    padding = 64 - (len(_npy_magic) + 4 + len(header) + 1) % 64
+    header = (header + ' ' * (padding % 64) + '\n').encode('ascii')
+    return _npy_magic + b'\x01\x00' + struct.pack('<H', len(header)) + header
+
+# Copies n strings of the given width, padded by null bytes to new_width
+cdef bytes _pad_strings(const unsigned char[::1] data, Py_ssize_t n, Py_ssize_t width,
+                        Py_ssize_t new_width):
+    cdef Py_ssize_t i
+    padded = PyBytes_FromStringAndSize(NULL, n * new_width)
+    cdef char *p = PyBytes_AS_STRING(padded)
+    if n > 0:
+        memset(p, 0, n * new_width)
+    for i in range(n):
+        memcpy(&p[i * new_width], &data[i * width], width)
+    return padded
+
+# A column of a ColumnWriter. Values are buffered in memory, and
+# spilled to a temporary file in chunks. String columns get wider
+# when wider values are added, chunks that were spilled narrower are
+# padded when the file is written.
+class _Column:
+    def __init__(self, format, directory):
+        self.format = format
+        self.itemsize = 1 if format == 's' else struct.calcsize(format)
+        self.buffer = bytearray()
+        self.n = 0
+        self.n_buffered = 0
+        # (width, number of values) of each spilled chunk
+        self.chunks = []
+        self.spill = tempfile.TemporaryFile(dir=directory)
+
+    def append(self, data, Py_ssize_t n, Py_ssize_t width=0):
+        if self.format == 's':
+            if width > self.itemsize:
+                self.buffer = bytearray(_pad_strings(self.buffer, self.n_buffered,
+                                                     self.itemsize, width))
+                self.itemsize = width
+            elif width < self.itemsize:
+                data = _pad_strings(data, n, width, self.itemsize)
+        self.buffer += data
+        self.n += n
+        self.n_buffered += n
+
+    def flush(self):
+        if self.n_buffered > 0:
+            self.spill.write(self.buffer)
+            self.chunks.append((self.itemsize, self.n_buffered))
+            self.buffer = bytearray()
+            self.n_buffered = 0
+
+    def write(self, output):
+        self.flush()
+        output.write(_npy_header(self.format, self.itemsize, self.n))
+        self.spill.seek(0)
+        # whole values at a time, about 16 MB
+        for width, n in self.chunks:
+            block = max(1, 2**24 // width)
+            while n > 0:
+                k = min(n, block)
+                data = self.spill.read(k * width)
+                if width < self.itemsize:
+                    data = _pad_strings(data, k, width, self.itemsize)
+                output.write(data)
+                n -= k
+
+    def close(self):
+        self.spill.close()
+
+class ColumnWriter:
+    """
+    Writes the areas of many results to one file, in columns.
+
+    Each result added with :py:meth:`.ColumnWriter.add` appends a row
+    to the table ``structures``, one row per atom to the table
+    ``atoms`` and one row per residue to the table ``residues``. The
+    values are kept in memory until about `chunkSize` bytes have been
+    added, and then moved to temporary files next to the output, so
+    that results can be streamed to the writer without keeping them.
+
+    The output is written by :py:meth:`.ColumnWriter.close` as an
+    uncompressed NumPy ``.npz`` file, with one array per column, named
+    ``'<table>.<column>'``. It can be read with
+    :py:func:`.readColumns` (without NumPy), or with ``numpy.load()``
+    (as ``data['atoms.area']`` etc.) ::
+
+        with freesasa.ColumnWriter('areas.npz') as writer:
+            for fileName, result in freesasa.calcMany(fileNames):
+                writer.add(result, fileName)
+
+    The columns are
+
+    - ``structures``: ``name``, ``nAtoms``, ``nResidues``,
+      ``totalArea``, and the rows of the first atom and residue of the
+      structure in the other tables, ``firstAtom`` and ``firstResidue``.
+    - ``atoms``: ``structure`` (row in ``structures``), ``chain``,
+      ``residueNumber``, ``residueName``, ``atomName``, ``radius``,
+      ``area``.
+    - ``residues``: ``structure``, ``chain``, ``residueNumber``,
+      ``residueType``, and the areas, as from
+      :py:meth:`.Result.residueAreaColumns`.
+
+    Strings are stored as null-padded bytes, as wide as the longest
+    value in the column. Residue numbers and residue types are
+    stripped, atom and residue names in ``atoms`` are not.
+
+    Args:
+        fileName (str): The output file.
+        chunkSize (int): Bytes of values kept in memory before they
+            are moved to temporary files.
+
+    Raises:
+        AssertionError: if `chunkSize` isn't positive
+    """
+
+    def __init__(self, fileName, chunkSize=2**26):
+        assert chunkSize > 0, "Chunk size must be positive"
+        self.fileName = os.fspath(fileName)
+        self.chunkSize = chunkSize
+        directory = os.path.dirname(os.path.abspath(self.fileName))
+        self._columns = {(table, name) : _Column(format, directory)
+                         for table, columns in _column_tables for name, format in columns}
+        self._n_structures = 0
+        self._n_atoms = 0
+        self._n_residues = 0
+        self._buffered = 0
+        self._closed = False
+
+    def add(self, result, name=None):
+        """
+        Append the areas of a result.
+
+        Args:
+            result: :py:class:`.Result` from :py:func:`.calc` (also
+                unpickled or cached), the areas of atoms and residues
+                need the structure it was calculated for.
+            name (str): Name of the structure, the number of the
+                result (counting from 0) if not specified.
+
+        Raises:
+            AssertionError: if the writer is closed, or the result has
+                no structure
+        """
+        cdef Result r = result
+        assert not self._closed, "Writer is closed"
+        structure = r._structure
+        assert structure is not None, "Result has no structure, use a result from calc()"
+        residues = result.residueAreaColumns()
+        n_atoms = structure.nAtoms()
+        n_residues = len(residues['chain'])
+        index = self._n_structures
+        columns = self._columns
+
+        def append(table, column, values, n):
+            data, width = values if isinstance(values, tuple) else (values, 0)
+            columns[table, column].append(data, n, width)
+
+        def strings(values):
+            view = memoryview(values)
+            return view.cast('B'), view.itemsize
+
+        if name is None:
+            name = str(index)
+        append('structures', 'name', _string_array([name.encode('utf-8')]), 1)
+        append('structures', 'nAtoms', array('q', [n_atoms]), 1)
+        append('structures', 'nResidues', array('q', [n_residues]), 1)
+        append('structures', 'totalArea', array('d', [result.totalArea()]), 1)
+        append('structures', 'firstAtom', array('q', [self._n_atoms]), 1)
+        append('structures', 'firstResidue', array('q', [self._n_residues]), 1)
+
+        append('atoms', 'structure', array('i', [index]) * n_atoms, n_atoms)
+        append('atoms', 'chain', strings(structure.chainLabels()), n_atoms)
+        append('atoms', 'residueNumber', strings(structure.residueNumbers()), n_atoms)
+        append('atoms', 'residueName', strings(structure.residueNames()), n_atoms)
+        append('atoms', 'atomName', strings(structure.atomNames()), n_atoms)
+        append('atoms', 'radius', structure.radii(), n_atoms)
+        with result.atomAreas() as areas:
+            append('atoms', 'area', areas, n_atoms)
+
+        append('residues', 'structure', array('i', [index]) * n_residues, n_residues)
+        for column in ('chain', 'residueNumber', 'residueType'):
+            append('residues', column, _string_array(residues[column]), n_residues)
+        for column in _residue_area_fields + ('hasRelativeAreas',):
+            append('residues', column, residues[column], n_residues)
+
+        self._n_structures += 1
+        self._n_atoms += n_atoms
+        self._n_residues += n_residues
+        self._buffered = sum([len(column.buffer) for column in columns.values()])
+        if self._buffered >= self.chunkSize:
+            for column in columns.values():
+                column.flush()
+            self._buffered = 0
+
+    def close(self):
+        """
+        Write the output file and remove the temporary files.
+
+        Does nothing if already closed.
+
+        Raises:
+            OSError: if the file can't be written
+        """
+        if self._closed:
+            return
+        self._closed = True
+        temporary = '%s.%d.%d.tmp' % (self.fileName, os.getpid(), threading.get_ident())
+        try:
+            with zipfile.ZipFile(temporary, 'w', zipfile.ZIP_STORED, allowZip64=True) as output:
+                for (table, name), column in self._columns.items():
+                    # the local header is padded so that the data is
+                    # aligned when the file is memory-mapped
+                    member = zipfile.ZipInfo('%s.%s.npy' % (table, name), time.localtime()[:6])
+                    size = output.fp.tell() + _zip_header_size + len(member.filename) \
+                        + _zip64_extra_size + 4
+                    member.extra = struct.pack('<HH', _zip_padding_id, -size % 64) + bytes(-size % 64)
+                    with output.open(member, 'w', force_zip64=True) as f:
+                        column.write(f)
+            os.replace(temporary, self.fileName)
+        except BaseException:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            raise
+        finally:
+            self._discard()
+
+    def _discard(self):
+        self._closed = True
+        for column in self._columns.values():
+            column.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # nothing is written if the block failed
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+        return False
+
+def readColumns(fileName):
+    """
+    Read the columns written by :py:class:`.ColumnWriter`.
+
+    The file is memory-mapped, and the columns refer directly to the
+    mapped data, i.e. nothing is read until it is used. The columns
+    support the buffer protocol, e.g. ``numpy.asarray(columns['atoms']['area'])``.
+
+    Reads one-dimensional arrays in any uncompressed ``.npz`` file, with
+    native byte order and the NumPy types used by the writer.
+
+    Args:
+        fileName (str): The file.
+
+    Returns:
+        dict: The tables, each a dict of columns, read-only
+        memoryviews with one value per row. String columns have the
+        struct format `'<width>s'`.
+
+    Raises:
+        AssertionError: if the file contains arrays that can't be read
+        OSError: if the file can't be read
+    """
+    cdef const unsigned char[::1] data
+    cdef Py_ssize_t offset, n
+    with open(fileName, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # the columns keep the view, and thereby the mapping, alive
+    view = memoryview(mapped)
+    data = view
+    tables = {}
+    with zipfile.ZipFile(fileName) as archive:
+        for info in archive.infolist():
+            assert info.compress_type == zipfile.ZIP_STORED, "Compressed array '%s'" % info.filename
+            assert info.filename.endswith('.npy'), "Not an array '%s'" % info.filename
+            # the local header has a fixed size part, the file name and an extra field
+            name_length, extra_length = struct.unpack_from('<HH', view, info.header_offset + 26)
+            offset = info.header_offset + _zip_header_size + name_length + extra_length
+            assert bytes(view[offset:offset + 8]) == _npy_magic + b'\x01\x00', \
+                "Unsupported array '%s'" % info.filename
+            header_length = struct.unpack_from('<H', view, offset + 8)[0]
+            header = ast.literal_eval(bytes(view[offset + 10:offset + 10 + header_length]).decode('latin1'))
+            offset += 10 + header_length
+            descr, shape = header['descr'], header['shape']
+            assert not header['fortran_order'] and len(shape) == 1, \
+                "Unsupported array '%s'" % info.filename
+            n = shape[0]
+            if descr.startswith('|S'):
+                format, itemsize = descr[2:] + 's', int(descr[2:])
+            else:
+                assert descr in _npy_format, "Unsupported type '%s' of '%s'" % (descr, info.filename)
+                format = _npy_format[descr]
+                itemsize = struct.calcsize(format)
+            assert offset + n * itemsize <= len(view), "Truncated array '%s'" % info.filename
+            table, _, column = info.filename[:-len('.npy')].rpartition('.')
+            tables.setdefault(table, {})[column] = \
+                _array_view(view, &data[offset] if n > 0 else NULL, format, itemsize, (n,))
+    return tables
@@ -8,15 +8,29 @@
 The :py:mod:`freesasa` python module wraps the FreeSASA `C API`_
 """
 
+import heapq
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from libc.stdio cimport FILE, fopen, fclose
 from libc.stdlib cimport free, realloc, malloc
 from libc.string cimport memcpy
 from cfreesasa cimport *
 
+include "buffers.pyx"
+include "input.pyx"
 include "parameters.pyx"
 include "result.pyx"
 include "classifier.pyx"
 include "structure.pyx"
+include "selection.pyx"
+include "incremental.pyx"
+include "interface.pyx"
+include "tiled.pyx"
+include "shared.pyx"
+include "stats.pyx"
+include "cache.pyx"
+include "columns.pyx"
+include "aio.pyx"
 
 ## Used for classification
 polar = 'Polar'
@@ -37,13 +51,29 @@ normal = FREESASA_V_NORMAL
 debug = FREESASA_V_DEBUG
 
 
-def calc(structure,parameters=None):
+def calc(structure,parameters=None,incremental=False,tree=True):
     """
     Calculate SASA of Structure
 
+    With `tree=False` the tree of residue and chain areas used by
+    :py:meth:`.Result.residueAreas()`, :py:meth:`.Result.residueAreaColumns()`
+    and :py:meth:`.Result.write_pdb()` is built the first time it is
+    needed, so that results that are only used for total or atom
+    areas don't pay for it. The result then keeps a reference to the
+    structure, which must not be changed (atoms added, coordinates or
+    radii set) until the tree has been built, these functions raise
+    `AssertionError` otherwise.
+
     Args:
         structure: :py:class:`.Structure` to be used
         parameters: :py:class:`.Parameters` to use (if not specified defaults are used)
+        incremental (bool): Keep the state needed to update the result
+            after changes to the structure, see :py:meth:`.Result.update()`
+        tree (bool): Build the tree of residue and chain areas
+            directly (default), or on first use if `False`.
+
+    If a cache has been set with :py:func:`.setCache`, the result is
+    taken from the cache if it is there, and stored in it otherwise.
 
     Returns:
         :py:class:`.Result`: The results
@@ -53,14 +83,70 @@ def calc(structure,parameters=None):
     """
     cdef const freesasa_parameters *p = NULL
     cdef const freesasa_structure *s = NULL
+    cdef freesasa_result *c_result
+    cdef freesasa_node *c_root_node = NULL
+    cdef dict stats = None
+    cdef bint c_tree = tree
+    cdef Result result = None
+    cache = _result_cache
     if parameters is not None:  parameters._get_address(<size_t>&p)
     structure._get_address(<size_t>&s)
-    result = Result()
-    result._c_result = <freesasa_result*> freesasa_calc_structure(s,p)
-    result._c_root_node = <freesasa_node*> freesasa_tree_init(result._c_result,
-                                                              s, "Structure")
-    if result._c_result is NULL:
-        raise Exception("Error calculating SASA.")
+
+    if cache is not None:
+        start = _clock()
+        result = cache.get(structure, parameters)
+        if result is not None and _stats_enabled:
+            stats = {'atoms' : result.nAtoms(), 'cacheHit' : True, 'cacheTime' : _clock() - start}
+            result._stats = stats
+        if result is not None and c_tree:
+            result._rootNode()
+
+    if result is None:
+        if _stats_enabled:
+            stats = _calcStats(s, p)
+            start = _clock()
+
+        with nogil:
+            c_result = freesasa_calc_structure(s,p)
+
+        if stats is not None:
+            # the neighbour list is built as part of the calculation
+            stats['sasaTime'] = max(0, _clock() - start - stats['neighbourTime'])
+            start = _clock()
+
+        if c_tree:
+            with nogil:
+                if c_result is not NULL:
+                    c_root_node = freesasa_tree_init(c_result, s, "Structure")
+
+        result = Result()
+        result._c_result = c_result
+        result._c_root_node = c_root_node
+        if result._c_result is NULL:
+            raise Exception("Error calculating SASA.")
+        result._setStructure(structure)
+
+        if stats is not None:
+            if c_tree:
+                stats['treeTime'] = _clock() - start
+            result._stats = stats
+
+        if cache is not None:
+            if stats is not None:
+                stats['cacheHit'] = False
+            try:
+                cache.put(structure, parameters, result)
+            except OSError as e:
+                _warn("couldn't store result in cache: %s" % e)
+
+    if parameters is not None:
+        result._error_model = (<Parameters> parameters)._error_model
+
+    if stats is not None:
+        _reportStats('calc', result.stats())
+
+    if incremental:
+        result._incremental = _incremental_state(s, p)
 
     return result
 
@@ -68,42 +154,415 @@ def calcCoord(coord, radii, parameters=None):
     """
     Calculate SASA for a set of coordinates and radii
 
+    Arrays that support the buffer protocol and hold C-contiguous
+    float64 data (NumPy arrays, `array.array('d')`, memoryviews) are
+    passed on to the C library without copying. This includes
+    coordinates of shape `(N, 3)`. Other sequences are copied.
+
     Args:
         coord (list): array of size 3*N with atomic coordinates
            `(x1, y1, z1,  x2, y2, z2, ..., x_N, y_N, z_N)`.
         radii (list): array of size N with atomic radii `(r_1, r_2, ..., r_N)`.
         parameters: :py:class:`.Parameters` to use (if not specified, defaults are used)
     Raises:
-        AssertionError: mismatched array-sizes
-        Exception: Out of memory
+        AssertionError: mismatched or empty arrays
+        ValueError: multidimensional array that isn't C-contiguous float64
         Exception: something went wrong in calculation (see C library error messages)
     """
-    assert(len(coord) == 3*len(radii))
-
+    cdef const double[::1] c = _double_view(coord)
+    cdef const double[::1] r = _double_view(radii)
     cdef const freesasa_parameters *p = NULL
-    cdef double *c = <double*> malloc(len(coord)*sizeof(double))
-    cdef double *r = <double*> malloc(len(radii)*sizeof(double))
-    if c is NULL or r is NULL:
-        raise Exception("Memory allocation error")
+    cdef freesasa_result *c_result
+    cdef int n = r.shape[0]
 
-    for i in xrange(len(coord)):
-        c[i] = coord[i]
-    for i in xrange(len(radii)):
-        r[i] = radii[i]
+    assert(c.shape[0] == 3*n)
+    assert(n > 0), "No atoms"
 
     if parameters is not None: parameters._get_address(<size_t>&p)
 
+    with nogil:
+        c_result = freesasa_calc_coord(&c[0], &r[0], n, p)
+
     result = Result()
-    result._c_result = <freesasa_result*> freesasa_calc_coord(c, r, len(radii), p)
+    result._c_result = c_result
 
     if result._c_result is NULL:
         raise Exception("Error calculating SASA.")
-
-    free(c)
-    free(r)
+    if parameters is not None:
+        result._error_model = (<Parameters> parameters)._error_model
 
     return result
 
+# Calculates SASA for frames [first, last) of a trajectory with
+# n_atoms atoms per frame. Atom areas are written to sasa and summed
+# per residue in residue_sasa (which should be zeroed). Returns the
+# index of the first frame that failed, or last on success.
+cdef int _calcFrames(const double *frames, int first, int last, int n_atoms,
+                     const double *radii, const freesasa_parameters *p,
+                     const int *residue_index, int n_residues,
+                     double *sasa, double *residue_sasa) nogil:
+    cdef coord_t *coord
+    cdef double *frame_sasa
+    cdef double *frame_residue_sasa
+    cdef int f, i, ret
+
+    for f in range(first, last):
+        coord = freesasa_coord_new_linked(frames + <Py_ssize_t> 3 * n_atoms * f, n_atoms)
+        if coord is NULL:
+            return f
+
+        frame_sasa = sasa + <Py_ssize_t> n_atoms * f
+        if p.alg == FREESASA_SHRAKE_RUPLEY:
+            ret = freesasa_shrake_rupley(frame_sasa, coord, radii, p)
+        else:
+            ret = freesasa_lee_richards(frame_sasa, coord, radii, p)
+        freesasa_coord_free(coord)
+        if ret == FREESASA_FAIL:
+            return f
+
+        frame_residue_sasa = residue_sasa + <Py_ssize_t> n_residues * f
+        for i in range(n_atoms):
+            frame_residue_sasa[residue_index[i]] += frame_sasa[i]
+
+    return last
+
+def calcTrajectory(structure, frames, parameters=None, workers=1):
+    """
+    Calculate SASA for several conformations of a structure
+
+    The atoms, radii and residues of the structure are used for all
+    frames, only the coordinates change. The structure itself is not
+    modified.
+
+    Usage::
+
+        areas, residue_areas = freesasa.calcTrajectory(structure, frames)
+        # SASA of atom i in frame f
+        areas[f, i]
+        # SASA of residue r in frame f
+        residue_areas[f, r]
+
+    Args:
+        structure: :py:class:`.Structure` that defines atoms and radii
+        frames: Coordinates of shape `(F, N, 3)`, or a flat array of size
+            `F*3*N`, where N is the number of atoms in the structure. C-contiguous
+            float64 buffers (NumPy arrays, `array.array('d')`) are used
+            without copying.
+        parameters: :py:class:`.Parameters` to use (if not specified defaults are used)
+        workers (int): Number of threads to split the frames between
+
+    Returns:
+        Two read-only memoryviews: atom areas of shape `(F, N)`, and
+        residue areas of shape `(F, R)`, where R is the number of
+        residues in the structure, in the order they appear in the
+        structure.
+
+    Raises:
+        AssertionError: if the size of frames doesn't match the
+            structure, or if there are no frames
+        ValueError: multidimensional array that isn't C-contiguous float64
+        Exception: something went wrong in calculation (see C library error messages)
+    """
+    cdef const freesasa_structure *s = NULL
+    cdef const freesasa_parameters *p = &freesasa_default_parameters
+    cdef const double[::1] c = _double_view(frames)
+    cdef int n_atoms = structure.nAtoms()
+    cdef int n_frames, n_residues, first, last, r, i
+    cdef int[::1] residue_index
+    cdef double[::1] sasa
+    cdef double[::1] residue_sasa
+
+    assert(n_atoms > 0), "No atoms"
+    assert(c.shape[0] > 0), "No frames"
+    assert(c.shape[0] % (3*n_atoms) == 0), \
+        "Size of frames not a multiple of 3 * %d (number of atoms)" % n_atoms
+    assert(workers > 0)
+
+    if parameters is not None: parameters._get_address(<size_t>&p)
+    structure._get_address(<size_t>&s)
+
+    n_frames = c.shape[0] // (3*n_atoms)
+    n_residues = freesasa_structure_n_residues(s)
+
+    residue_index_array = array('i', [0]) * n_atoms
+    residue_index = residue_index_array
+    for r in range(n_residues):
+        freesasa_structure_residue_atoms(s, r, &first, &last)
+        for i in range(first, last + 1):
+            residue_index[i] = r
+
+    sasa_array = array('d', [0]) * (n_frames * n_atoms)
+    residue_sasa_array = array('d', [0]) * (n_frames * n_residues)
+    sasa = sasa_array
+    residue_sasa = residue_sasa_array
+
+    def run(int first, int last):
+        cdef int failed
+        with nogil:
+            failed = _calcFrames(&c[0], first, last, n_atoms,
+                                 freesasa_structure_radius(s), p,
+                                 &residue_index[0], n_residues,
+                                 &sasa[0], &residue_sasa[0])
+        if failed != last:
+            raise Exception("Error calculating SASA for frame %d." % failed)
+
+    workers = min(workers, n_frames)
+    chunks = [(n_frames * k // workers, n_frames * (k + 1) // workers) for k in range(workers)]
+    if workers == 1:
+        run(0, n_frames)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(run, *chunk) for chunk in chunks]:
+                future.result()
+
+    return (_array_view(sasa_array, &sasa[0], 'd', sizeof(double), (n_frames, n_atoms)),
+            _array_view(residue_sasa_array, &residue_sasa[0], 'd', sizeof(double), (n_frames, n_residues)))
+
+def calcInterface(structure, groups, parameters=None):
+    """
+    Calculate the buried surface area between groups of chains
+
+    The SASA of the complex of all groups is calculated once. The
+    areas of each group on its own (and of each pair of groups, if
+    there are more than two) are then derived by recalculating only
+    the atoms that touch the atoms that are left out, together with
+    their neighbours. The areas are the same as when each group is
+    calculated separately, for example using
+    :py:func:`.structureArray()` with the option `'chain-groups'`, at
+    a fraction of the cost.
+
+    Atoms in chains that are not in any group are ignored.
+
+    Usage::
+
+        areas = freesasa.calcInterface(structure, 'HL+A')
+        print(areas['HL', 'A'].total)
+
+    Args:
+        structure: :py:class:`.Structure` to be used
+        groups: The groups of chains, either as a string in the format
+            of the option `'chain-groups'` of :py:func:`.structureArray()`
+            (`'HL+A'`), or as a list of strings with chain labels
+            (`['HL', 'A']`). At least two groups are needed.
+        parameters: :py:class:`.Parameters` to use (if not specified defaults are used)
+
+    Returns:
+        dict: An :py:class:`.InterfaceArea` for each pair of groups,
+        the keys are tuples of the chain labels of the two groups,
+        `('HL', 'A')`, in the order the groups were given.
+
+    Raises:
+        AssertionError: Fewer than two groups, a chain that is not in
+            the structure, or a chain in more than one group.
+        Exception: something went wrong in calculation (see C library error messages)
+    """
+    cdef const freesasa_parameters *p = NULL
+    if isinstance(groups, str):
+        groups = groups.split('+')
+    groups = list(groups)
+    assert len(groups) >= 2, "At least two groups of chains needed"
+    if parameters is not None: parameters._get_address(<size_t>&p)
+    return _interface_areas(structure, groups, p)
+
+def calcTiled(structure, parameters=None, maxMemory=2**30, workers=1, processes=False, out=None):
+    """
+    Calculate atom areas for a large structure with bounded memory
+
+    The structure is divided into tiles, boxes that are calculated
+    one at a time, each together with the atoms around it that are
+    close enough to be neighbours of its atoms. The atom areas are
+    therefore the same as when the whole structure is calculated at
+    once with :py:func:`.calc()`. The tiles are made small enough for
+    the memory used by the calculations (about 4 kB per atom, for
+    neighbour lists and such) to stay below `maxMemory`, the structure
+    and the output array are not included.
+
+    Tiles can be calculated in parallel by several threads, or in
+    worker processes, the memory limit is then shared by the workers.
+    The areas are written to `out`, which can be a preallocated or a
+    memory-mapped array ::
+
+        with open('areas.bin', 'w+b') as f:
+            f.truncate(structure.nAtoms() * 8)
+            with mmap.mmap(f.fileno(), 0) as out:
+                freesasa.calcTiled(structure, maxMemory=2**28, out=out)
+
+    Args:
+        structure: :py:class:`.Structure` to be used
+        parameters: :py:class:`.Parameters` to use (if not specified defaults are used)
+        maxMemory (int): Memory limit for the calculations in bytes.
+        workers (int): Number of tiles calculated in parallel.
+        processes (bool): Whether the workers are processes (else threads).
+        out: Writable C-contiguous buffer for the atom areas, with
+            `structure.nAtoms()` float64 elements or 8 bytes per atom
+            (for example a NumPy array, `array.array('d')` or an
+            :py:class:`mmap.mmap`). A new `array.array('d')` is
+            created if not specified.
+
+    Returns:
+        The atom areas, `out` if specified.
+
+    Raises:
+        AssertionError: if the structure has no atoms, `maxMemory` or
+            `workers` isn't positive, or `out` has the wrong size
+        Exception: something went wrong in calculation (see C library error messages)
+    """
+    cdef const freesasa_structure *s = NULL
+    cdef const freesasa_parameters *p = &freesasa_default_parameters
+    cdef double[::1] sasa
+    cdef _Tiling tiling
+    cdef int n
+
+    assert maxMemory > 0, "Memory limit must be positive"
+    assert workers > 0, "Number of workers must be positive"
+    structure._get_address(<size_t>&s)
+    n = freesasa_structure_n(<freesasa_structure*> s)
+    assert n > 0, "No atoms"
+    if parameters is not None: parameters._get_address(<size_t>&p)
+
+    if out is None:
+        out = array('d', [0]) * n
+    view = memoryview(out)
+    if view.ndim != 1 or view.format not in _double_formats:
+        view = view.cast('B').cast('d')
+    sasa = view
+    assert sasa.shape[0] == n, "Output array must have one element per atom"
+
+    tiling = _tiling(freesasa_structure_coord_array(s), freesasa_structure_radius(s),
+                     n, p.probe_radius)
+    tiles = []
+    tiling.split((0, tiling.cells._shape[0], 0, tiling.cells._shape[1],
+                  0, tiling.cells._shape[2]),
+                 max(1, maxMemory // workers // _tile_bytes_per_atom), tiles)
+
+    if workers == 1:
+        for tile in tiles:
+            xyz, radii, index_array = tiling.atoms(tile)
+            _store_tile(sasa, index_array, _tileAreas(xyz, radii, len(index_array), parameters))
+        return out
+
+    # only one tile per worker is in memory at a time
+    tiles.reverse()
+    pending = {}
+    with (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=workers) as executor:
+        while tiles or pending:
+            while tiles and len(pending) < workers:
+                xyz, radii, index_array = tiling.atoms(tiles.pop())
+                future = executor.submit(_tileAreas, xyz, radii, len(index_array), parameters)
+                pending[future] = index_array
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                _store_tile(sasa, pending.pop(future), future.result())
+
+    return out
+
+# Estimated number of atoms in an input to calcMany(), PDB files
+# are estimated from their size (one 81 byte ATOM record per atom)
+def _workload(item):
+    if isinstance(item, Structure):
+        return item.nAtoms()
+    try:
+        return os.path.getsize(item) // 81
+    except (OSError, TypeError):
+        return 0
+
+# Calculates SASA for one input to calcMany(), runs in the worker
+# threads or processes. Returns the result, or the exception raised.
+def _calcManyItem(item, parameters, classifier, options):
+    try:
+        if isinstance(item, Structure):
+            return calc(item, parameters)
+        # the structure isn't shared with the caller, it can't change
+        # before the tree is built
+        return calc(Structure(item, classifier, options), parameters, tree=False)
+    except Exception as e:
+        return e
+
+def calcMany(inputs, parameters=None, classifier=None,
+             options=Structure.defaultOptions, workers=None, processes=False):
+    """
+    Calculate SASA for many structures in parallel
+
+    The inputs are processed by a pool of threads, or of processes.
+    They are read from `inputs` as they are needed, a few per worker
+    at a time, and the largest of these are processed first, to
+    balance the load between the workers. Results are yielded as soon
+    as they are ready, i.e. not necessarily in the order of the
+    inputs. An error in one of the inputs does not stop the rest of
+    the batch, the exception is yielded in place of the result.
+
+    Usage::
+
+        for fileName, result in freesasa.calcMany(fileNames, workers=4):
+            if isinstance(result, Exception):
+                print("%s failed: %s" % (fileName, result))
+            else:
+                print(fileName, result.totalArea())
+
+    Threads are enough to use all cores for most inputs, since the GIL
+    is released while reading and calculating. Processes are useful
+    with pure Python classifiers. The inputs, parameters, classifier
+    and results are then pickled (see :py:class:`.Shared`), inputs that
+    can't be pickled (such as open files) give an exception as result.
+
+    Args:
+        inputs: Iterable of PDB file names and/or :py:class:`.Structure` objects.
+        parameters: :py:class:`.Parameters` to use (if not specified defaults are used)
+        classifier: :py:class:`.Classifier` used to read PDB files (if not
+            specified default is used)
+        options (dict): Options used to read PDB files, see
+            :py:attr:`.Structure.defaultOptions`
+        workers (int): Number of workers (defaults to the number of CPUs)
+        processes (bool): Whether the workers are processes (else threads)
+
+    Returns:
+        Iterator over tuples `(input, result)`, where `result` is either
+        a :py:class:`.Result` or the exception raised while processing
+        `input`.
+
+    Raises:
+        AssertionError: if workers is not a positive number
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert(workers > 0)
+
+    # validate options here, so that errors aren't reported once per input
+    Structure._validate_options(options)
+
+    # only keep a few inputs per worker queued, so that results don't
+    # pile up if the caller consumes them slowly, and a few more
+    # read ahead to pick the largest from
+    max_pending = 2 * workers
+    lookahead = 4 * workers
+    remaining = iter(inputs)
+    window = []
+    order = itertools.count()
+    exhausted = False
+    pending = {}
+    with (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=workers) as executor:
+        while True:
+            while not exhausted and len(window) < lookahead:
+                try:
+                    item = next(remaining)
+                except StopIteration:
+                    exhausted = True
+                else:
+                    heapq.heappush(window, (-_workload(item), next(order), item))
+            while window and len(pending) < max_pending:
+                item = heapq.heappop(window)[2]
+                pending[executor.submit(_calcManyItem, item, parameters, classifier, options)] = item
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    yield item, future.result()
+                except Exception as e:
+                    # the input or result couldn't be sent between processes
+                    yield item, e
+
 def classifyResults(result,structure,classifier=None):
     """
     Break SASA result down into classes.
@@ -113,22 +572,41 @@ def classifyResults(result,structure,classifier=None):
         structure: :py:class:`Structure` used in calculation.
         classifier: :py:class:`.Classifier` to use (if not specified default is used).
 
+    The class of each atom is only determined the first time a
+    structure is classified with a given classifier, subsequent calls
+    reuse it. Pure Python classifiers are only called once per
+    distinct residue and atom name.
+
     Returns:
         dict: Dictionary with names of classes as keys and their SASA values as values.
 
     Raises:
+        AssertionError: if result and structure have different number of atoms
         Exception: Problems with classification, see C library error messages
             (or Python exceptions if run with derived classifier).
     """
+    cdef const freesasa_result *r = NULL
+    cdef int[::1] indices
+    cdef double[::1] areas
+    cdef int i, n
+
     if classifier is None:
         classifier = Classifier()
-    ret = dict()
-    for i in range(0,structure.nAtoms()):
-        name = classifier.classify(structure.residueName(i),structure.atomName(i))
-        if name not in ret:
-            ret[name] = 0
-        ret[name] += result.atomArea(i)
-    return ret
+
+    names, index_array = structure._classIndices(classifier)
+    result._get_address(<size_t>&r)
+    assert(r is not NULL)
+    n = r.n_atoms
+    assert(n == len(index_array)), "Result and structure have different number of atoms"
+
+    area_array = array('d', [0]) * len(names)
+    indices = index_array
+    areas = area_array
+    with nogil:
+        for i in range(n):
+            areas[indices[i]] += r.sasa[i]
+
+    return dict(zip(names, area_array))
 
 def selectArea(commands, structure, result):
     """
@@ -137,7 +615,8 @@ def selectArea(commands, structure, result):
     Args:
         commands (list): A list of commands with selections using Pymol
             syntax, e.g. ``"s1, resn ala+arg"`` or ``"s2, chain A and resi 1-5"``.
-            See `select-syntax`_.
+            See `select-syntax`_. The list can also contain
+            :py:class:`.Selection` objects, which are only parsed once.
         structure: A :py:class:`.Structure`.
         result: :py:class:`.Result` from sasa calculation on structure.
 
@@ -156,6 +635,9 @@ def selectArea(commands, structure, result):
     result._get_address(<size_t> &r)
     value = dict()
     for cmd in commands:
+        if isinstance(cmd, Selection):
+            value[cmd.name()] = cmd.area(structure, result)
+            continue
         selection = freesasa_selection_new(cmd, s, r)
         if selection == NULL:
             raise Exception("Error parsing '%s'" % cmd)
@@ -173,8 +655,13 @@ def setVerbosity(verbosity):
     Raises:
         AssertionError: if verbosity has illegal value
     """
+    global _saved_verbosity
     assert(verbosity in [silent, nowarnings, normal])
-    freesasa_set_verbosity(verbosity)
+    if _silenced > 0:
+        # applied when the structures being read are done
+        _saved_verbosity = verbosity
+    else:
+        freesasa_set_verbosity(verbosity)
 
 
 def getVerbosity():
@@ -185,6 +672,8 @@ def getVerbosity():
         int: Verbosity :py:const:`.silent`, :py:const:`.nowarnings`
         or :py:const:`.normal`
     """
+    if _silenced > 0:
+        return _saved_verbosity
     return freesasa_get_verbosity()
 
 def calcBioPDB(bioPDBStructure, parameters = Parameters(),
@@ -218,13 +707,6 @@ def calcBioPDB(bioPDBStructure, parameters = Parameters(),
     """
     structure = structureFromBioPDB(bioPDBStructure, classifier, options)
     result = calc(structure, parameters)
-
-    # Hack!:
-    # This calculation depends on the structure not having been deallocated,
-    # calling it later will cause seg-faults. By calling it now the result
-    # is stored.
-    # TODO: See if there is a refactoring that solves this in a more elegant way
-    # residue_areas = result.residueAreas()
-
     sasa_classes = classifyResults(result, structure, classifier)
-    return result, sasa_classes #, residue_areas
+    residue_areas = result.residueAreas()
+    return result, sasa_classes, residue_areas
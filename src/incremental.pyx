@@ -0,0 +1,347 @@
+from cfreesasa cimport *
+from libc.stdlib cimport free, realloc
+
+# Uniform grid of cubic cells, with the atoms sorted by cell, used to
+# find the atoms within a distance of an atom without comparing all
+# pairs. The cells are at least as large as the largest distance
+# queried, so that only neighbouring cells need to be searched.
+cdef class _CellList:
+    cdef const double *_xyz
+    cdef double _origin[3]
+    cdef double _size
+    cdef int _shape[3]
+    cdef carray.array _start
+    cdef carray.array _atoms
+
+    cdef int _cell(self, const double *x, int k) nogil:
+        cdef int c = <int> ((x[k] - self._origin[k]) / self._size)
+        return min(max(c, 0), self._shape[k] - 1)
+
+    # Sets mask[j] = 1 for all atoms j with |x - x_j| <= r + R[j],
+    # where r + R[j] must not be larger than the cell size.
+    cdef void mark(self, const double *x, double r, const double *R,
+                   unsigned char *mask) nogil:
+        cdef int c[3]
+        cdef int ix, iy, iz, cell, p, j, k
+        cdef double dx, dy, dz, cutoff
+        cdef const int *start = self._start.data.as_ints
+        cdef const int *atoms = self._atoms.data.as_ints
+
+        for k in range(3):
+            c[k] = self._cell(x, k)
+
+        for ix in range(max(c[0] - 1, 0), min(c[0] + 2, self._shape[0])):
+            for iy in range(max(c[1] - 1, 0), min(c[1] + 2, self._shape[1])):
+                for iz in range(max(c[2] - 1, 0), min(c[2] + 2, self._shape[2])):
+                    cell = (ix * self._shape[1] + iy) * self._shape[2] + iz
+                    for p in range(start[cell], start[cell + 1]):
+                        j = atoms[p]
+                        dx = x[0] - self._xyz[3*j]
+                        dy = x[1] - self._xyz[3*j + 1]
+                        dz = x[2] - self._xyz[3*j + 2]
+                        cutoff = r + R[j]
+                        if dx*dx + dy*dy + dz*dz <= cutoff*cutoff:
+                            mask[j] = 1
+
+# Cell list for the n atoms with coordinates xyz, the cells have at
+# least the given size. The coordinates are not copied.
+cdef _CellList _cell_list(const double *xyz, int n, double size):
+    cdef _CellList cells = _CellList()
+    cdef double upper[3]
+    cdef double n_cells
+    cdef int *start
+    cdef int *atoms
+    cdef int i, k, cell
+
+    cells._xyz = xyz
+    for k in range(3):
+        cells._origin[k] = upper[k] = xyz[k] if n > 0 else 0
+    for i in range(n):
+        for k in range(3):
+            cells._origin[k] = min(cells._origin[k], xyz[3*i + k])
+            upper[k] = max(upper[k], xyz[3*i + k])
+
+    # keep the number of cells proportional to the number of atoms,
+    # also for sparse structures
+    size = max(size, 1e-3)
+    while True:
+        n_cells = 1
+        for k in range(3):
+            n_cells *= <int> ((upper[k] - cells._origin[k]) / size) + 1
+        if n_cells <= 8 * n + 8:
+            break
+        size *= 2
+    cells._size = size
+    for k in range(3):
+        cells._shape[k] = <int> ((upper[k] - cells._origin[k]) / size) + 1
+
+    cells._start = array('i', [0]) * (<int> n_cells + 1)
+    cells._atoms = array('i', [0]) * n
+    start = cells._start.data.as_ints
+    atoms = cells._atoms.data.as_ints
+
+    # counting sort of the atoms by cell
+    for i in range(n):
+        cell = (cells._cell(&xyz[3*i], 0) * cells._shape[1] + cells._cell(&xyz[3*i], 1)) \
+            * cells._shape[2] + cells._cell(&xyz[3*i], 2)
+        start[cell + 1] += 1
+    for cell in range(<int> n_cells):
+        start[cell + 1] += start[cell]
+    for i in range(n):
+        cell = (cells._cell(&xyz[3*i], 0) * cells._shape[1] + cells._cell(&xyz[3*i], 1)) \
+            * cells._shape[2] + cells._cell(&xyz[3*i], 2)
+        atoms[start[cell]] = i
+        start[cell] += 1
+    # start[cell] is now the end of each cell, shift back
+    for cell in range(<int> n_cells, 0, -1):
+        start[cell] = start[cell - 1]
+    start[0] = 0
+
+    return cells
+
+# The state a Result from calc(..., incremental=True) keeps to be able
+# to update itself: the parameters, the coordinates and radii the
+# areas were last calculated for, with a cell list for these, and the
+# atom nodes of the result tree.
+cdef class _IncrementalState:
+    cdef freesasa_parameters parameters
+    cdef carray.array xyz
+    cdef carray.array radii
+    cdef _CellList cells
+    cdef carray.array atom_nodes
+
+    cdef void _snapshot(self, const freesasa_structure *s, int n):
+        cdef const double *xyz = freesasa_structure_coord_array(s)
+        cdef const double *radii = freesasa_structure_radius(s)
+        cdef double r_max = 0
+        cdef int i
+
+        self.xyz = array('d', [0]) * (3 * n)
+        self.radii = array('d', [0]) * n
+        for i in range(3 * n):
+            self.xyz.data.as_doubles[i] = xyz[i]
+        for i in range(n):
+            self.radii.data.as_doubles[i] = radii[i]
+            r_max = max(r_max, radii[i])
+        self.cells = _cell_list(self.xyz.data.as_doubles, n,
+                                2 * (r_max + self.parameters.probe_radius))
+
+cdef _IncrementalState _incremental_state(const freesasa_structure *s,
+                                          const freesasa_parameters *p):
+    cdef _IncrementalState state = _IncrementalState()
+    state.parameters = p[0] if p is not NULL else freesasa_default_parameters
+    state._snapshot(s, freesasa_structure_n(<freesasa_structure*> s))
+    return state
+
+# Sets the area of a residue, chain or structure node to the sum of the
+# areas of its children, summed in the same order as in the C library
+cdef void _sum_child_areas(freesasa_node *node) nogil:
+    cdef freesasa_nodearea *area = <freesasa_nodearea*> freesasa_node_area(node)
+    cdef const char *name = area.name
+    cdef freesasa_node *child = freesasa_node_children(node)
+
+    area[0] = freesasa_nodearea_null
+    area.name = name
+    while child is not NULL:
+        freesasa_add_nodearea(area, freesasa_node_area(child))
+        child = freesasa_node_next(child)
+
+# Atom nodes of the tree, in the same order as the atoms
+cdef carray.array _atom_nodes(freesasa_node *root, int n):
+    cdef carray.array nodes = array('Q', [0]) * n
+    cdef freesasa_node *structure = freesasa_node_children(freesasa_node_children(root))
+    cdef freesasa_node *chain = freesasa_node_children(structure)
+    cdef freesasa_node *residue
+    cdef freesasa_node *atom
+    cdef int i = 0
+
+    while chain is not NULL:
+        residue = freesasa_node_children(chain)
+        while residue is not NULL:
+            atom = freesasa_node_children(residue)
+            while atom is not NULL:
+                assert(i < n)
+                nodes.data.as_ulonglongs[i] = <size_t> atom
+                i += 1
+                atom = freesasa_node_next(atom)
+            residue = freesasa_node_next(residue)
+        chain = freesasa_node_next(chain)
+    assert(i == n)
+
+    return nodes
+
+# Implements Result.update(), see there
+cdef object _update_result(Result result, structure):
+    cdef _IncrementalState state = result._incremental
+    cdef const freesasa_structure *s = NULL
+    cdef freesasa_result *r = result._c_result
+    cdef freesasa_result *subset_result
+    cdef freesasa_result *tree_result
+    cdef freesasa_node *node
+    cdef freesasa_nodearea *area
+    cdef const char *name
+    cdef const double *xyz
+    cdef const double *radii
+    cdef const double *old_xyz
+    cdef const double *old_radii
+    cdef double *R
+    cdef double *old_R
+    cdef double *new_sasa
+    cdef double probe, r_max = 0, total = 0
+    cdef unsigned char *affected
+    cdef unsigned char *in_subset
+    cdef int *changed
+    cdef int *atoms
+    cdef int *subset
+    cdef double *subset_xyz
+    cdef double *subset_radii
+    cdef int n, n_old, n_changed = 0, n_atoms = 0, n_subset = 0, i, j, k
+    cdef _CellList cells
+    cdef bint radii_changed = False
+
+    assert state is not None, "Result.update() requires a result from calc(..., incremental=True)"
+    assert(r is not NULL)
+
+    structure._get_address(<size_t>&s)
+    n = freesasa_structure_n(<freesasa_structure*> s)
+    n_old = r.n_atoms
+    assert(n >= n_old), "Structure has fewer atoms than the result"
+    if n > n_old and result._exports > 0:
+        raise BufferError("Can't add atoms to the result while views of the atom areas are in use")
+
+    xyz = freesasa_structure_coord_array(s)
+    radii = freesasa_structure_radius(s)
+    old_xyz = state.xyz.data.as_doubles
+    old_radii = state.radii.data.as_doubles
+    probe = state.parameters.probe_radius
+
+    changed_array = array('i', [0]) * n
+    atoms_array = array('i', [0]) * n
+    subset_array = array('i', [0]) * n
+    R_array = array('d', [0]) * n
+    old_R_array = array('d', [0]) * n_old
+    affected_array = array('B', [0]) * (n + 1)
+    in_subset_array = array('B', [0]) * (n + 1)
+    changed = (<carray.array> changed_array).data.as_ints
+    atoms = (<carray.array> atoms_array).data.as_ints
+    subset = (<carray.array> subset_array).data.as_ints
+    R = (<carray.array> R_array).data.as_doubles
+    old_R = (<carray.array> old_R_array).data.as_doubles
+    affected = (<carray.array> affected_array).data.as_uchars
+    in_subset = (<carray.array> in_subset_array).data.as_uchars
+
+    # atoms that have been moved, re-radiused or added
+    for i in range(n):
+        if i >= n_old:
+            changed[n_changed] = i
+            n_changed += 1
+        elif xyz[3*i] != old_xyz[3*i] or xyz[3*i + 1] != old_xyz[3*i + 1] or \
+             xyz[3*i + 2] != old_xyz[3*i + 2] or radii[i] != old_radii[i]:
+            changed[n_changed] = i
+            n_changed += 1
+            radii_changed = radii_changed or radii[i] != old_radii[i]
+
+    if n_changed > 0:
+        for i in range(n):
+            R[i] = radii[i] + probe
+            r_max = max(r_max, R[i])
+        for i in range(n_old):
+            old_R[i] = old_radii[i] + probe
+        cells = _cell_list(xyz, n, 2 * r_max)
+
+        # the areas of changed atoms and of their neighbours before and
+        # after the change need to be recalculated
+        for k in range(n_changed):
+            i = changed[k]
+            if i < n_old:
+                state.cells.mark(&old_xyz[3*i], old_R[i], old_R, affected)
+            cells.mark(&xyz[3*i], R[i], R, affected)
+        for i in range(n):
+            if affected[i]:
+                atoms[n_atoms] = i
+                n_atoms += 1
+
+        # which requires the atoms themselves and their current neighbours
+        for k in range(n_atoms):
+            i = atoms[k]
+            cells.mark(&xyz[3*i], R[i], R, in_subset)
+        for i in range(n):
+            if in_subset[i]:
+                subset[n_subset] = i
+                n_subset += 1
+
+        subset_xyz_array = array('d', [0]) * (3 * n_subset)
+        subset_radii_array = array('d', [0]) * n_subset
+        subset_xyz = (<carray.array> subset_xyz_array).data.as_doubles
+        subset_radii = (<carray.array> subset_radii_array).data.as_doubles
+        for k in range(n_subset):
+            i = subset[k]
+            subset_xyz[3*k] = xyz[3*i]
+            subset_xyz[3*k + 1] = xyz[3*i + 1]
+            subset_xyz[3*k + 2] = xyz[3*i + 2]
+            subset_radii[k] = radii[i]
+
+        with nogil:
+            subset_result = freesasa_calc_coord(subset_xyz, subset_radii, n_subset, &state.parameters)
+        if subset_result is NULL:
+            raise Exception("Error calculating SASA.")
+
+        if n > n_old:
+            new_sasa = <double*> realloc(r.sasa, n * sizeof(double))
+            if new_sasa is NULL:
+                freesasa_result_free(subset_result)
+                raise MemoryError()
+            r.sasa = new_sasa
+            r.n_atoms = n
+
+        # both lists are sorted
+        j = 0
+        for k in range(n_subset):
+            if j < n_atoms and subset[k] == atoms[j]:
+                r.sasa[atoms[j]] = subset_result.sasa[k]
+                j += 1
+        freesasa_result_free(subset_result)
+
+        for i in range(n):
+            total += r.sasa[i]
+        r.total = total
+
+        if result._c_root_node is not NULL:
+            if n > n_old or radii_changed or n_old == 0:
+                # the tree stores radii, and has one node per atom
+                freesasa_node_free(result._c_root_node)
+                result._c_root_node = freesasa_tree_init(r, s, "Structure")
+                state.atom_nodes = None
+                if result._c_root_node is NULL:
+                    raise Exception("Error calculating SASA.")
+            else:
+                if state.atom_nodes is None:
+                    state.atom_nodes = _atom_nodes(result._c_root_node, n)
+                residues = set()
+                for k in range(n_atoms):
+                    node = <freesasa_node*> <size_t> state.atom_nodes.data.as_ulonglongs[atoms[k]]
+                    area = <freesasa_nodearea*> freesasa_node_area(node)
+                    name = area.name
+                    freesasa_atom_nodearea(area, s, r, atoms[k])
+                    area.name = name
+                    residues.add(<size_t> freesasa_node_parent(node))
+                chains = set()
+                for residue in residues:
+                    node = <freesasa_node*> <size_t> residue
+                    _sum_child_areas(node)
+                    chains.add(<size_t> freesasa_node_parent(node))
+                for chain in chains:
+                    _sum_child_areas(<freesasa_node*> <size_t> chain)
+                node = freesasa_node_children(freesasa_node_children(result._c_root_node))
+                _sum_child_areas(node)
+                tree_result = <freesasa_result*> freesasa_node_structure_result(node)
+                for k in range(n_atoms):
+                    tree_result.sasa[atoms[k]] = r.sasa[atoms[k]]
+                tree_result.total = r.total
+
+        result._residue_columns = None
+        state._snapshot(s, n)
+
+    # the result matches the structure again
+    result._setStructure(structure)
+    return _array_view(atoms_array, atoms, 'i', sizeof(int), (n_atoms,))
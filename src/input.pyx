@@ -0,0 +1,218 @@
+import bz2
+import gzip
+import io
+import itertools
+import mmap
+import re
+from libc.stdio cimport fread, rewind
+from libc.string cimport memcmp
+
+cdef extern from *:
+    """
+    #include <stdio.h>
+
+    /* Opens size bytes at data as a read-only stream. Uses fmemopen()
+       where available, on other platforms the data is copied to a
+       temporary file. */
+    static FILE *freesasa_py_memopen(const void *data, size_t size)
+    {
+    #if defined(_WIN32)
+        FILE *f = tmpfile();
+        if (f == NULL) return NULL;
+        if (size > 0 && fwrite(data, 1, size, f) != size) {
+            fclose(f);
+            return NULL;
+        }
+        rewind(f);
+        return f;
+    #else
+        if (size == 0) return tmpfile();
+        return fmemopen((void *) data, size, "rb");
+    #endif
+    }
+    """
+    FILE *freesasa_py_memopen(const void *data, size_t size) nogil
+
+_gzip_magic = b'\x1f\x8b'
+_bz2_magic = b'BZh'
+
+# Returns the module (gzip or bz2) to decompress data with if it starts
+# with the corresponding magic number, None otherwise.
+cdef object _compression(data):
+    if data[:2] == _gzip_magic:
+        return gzip
+    if data[:3] == _bz2_magic:
+        return bz2
+    return None
+
+# Returns data decompressed if it is gzip or bzip2 compressed, data
+# itself otherwise.
+cdef object _decompress(data):
+    compression = _compression(data)
+    if compression is not None:
+        return compression.decompress(data)
+    return data
+
+# Input to the C parsers, which read from a FILE. The source can be
+#
+# - a file name (str, bytes or os.PathLike, like open()), opened with
+#   fopen(),
+# - any other object with the buffer protocol (bytearray, memoryview,
+#   mmap.mmap, NumPy arrays, ...), read in place without copying,
+# - a file-like object with a read() method, read into memory.
+#
+# Gzip and bzip2 compressed input is recognized by the magic number
+# and decompressed in memory. The buffer is kept alive, and the FILE
+# open, until close() is called or the object is deallocated.
+cdef class _Input:
+    cdef FILE *_file
+    cdef object _source
+    cdef const unsigned char[::1] _data
+    cdef readonly object name
+
+    def __cinit__(self, source):
+        cdef unsigned char magic[3]
+
+        self._file = NULL
+
+        if isinstance(source, (str, bytes, os.PathLike)):
+            fileName = os.fsdecode(source)
+            self.name = fileName
+            self._file = fopen(fileName, 'rb')
+            if self._file is NULL:
+                raise IOError("File '%s' could not be opened." % fileName)
+            if fread(magic, 1, 3, self._file) == 3 and \
+               (memcmp(magic, b"\x1f\x8b", 2) == 0 or memcmp(magic, b"BZh", 3) == 0):
+                fclose(self._file)
+                self._file = NULL
+                with open(fileName, 'rb') as f:
+                    self._openData(_decompress(f.read()))
+            else:
+                rewind(self._file)
+            return
+
+        # objects like mmap.mmap have both a buffer and read(), the
+        # buffer is preferred to avoid a copy
+        try:
+            view = memoryview(source)
+            self.name = "<%s>" % type(source).__name__
+        except TypeError:
+            if not hasattr(source, 'read'):
+                raise TypeError("Can't read input from object of type '%s'" % type(source).__name__)
+            name = getattr(source, 'name', None)
+            self.name = name if isinstance(name, str) else "<%s>" % type(source).__name__
+            data = source.read()
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            view = memoryview(data)
+
+        if not view.c_contiguous:
+            view = memoryview(view.tobytes())
+        self._openData(_decompress(view.cast('B')))
+
+    cdef _openData(self, data):
+        self._source = data
+        self._data = data
+        if self._data.shape[0] == 0:
+            self._file = freesasa_py_memopen(NULL, 0)
+        else:
+            self._file = freesasa_py_memopen(&self._data[0], self._data.shape[0])
+        if self._file is NULL:
+            raise IOError("Could not open %s for reading." % self.name)
+
+    # The FILE, to be closed by close(), not by the caller
+    cdef FILE* file(self):
+        return self._file
+
+    cdef close(self):
+        if self._file is not NULL:
+            fclose(self._file)
+            self._file = NULL
+        self._data = None
+        self._source = None
+
+    def __dealloc__(self):
+        if self._file is not NULL:
+            fclose(self._file)
+
+
+_model_record = re.compile(rb'^MODEL', re.M)
+
+# Yields the models in the PDB data in a byte buffer as memoryviews
+# of the buffer, each from a MODEL record to the next. The first model
+# also includes the lines before it, and data without MODEL records is
+# a single model.
+def _splitModels(data):
+    view = memoryview(data)
+    start = 0
+    for i, match in enumerate(_model_record.finditer(data)):
+        if i > 0:
+            yield view[start:match.start()]
+            start = match.start()
+    yield view[start:]
+
+# Like _splitModels(), for an iterable of lines (str or bytes). Each
+# model is joined to one bytes object, yielded as a memoryview (bytes
+# would be taken for a file name).
+def _splitModelLines(lines):
+    model = []
+    has_model = False
+    for line in lines:
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        if line.startswith(b'MODEL'):
+            if has_model:
+                yield memoryview(b''.join(model))
+                model = []
+            has_model = True
+        model.append(line)
+    yield memoryview(b''.join(model))
+
+# Yields the models of the PDB input source (any of the types accepted
+# by _Input) one at a time, without reading all of it into memory when
+# it's a file. Uncompressed files are memory-mapped, compressed files
+# and file-like objects are decompressed and read as they are consumed.
+def _iterModels(source):
+    if isinstance(source, (str, bytes, os.PathLike)):
+        fileName = os.fsdecode(source)
+        try:
+            f = open(fileName, 'rb')
+        except OSError:
+            raise IOError("File '%s' could not be opened." % fileName)
+        with f:
+            compression = _compression(f.read(3))
+            f.seek(0)
+            if compression is not None:
+                with compression.open(f) as stream:
+                    yield from _splitModelLines(stream)
+                return
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # empty files can't be mapped
+                yield from _splitModelLines(f)
+                return
+        # the mapping stays valid after the file is closed
+        yield from _splitModels(mapped)
+        return
+
+    try:
+        view = memoryview(source)
+    except TypeError:
+        if not hasattr(source, 'read'):
+            raise TypeError("Can't read input from object of type '%s'" % type(source).__name__)
+        first = source.readline()
+        if isinstance(first, bytes):
+            compression = _compression(first)
+            if compression is not None:
+                # the compressed data is read into memory, but
+                # decompressed one model at a time
+                with compression.open(io.BytesIO(first + source.read())) as stream:
+                    yield from _splitModelLines(stream)
+                return
+        yield from _splitModelLines(itertools.chain([first], source))
+        return
+
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    yield from _splitModels(_decompress(view.cast('B')))
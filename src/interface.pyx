@@ -0,0 +1,254 @@
+from cfreesasa cimport *
+
+class InterfaceArea:
+    """
+    Stores the buried surface area between two groups of chains
+
+    The type of the values returned by :py:func:`freesasa.calcInterface()`.
+    The buried area is the area of the atoms of the two groups when
+    calculated separately, minus their area in the complex of the two.
+
+    Attributes:
+        groups (tuple): The chain labels of the two groups
+        total (float): Total buried area
+        groupAreas (dict): Buried area of the atoms of each group, by chain labels
+        atomAreas (array): Buried area of each atom of the structure,
+            zero for atoms in other groups
+        residueAreas (dict): Buried area of the residues with buried
+            atoms, ``residueAreas["A"]["5"]`` is the buried area of
+            residue number 5 in chain A
+    """
+
+    groups = ()
+    total = 0
+    groupAreas = None
+    atomAreas = None
+    residueAreas = None
+
+
+# The atoms, coordinates and radii of the groups of a calcInterface()
+# calculation, with the atoms numbered in the order of the structure
+# but leaving out atoms that are not in any group.
+cdef class _InterfaceAtoms:
+    cdef int n
+    cdef carray.array index
+    cdef carray.array group
+    cdef carray.array xyz
+    cdef carray.array radii
+    cdef carray.array R
+    cdef _CellList cells
+    cdef freesasa_parameters parameters
+
+    # Sets area[i] for the atoms with member[i] set to their area when
+    # only these atoms are present, given their areas in the complex
+    # of all groups. Only the atoms that touch an atom that is left
+    # out are recalculated, using themselves and their neighbours.
+    cdef void areas(self, const unsigned char *member, const double *complex_sasa,
+                    double *area) except *:
+        cdef const double *xyz = self.xyz.data.as_doubles
+        cdef const double *radii = self.radii.data.as_doubles
+        cdef const double *R = self.R.data.as_doubles
+        cdef freesasa_result *subset_result
+        cdef unsigned char *touched
+        cdef unsigned char *in_subset
+        cdef int *atoms
+        cdef int *subset
+        cdef double *subset_xyz
+        cdef double *subset_radii
+        cdef int n = self.n, n_atoms = 0, n_subset = 0, i, k
+
+        touched_array = array('B', [0]) * (n + 1)
+        in_subset_array = array('B', [0]) * (n + 1)
+        atoms_array = array('i', [0]) * n
+        subset_array = array('i', [0]) * n
+        touched = (<carray.array> touched_array).data.as_uchars
+        in_subset = (<carray.array> in_subset_array).data.as_uchars
+        atoms = (<carray.array> atoms_array).data.as_ints
+        subset = (<carray.array> subset_array).data.as_ints
+
+        for i in range(n):
+            if member[i]:
+                area[i] = complex_sasa[i]
+            else:
+                self.cells.mark(&xyz[3*i], R[i], R, touched)
+        for i in range(n):
+            if member[i] and touched[i]:
+                atoms[n_atoms] = i
+                n_atoms += 1
+        if n_atoms == 0:
+            return
+
+        for k in range(n_atoms):
+            i = atoms[k]
+            self.cells.mark(&xyz[3*i], R[i], R, in_subset)
+        for i in range(n):
+            if member[i] and in_subset[i]:
+                subset[n_subset] = i
+                n_subset += 1
+
+        subset_xyz_array = array('d', [0]) * (3 * n_subset)
+        subset_radii_array = array('d', [0]) * n_subset
+        subset_xyz = (<carray.array> subset_xyz_array).data.as_doubles
+        subset_radii = (<carray.array> subset_radii_array).data.as_doubles
+        for k in range(n_subset):
+            i = subset[k]
+            subset_xyz[3*k] = xyz[3*i]
+            subset_xyz[3*k + 1] = xyz[3*i + 1]
+            subset_xyz[3*k + 2] = xyz[3*i + 2]
+            subset_radii[k] = radii[i]
+
+        with nogil:
+            subset_result = freesasa_calc_coord(subset_xyz, subset_radii, n_subset, &self.parameters)
+        if subset_result is NULL:
+            raise Exception("Error calculating SASA.")
+
+        # both lists are sorted
+        k = 0
+        for i in range(n_subset):
+            if k < n_atoms and subset[i] == atoms[k]:
+                area[atoms[k]] = subset_result.sasa[i]
+                k += 1
+        freesasa_result_free(subset_result)
+
+# The atoms of structure s in the groups, group_of maps chain labels
+# to the index of their group (-1 if not in a group)
+cdef _InterfaceAtoms _interface_atoms(const freesasa_structure *s, const int *group_of,
+                                      const freesasa_parameters *p):
+    cdef _InterfaceAtoms atoms = _InterfaceAtoms()
+    cdef const double *xyz = freesasa_structure_coord_array(s)
+    cdef const double *radii = freesasa_structure_radius(s)
+    cdef int n_structure = freesasa_structure_n(<freesasa_structure*> s)
+    cdef int i, k, g, n = 0
+    cdef double r_max = 0
+
+    atoms.parameters = p[0] if p is not NULL else freesasa_default_parameters
+    atoms.index = array('i', [0]) * n_structure
+    atoms.group = array('i', [0]) * n_structure
+    for i in range(n_structure):
+        g = group_of[<unsigned char> freesasa_structure_atom_chain(s, i)]
+        if g >= 0:
+            atoms.index.data.as_ints[n] = i
+            atoms.group.data.as_ints[n] = g
+            n += 1
+    atoms.n = n
+
+    atoms.xyz = array('d', [0]) * (3 * n)
+    atoms.radii = array('d', [0]) * n
+    atoms.R = array('d', [0]) * n
+    for k in range(n):
+        i = atoms.index.data.as_ints[k]
+        atoms.xyz.data.as_doubles[3*k] = xyz[3*i]
+        atoms.xyz.data.as_doubles[3*k + 1] = xyz[3*i + 1]
+        atoms.xyz.data.as_doubles[3*k + 2] = xyz[3*i + 2]
+        atoms.radii.data.as_doubles[k] = radii[i]
+        atoms.R.data.as_doubles[k] = radii[i] + atoms.parameters.probe_radius
+        r_max = max(r_max, atoms.R.data.as_doubles[k])
+    atoms.cells = _cell_list(atoms.xyz.data.as_doubles, n, 2 * r_max)
+
+    return atoms
+
+# Implements calcInterface(), see there
+cdef dict _interface_areas(structure, groups, const freesasa_parameters *p):
+    cdef const freesasa_structure *s = NULL
+    cdef int group_of[256]
+    cdef bint present[256]
+    cdef _InterfaceAtoms atoms
+    cdef freesasa_result *complex_result
+    cdef const double *complex_sasa
+    cdef double *isolated
+    cdef double *pair_area
+    cdef double *buried
+    cdef unsigned char *member
+    cdef int n, n_structure, i, k, g, a, b
+
+    structure._get_address(<size_t>&s)
+    n_structure = freesasa_structure_n(<freesasa_structure*> s)
+
+    for i in range(256):
+        group_of[i] = -1
+        present[i] = False
+    for i in range(n_structure):
+        present[<unsigned char> freesasa_structure_atom_chain(s, i)] = True
+    for g, group in enumerate(groups):
+        assert len(group) > 0, "Empty group of chains"
+        for label in group:
+            assert ord(label) < 256 and present[ord(label)], "Chain '%s' not in structure" % label
+            assert group_of[ord(label)] == -1, "Chain '%s' in more than one group" % label
+            group_of[ord(label)] = g
+
+    atoms = _interface_atoms(s, group_of, p)
+    n = atoms.n
+
+    with nogil:
+        complex_result = freesasa_calc_coord(atoms.xyz.data.as_doubles, atoms.radii.data.as_doubles,
+                                             n, &atoms.parameters)
+    if complex_result is NULL:
+        raise Exception("Error calculating SASA.")
+
+    try:
+        complex_sasa = complex_result.sasa
+        member_array = array('B', [0]) * n
+        isolated_array = array('d', [0]) * n
+        pair_area_array = array('d', [0]) * n
+        member = (<carray.array> member_array).data.as_uchars
+        isolated = (<carray.array> isolated_array).data.as_doubles
+        pair_area = (<carray.array> pair_area_array).data.as_doubles
+
+        # the groups are disjoint, their areas on their own can be
+        # stored in the same array
+        for g in range(len(groups)):
+            for k in range(n):
+                member[k] = atoms.group.data.as_ints[k] == g
+            atoms.areas(member, complex_sasa, isolated)
+
+        areas = {}
+        for a in range(len(groups)):
+            for b in range(a + 1, len(groups)):
+                for k in range(n):
+                    g = atoms.group.data.as_ints[k]
+                    member[k] = g == a or g == b
+                if len(groups) > 2:
+                    atoms.areas(member, complex_sasa, pair_area)
+                else:
+                    for k in range(n):
+                        pair_area[k] = complex_sasa[k]
+
+                atom_areas = array('d', [0]) * n_structure
+                buried = (<carray.array> atom_areas).data.as_doubles
+                group_areas = [0.0, 0.0]
+                for k in range(n):
+                    if member[k]:
+                        i = atoms.index.data.as_ints[k]
+                        buried[i] = isolated[k] - pair_area[k]
+                        group_areas[atoms.group.data.as_ints[k] != a] += buried[i]
+
+                area = InterfaceArea()
+                area.groups = (groups[a], groups[b])
+                area.total = group_areas[0] + group_areas[1]
+                area.groupAreas = {groups[a] : group_areas[0], groups[b] : group_areas[1]}
+                area.atomAreas = atom_areas
+                area.residueAreas = _buried_residues(s, buried)
+                areas[area.groups] = area
+    finally:
+        freesasa_result_free(complex_result)
+
+    return areas
+
+# Buried area of the residues of s that have atoms with buried area
+cdef dict _buried_residues(const freesasa_structure *s, const double *buried):
+    cdef int r, i, first, last
+    cdef bint is_buried
+    cdef double total
+    residues = {}
+    for r in range(freesasa_structure_n_residues(s)):
+        freesasa_structure_residue_atoms(s, r, &first, &last)
+        total = 0
+        is_buried = False
+        for i in range(first, last + 1):
+            total += buried[i]
+            is_buried = is_buried or buried[i] != 0
+        if is_buried:
+            chain = chr(freesasa_structure_atom_chain(s, first))
+            number = freesasa_structure_atom_res_number(s, first).strip()
+            residues.setdefault(chain, {})[number] = total
+    return residues
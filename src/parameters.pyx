@@ -6,6 +6,82 @@ ShrakeRupley = 'ShrakeRupley'
 ## Used to specify the algorithm by Lee & Richards
 LeeRichards = 'LeeRichards'
 
+# Convergence of the algorithms, used by Parameters.forTolerance().
+# Each row is (resolution, bias, spread, cost): the root mean square
+# of the mean error per atom and the standard deviation of the errors
+# per atom (both in Å^2), relative to Lee & Richards with 3000
+# slices, and the time per atom (µs, only the ratios are used). Mean
+# values for 1UBQ, 1A0Q and 1D3Z with the default classifier and
+# probe radius, one thread.
+_convergence = {
+    LeeRichards : (
+        (5, 0.1333, 1.0992, 10.7),
+        (10, 0.0331, 0.4807, 18.6),
+        (15, 0.0163, 0.2995, 27.3),
+        (20, 0.0165, 0.2142, 37.1),
+        (25, 0.0054, 0.1484, 41.4),
+        (30, 0.0034, 0.1174, 48.8),
+        (40, 0.0014, 0.0831, 65.0),
+        (50, 0.0026, 0.0647, 72.6),
+        (75, 0.0011, 0.0383, 104.3),
+        (100, 0.0007, 0.0269, 123.7),
+        (150, 0.0008, 0.0160, 161.7),
+        (200, 0.0008, 0.0113, 206.3)
+    ),
+    ShrakeRupley : (
+        (20, 0.1321, 3.0889, 2.3),
+        (50, 0.0059, 1.5628, 3.9),
+        (100, 0.0225, 0.9369, 5.6),
+        (200, 0.0111, 0.5273, 10.3),
+        (300, 0.0126, 0.3903, 12.7),
+        (500, 0.0104, 0.2704, 22.8),
+        (1000, 0.0038, 0.1608, 39.1),
+        (2000, 0.0035, 0.0962, 72.8),
+        (5000, 0.0026, 0.0478, 169.1)
+    )
+}
+
+# The error model used by Parameters.forTolerance(). The measured bias
+# is noisy, Shrake & Rupley with 50 points happens to have a lower
+# bias than with 100 to 2000 points, so that a tighter tolerance could
+# give a lower resolution. The model instead uses the largest bias and
+# spread measured at the same or any higher resolution, which never
+# increase with the resolution.
+def _monotonicErrors(rows):
+    bias, spread = 0, 0
+    model = []
+    for resolution, b, s, cost in reversed(rows):
+        bias, spread = max(bias, b), max(spread, s)
+        model.append((resolution, bias, spread, cost))
+    return tuple(reversed(model))
+
+_error_model_table = {algorithm : _monotonicErrors(rows)
+                      for algorithm, rows in _convergence.items()}
+
+# mean area per atom (Å^2) of the structures above
+_convergence_atom_area = 8.24
+
+# used when the number of atoms per residue isn't known
+_default_atoms_per_residue = 8
+
+# Estimated errors (see Parameters.forTolerance()) for a calculation
+# on n atoms in residues of k atoms, given the bias and spread of the
+# error per atom. Errors are assumed independent between atoms.
+def _estimateError(bias, spread, n, k):
+    return {'total' : (bias + spread / max(n, 1)**0.5) / _convergence_atom_area,
+            'residue' : ((k * bias)**2 + k * spread**2)**0.5}
+
+# Number of atoms and mean number of atoms per residue of a Structure
+# (or just a number of atoms)
+def _structureSize(structure):
+    cdef const freesasa_structure *s = NULL
+    if isinstance(structure, int):
+        return structure, _default_atoms_per_residue
+    structure._get_address(<size_t>&s)
+    n = structure.nAtoms()
+    n_residues = freesasa_structure_n_residues(s)
+    return n, (float(n) / n_residues if n_residues > 0 else _default_atoms_per_residue)
+
 cdef class Parameters:
     """
     Stores parameter values to be used by calculation.
@@ -27,6 +103,10 @@ cdef class Parameters:
 
     cdef freesasa_parameters _c_param
 
+    # (bias, spread) of the error per atom if the parameters were
+    # chosen by forTolerance(), reset when the resolution changes
+    cdef object _error_model
+
     defaultParameters = {
         'algorithm'    : LeeRichards,
         'probe-radius' : freesasa_default_parameters.probe_radius,
@@ -71,6 +151,7 @@ cdef class Parameters:
         Raises:
              AssertionError: unknown algorithm specified
         """
+        self._error_model = None
         if alg == ShrakeRupley:
             self._c_param.alg = FREESASA_SHRAKE_RUPLEY
         elif alg == LeeRichards:
@@ -102,6 +183,7 @@ cdef class Parameters:
             AssertionError: r < 0
         """
         assert(r >= 0)
+        self._error_model = None
         self._c_param.probe_radius = r
 
     def probeRadius(self):
@@ -124,6 +206,7 @@ cdef class Parameters:
             AssertionError: n <= 0.
         """
         assert(n > 0)
+        self._error_model = None
         self._c_param.shrake_rupley_n_points = n
 
     def nPoints(self):
@@ -146,6 +229,7 @@ cdef class Parameters:
             AssertionError: n <= 0
         """
         assert(n> 0)
+        self._error_model = None
         self._c_param.lee_richards_n_slices = n
 
     def nSlices(self):
@@ -179,6 +263,105 @@ cdef class Parameters:
         """
         return self._c_param.n_threads
 
+    @staticmethod
+    def forTolerance(tolerance, structure, level='total', param=None):
+        """
+        Get the cheapest parameters for a target error.
+
+        Chooses the algorithm and resolution (number of slices or test
+        points) that reach the target error at the lowest cost, based
+        on a table of the errors and run times of both algorithms
+        measured on typical proteins. The errors are estimated from
+        the mean error per atom (bias) and its spread, assuming the
+        errors of different atoms are independent, the relative error
+        of the total area therefore becomes smaller for large
+        structures. If the target can't be reached the most accurate
+        parameters in the table are returned.
+
+        The estimate is available from
+        :py:meth:`.Parameters.estimatedError()` and from the results of
+        calculations with the parameters,
+        :py:meth:`.Result.estimatedError()`. Changing the algorithm,
+        resolution or probe radius afterwards removes it.
+
+        Args:
+            tolerance (float): The target error, for level `'total'`
+                the relative error of the total area (for example
+                0.001), for level `'residue'` the root mean square
+                error of the residue areas in Å^2.
+            structure: The :py:class:`.Structure` the parameters will
+                be used for, or its number of atoms.
+            level (str): `'total'` or `'residue'`.
+            param (dict): Other parameter values, i.e. `'probe-radius'`
+                and `'n-threads'`, see :py:attr:`.Parameters.defaultParameters`.
+                The table was measured with the default probe radius,
+                with other probe radii the parameters are chosen from
+                it as well, but no error estimate is given.
+
+        Returns:
+            :py:class:`.Parameters`: The parameters.
+
+        Raises:
+            AssertionError: Invalid arguments.
+        """
+        assert tolerance > 0, "Tolerance must be positive"
+        assert level in ('total', 'residue'), "Level must be 'total' or 'residue'"
+        param = dict(param) if param is not None else {}
+        for key in ('algorithm', 'n-points', 'n-slices'):
+            assert key not in param, "'%s' is chosen by forTolerance()" % key
+
+        n, k = _structureSize(structure)
+        best = None
+        mostAccurate = None
+        for algorithm in (LeeRichards, ShrakeRupley):
+            for resolution, bias, spread, cost in _error_model_table[algorithm]:
+                error = _estimateError(bias, spread, n, k)[level]
+                candidate = (cost, error, algorithm, resolution, bias, spread)
+                if error <= tolerance and (best is None or cost < best[0]):
+                    best = candidate
+                if mostAccurate is None or error < mostAccurate[1]:
+                    mostAccurate = candidate
+        if best is None:
+            best = mostAccurate
+
+        cost, error, algorithm, resolution, bias, spread = best
+        param['algorithm'] = algorithm
+        param['n-slices' if algorithm == LeeRichards else 'n-points'] = resolution
+        parameters = Parameters(param)
+        if parameters.probeRadius() == freesasa_default_parameters.probe_radius:
+            parameters._error_model = (bias, spread)
+        return parameters
+
+    def estimatedError(self, structure):
+        """
+        Get the estimated error of calculations with these parameters.
+
+        Only available for parameters from :py:meth:`.Parameters.forTolerance()`.
+
+        Args:
+            structure: A :py:class:`.Structure`, or its number of atoms.
+
+        Returns:
+            dict: The relative error of the total area (key `'total'`)
+            and the root mean square error of residue areas in Å^2
+            (key `'residue'`), or `None` if not available.
+        """
+        if self._error_model is None:
+            return None
+        n, k = _structureSize(structure)
+        return _estimateError(self._error_model[0], self._error_model[1], n, k)
+
+    def __reduce__(self):
+        return (Parameters, ({'algorithm' : self.algorithm(),
+                              'probe-radius' : self.probeRadius(),
+                              'n-points' : self.nPoints(),
+                              'n-slices' : self.nSlices(),
+                              'n-threads' : self.nThreads()},),
+                self._error_model)
+
+    def __setstate__(self, state):
+        self._error_model = state
+
     # not pretty, but only way I've found to pass pointers around
     def _get_address(self, size_t ptr2ptr):
         cdef freesasa_parameters **p = <freesasa_parameters**> ptr2ptr
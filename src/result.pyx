@@ -1,4 +1,14 @@
 from cfreesasa cimport *
+from libc.math cimport NAN
+
+# numeric columns of Result.residueAreaColumns(), same names as the
+# attributes of ResidueArea
+_residue_area_fields = ('total', 'mainChain', 'sideChain', 'polar', 'apolar',
+                        'relativeTotal', 'relativeMainChain', 'relativeSideChain',
+                        'relativePolar', 'relativeApolar')
+
+cdef inline double _c_safe_div(double a, double b) nogil:
+    return a/b if b != 0 else NAN
 
 class ResidueArea:
     """
@@ -48,8 +58,32 @@ cdef class Result:
     """
 
     cdef freesasa_result* _c_result
+
+    # tree of structure, chain, residue and atom areas, built by
+    # calc() or on first use from _structure, see _rootNode()
     cdef freesasa_node* _c_root_node
 
+    # cached return value of residueAreaColumns()
+    cdef object _residue_columns
+
+    # state for update(), if calculated with calc(..., incremental=True)
+    cdef object _incremental
+
+    # number of views of the atom areas in use, see update()
+    cdef Py_ssize_t _exports
+
+    # the Structure the result was calculated for, if any, needed to
+    # build the tree, and its number of changes at the time, see
+    # _setStructure()
+    cdef object _structure
+    cdef unsigned long _structure_changes
+
+    # statistics from calc(), see stats()
+    cdef dict _stats
+
+    # error model of the parameters, see estimatedError()
+    cdef object _error_model
+
     ## The constructor
     def __init__ (self):
         self._c_result = NULL
@@ -103,6 +137,70 @@ cdef class Result:
         assert(i < self._c_result.n_atoms)
         return self._c_result.sasa[i]
 
+    def atomAreas(self):
+        """
+        SASA for all atoms.
+
+        The areas are not copied, the returned read-only view
+        refers directly to the results stored in the object (which is
+        kept alive as long as the view is). It supports the buffer
+        protocol and can for example be wrapped by
+        ``numpy.asarray(result.atomAreas())``.
+
+        Returns:
+            memoryview: SASA of each atom in Å^2.
+
+        Raise:
+            AssertionError: If no results have been associated
+                      with the object.
+        """
+        assert(self._c_result is not NULL)
+        return _array_view(self, self._c_result.sasa, 'd', sizeof(double),
+                           (self._c_result.n_atoms,), &self._exports)
+
+    def update(self, structure):
+        """
+        Update the areas after the structure has been modified.
+
+        Only available for results from ``calc(structure, parameters,
+        incremental=True)``. The result remembers the coordinates and
+        radii of the atoms it was calculated for. The atoms that have
+        been moved, been given new radii or been added since then are
+        found, and only the areas of these atoms and of their
+        neighbours, before and after the change, are recalculated with
+        the original parameters. The total area and the residue areas
+        are updated in place, and are the same as if the structure had
+        been recalculated with :py:func:`.calc()`.
+
+        This is efficient when few atoms are changed at a time, for
+        example in mutation scanning or docking.
+
+        Usage::
+
+            result = freesasa.calc(structure, parameters, incremental=True)
+            structure.setCoords(new_coords)
+            recalculated_atoms = result.update(structure)
+            print(result.totalArea())
+
+        Args:
+            structure: The :py:class:`.Structure` the result was
+                calculated for, after modification.
+
+        Returns:
+            A read-only memoryview of the indices (format `'i'`) of the
+            atoms whose areas were recalculated.
+
+        Raises:
+            AssertionError: if the result was not calculated with
+                `incremental=True`, or the structure has fewer atoms
+                than the result
+            BufferError: if atoms have been added while views from
+                :py:meth:`.Result.atomAreas()` are in use
+            Exception: something went wrong in calculation (see C
+                library error messages)
+        """
+        return _update_result(self, structure)
+
     def residueAreas(self):
         """
         Get SASA for all residues including relative areas if available for the
@@ -115,66 +213,142 @@ cdef class Result:
         Relative areas are normalized to 1, but can be > 1 for
         residues in unusual conformations or at the ends of chains.
 
+        The dictionary is built from :py:meth:`.Result.residueAreaColumns()`,
+        which is faster to use for large structures.
+
         Returns:
             dictionary
 
+        Raise:
+            AssertionError: If no results or structure has been associated
+                 with the object.
+        """
+        columns = self.residueAreaColumns()
+        values = [columns[field].tolist() for field in _residue_area_fields]
+        hasRelativeAreas = columns['hasRelativeAreas'].tolist()
+
+        result = {}
+        for k, (chainLabel, residueNumber, residueType) in \
+            enumerate(zip(columns['chain'], columns['residueNumber'], columns['residueType'])):
+            area = ResidueArea()
+            area.residueType = residueType
+            area.residueNumber = residueNumber
+            area.total, area.mainChain, area.sideChain, area.polar, area.apolar = \
+                [v[k] for v in values[0:5]]
+            if hasRelativeAreas[k]:
+                area.hasRelativeAreas = True
+                area.relativeTotal, area.relativeMainChain, area.relativeSideChain, \
+                    area.relativePolar, area.relativeApolar = [v[k] for v in values[5:10]]
+
+            if chainLabel not in result:
+                result[chainLabel] = {}
+            result[chainLabel][residueNumber] = area
+
+        return result
+
+    def residueAreaColumns(self):
+        """
+        Get SASA for all residues as columns.
+
+        Contains the same values as :py:meth:`.Result.residueAreas()`,
+        but with one entry per column instead of one object per
+        residue. The columns are built in one pass when first
+        requested, and then kept with the result. Residues are in the
+        order they appear in the structure.
+
+        The keys are the names of the attributes of
+        :py:class:`.ResidueArea`, plus ``'chain'``. The chain labels,
+        residue numbers and residue types are tuples of strings, the
+        rest are read-only memoryviews of floats (``'hasRelativeAreas'``
+        of booleans). Relative areas are NaN for residues without
+        reference values.
+
+        Returns:
+            dict: Columns with one value per residue
+
         Raise:
             AssertionError: If no results or structure has been associated
                  with the object.
         """
         assert(self._c_result is not NULL)
-        assert(self._c_root_node is not NULL, "Result.residueAreas can only be called on results generated directly or indirectly by freesasa.calc()")
+        assert self._rootNode() is not NULL, \
+            "Result.residueAreas can only be called on results generated directly or indirectly by freesasa.calc()"
 
+        if self._residue_columns is None:
+            self._residue_columns = self._residueColumns()
+        return dict(self._residue_columns)
+
+    def _residueColumns(self):
         cdef freesasa_node* result_node = <freesasa_node*> freesasa_node_children(self._c_root_node)
         cdef freesasa_node* structure = <freesasa_node*> freesasa_node_children(result_node)
         cdef freesasa_node* chain
         cdef freesasa_node* residue
-        cdef freesasa_nodearea* c_area
-        cdef freesasa_nodearea* c_ref_area
+        cdef const freesasa_nodearea* c_area
+        cdef const freesasa_nodearea* c_ref_area
+        cdef Py_ssize_t n = 0, k = 0
+        cdef double[::1] a
+        cdef unsigned char[::1] has_ref
 
-        result = {}
+        chain = <freesasa_node*> freesasa_node_children(structure)
+        while (chain != NULL):
+            n += freesasa_node_chain_n_residues(chain)
+            chain = <freesasa_node*> freesasa_node_next(chain)
+
+        areas = array('d', [0]) * (len(_residue_area_fields) * n)
+        hasRelativeAreas = array('B', [0]) * n
+        a = areas
+        has_ref = hasRelativeAreas
+        chains = []
+        numbers = []
+        types = []
 
         chain = <freesasa_node*> freesasa_node_children(structure)
         while (chain != NULL):
-            residue  = <freesasa_node*> freesasa_node_children(chain)
             chainLabel = freesasa_node_name(chain)
-            result[chainLabel] = {}
+            residue = <freesasa_node*> freesasa_node_children(chain)
 
             while (residue != NULL):
-                c_area = <freesasa_nodearea*> freesasa_node_area(residue)
-                c_ref_area = <freesasa_nodearea*> freesasa_node_residue_reference(residue)
-                residueNumber = freesasa_node_residue_number(residue).strip()
-                residueType = freesasa_node_name(residue).strip()
-
-                area = ResidueArea()
-
-                area.residueType = residueType
-                area.residueNumber = residueNumber
-
-                area.total = c_area.total
-                area.mainChain = c_area.main_chain
-                area.sideChain = c_area.side_chain
-                area.polar = c_area.polar
-                area.apolar = c_area.apolar
+                c_area = freesasa_node_area(residue)
+                c_ref_area = freesasa_node_residue_reference(residue)
+                chains.append(chainLabel)
+                numbers.append(freesasa_node_residue_number(residue).strip())
+                types.append(freesasa_node_name(residue).strip())
+
+                a[k] = c_area.total
+                a[n + k] = c_area.main_chain
+                a[2*n + k] = c_area.side_chain
+                a[3*n + k] = c_area.polar
+                a[4*n + k] = c_area.apolar
 
                 if (c_ref_area is not NULL):
-                    area.hasRelativeAreas = True
-                    area.relativeTotal = self._safe_div(c_area.total, c_ref_area.total)
-                    area.relativeMainChain = self._safe_div(c_area.main_chain, c_ref_area.main_chain)
-                    area.relativeSideChain = self._safe_div(c_area.side_chain, c_ref_area.side_chain)
-                    area.relativePolar = self._safe_div(c_area.polar, c_ref_area.polar)
-                    area.relativeApolar = self._safe_div(c_area.apolar, c_ref_area.apolar)
-
-                result[chainLabel][residueNumber] = area
-
+                    has_ref[k] = 1
+                    a[5*n + k] = _c_safe_div(c_area.total, c_ref_area.total)
+                    a[6*n + k] = _c_safe_div(c_area.main_chain, c_ref_area.main_chain)
+                    a[7*n + k] = _c_safe_div(c_area.side_chain, c_ref_area.side_chain)
+                    a[8*n + k] = _c_safe_div(c_area.polar, c_ref_area.polar)
+                    a[9*n + k] = _c_safe_div(c_area.apolar, c_ref_area.apolar)
+                else:
+                    a[5*n + k] = a[6*n + k] = a[7*n + k] = a[8*n + k] = a[9*n + k] = NAN
+
+                k += 1
                 residue = <freesasa_node*> freesasa_node_next(residue)
 
             chain = <freesasa_node*> freesasa_node_next(chain)
 
-        return result
+        assert(k == n)
+
+        columns = {'chain' : tuple(chains),
+                   'residueNumber' : tuple(numbers),
+                   'residueType' : tuple(types),
+                   'hasRelativeAreas' : _array_view(hasRelativeAreas, &has_ref[0] if n > 0 else NULL,
+                                                    '?', sizeof(unsigned char), (n,))}
+        for i, field in enumerate(_residue_area_fields):
+            columns[field] = _array_view(areas, &a[i*n] if n > 0 else NULL,
+                                         'd', sizeof(double), (n,))
+        return columns
 
     def write_pdb(self, filename):
-        if self._c_root_node is NULL:
+        if self._rootNode() is NULL:
             raise AssertionError('Result root node points to NULL. Unable to write to a pdb file.')
 
         cdef freesasa_node *result_node    = <freesasa_node*> freesasa_node_children(self._c_root_node)
@@ -196,6 +370,112 @@ cdef class Result:
         freesasa_write_pdb(f, self._c_root_node)
         fclose(f)
 
+    def estimatedError(self):
+        """
+        Get the estimated error of the calculation.
+
+        Only available if the parameters were chosen by
+        :py:meth:`.Parameters.forTolerance()`.
+
+        Returns:
+            dict: The relative error of the total area (key `'total'`)
+            and the root mean square error of residue areas in Å^2
+            (key `'residue'`), or `None` if not available.
+        """
+        if self._error_model is None:
+            return None
+        k = _default_atoms_per_residue
+        if self._structure is not None:
+            k = _structureSize(self._structure)[1]
+        return _estimateError(self._error_model[0], self._error_model[1], self.nAtoms(), k)
+
+    def stats(self):
+        """
+        Statistics from the calculation.
+
+        Only collected while enabled by :py:func:`.setStatsEnabled`.
+        Times are in seconds. The keys are
+
+        - ``'atoms'``: number of atoms,
+        - ``'algorithm'``: :py:data:`.LeeRichards` or :py:data:`.ShrakeRupley`,
+        - ``'threads'``: number of threads used,
+        - ``'neighbourPairs'``: number of pairs of atoms whose spheres
+          (radius plus probe) overlap,
+        - ``'slices'`` (Lee & Richards) or ``'points'`` (Shrake &
+          Rupley): total number of slices or test points evaluated,
+        - ``'neighbourTime'``: time to build the neighbour list,
+        - ``'sasaTime'``: time of the SASA calculation proper,
+        - ``'treeTime'``: time to build the residue and chain tree,
+          once it has been built (see :py:func:`.calc`),
+        - ``'parseTime'`` and ``'radiiTime'``: from
+          :py:meth:`.Structure.stats()`, if available for the structure,
+        - ``'cacheHit'``: whether the result was found in the cache, if
+          a cache is used (see :py:func:`.setCache`),
+        - ``'cacheTime'``: time to read the result from the cache.
+          Results from the cache only have this, ``'atoms'``,
+          ``'cacheHit'``, and the tree, parse and radii times.
+
+        The C library builds the neighbour list as part of the
+        calculation, it is built once more to time and count it. The
+        calculation time is the total minus the neighbour list time.
+
+        Returns:
+            dict: The statistics, or `None` if not collected.
+        """
+        if self._stats is None:
+            return None
+        stats = dict(self._stats)
+        if self._structure is not None:
+            structureStats = self._structure.stats()
+            if structureStats is not None:
+                for key in ('parseTime', 'radiiTime'):
+                    if key in structureStats:
+                        stats[key] = structureStats[key]
+        return stats
+
+    def __reduce__(self):
+        header, parts = _resultState(self)
+        return (_resultFromState, (header, b''.join(parts)))
+
+    # Sets the structure the result was calculated for, the tree can
+    # be built from it as long as it isn't changed
+    cdef _setStructure(self, structure):
+        self._structure = structure
+        if structure is not None:
+            self._structure_changes = (<Structure> structure)._changes
+
+    # True if the structure has changed since the calculation
+    cdef bint _structureChanged(self):
+        return self._structure is not None and \
+            (<Structure> self._structure)._changes != self._structure_changes
+
+    cdef freesasa_node* _rootNode(self) except? NULL:
+        # The tree is built by calc(), or on first use if calc() was
+        # called with tree=False. Returns NULL if there is no structure
+        # to build it from (results from calcCoord()). The GIL is
+        # released while building, if another thread builds the tree
+        # in the meantime the first one is kept.
+        cdef const freesasa_structure *s = NULL
+        cdef freesasa_node *root
+        if self._c_root_node is NULL and self._c_result is not NULL \
+           and self._structure is not None:
+            assert not self._structureChanged(), \
+                "The structure has changed since the calculation, the result tree " \
+                "of calc(..., tree=False) has to be used before changing the structure"
+            self._structure._get_address(<size_t>&s)
+            start = _clock()
+            with nogil:
+                root = freesasa_tree_init(self._c_result, s, "Structure")
+            if root is NULL:
+                raise Exception("Error building result tree.")
+            if self._c_root_node is not NULL:
+                freesasa_node_free(root)
+            else:
+                self._c_root_node = root
+                if self._stats is not None:
+                    self._stats['treeTime'] = _clock() - start
+        return self._c_root_node
+
     def _safe_div(self,a,b):
         try:
             return a/b
@@ -0,0 +1,414 @@
+from cfreesasa cimport *
+from libc.stdlib cimport atoi, calloc, free
+from libc.string cimport strlen
+
+cdef extern from "ctype.h" nogil:
+    int isspace(int c)
+    int isdigit(int c)
+    int isalpha(int c)
+
+_selector_names = {E_SYMBOL: 'symbol', E_NAME: 'name', E_RESN: 'resn',
+                   E_RESI: 'resi', E_CHAIN: 'chain'}
+
+cdef void _free_expression(expression *e) nogil:
+    if e is not NULL:
+        _free_expression(e.left)
+        _free_expression(e.right)
+        free(e.value)
+        free(e)
+
+# Warning through the C library, to respect the verbosity
+cdef _warn(message):
+    cdef bytes b = message.encode('utf-8')
+    freesasa_warn("%s", <const char*> b)
+
+# True if the first word of s (i.e. sscanf(s, "%s")) equals id
+cdef bint _match_word(const char *s, const char *id) nogil:
+    cdef int i = 0
+    while isspace(s[0]):
+        s += 1
+    while s[i] != 0 and not isspace(s[i]):
+        if s[i] != id[i]:
+            return False
+        i += 1
+    return id[i] == 0
+
+cdef class Selection:
+    """
+    A selection of atoms, parsed once and applied to many structures.
+
+    Uses the same syntax as :py:func:`.selectArea()`, see
+    `select-syntax`_. The atoms selected in a :py:class:`.Structure`
+    are determined the first time the selection is applied to it, and
+    are then cached by the structure, until atoms are added to it.
+    The areas of a selection can therefore be summed over many
+    results, or over all frames of a trajectory, without evaluating
+    the selection again.
+
+    Usage::
+
+        selection = freesasa.Selection("s1, resn ala+arg")
+        for result in results:
+            print(selection.name(), selection.area(structure, result))
+
+        atom_areas, residue_areas = freesasa.calcTrajectory(structure, frames)
+        area_per_frame = selection.areas(structure, atom_areas)
+
+    Selections can also be passed to :py:func:`.selectArea()`
+    in place of commands.
+    """
+    cdef expression *_c_expression
+    cdef object _command
+
+    def __init__(self, command):
+        """
+        Constructor.
+
+        Args:
+            command (str): A selection using Pymol syntax, e.g.
+                ``"s1, resn ala+arg"`` or ``"s2, chain A and resi 1-5"``.
+
+        Raises:
+            Exception: Parser failed (typically syntax error), see
+                library error messages.
+        """
+        cdef freesasa_yyscan_t scanner
+        cdef YY_BUFFER_STATE state
+        cdef expression *e = NULL
+        cdef int err
+        cdef const char *c_command = command
+
+        if freesasa_yylex_init(&scanner):
+            raise Exception("Error parsing '%s'" % command)
+        state = freesasa_yy_scan_string(c_command, scanner)
+        err = freesasa_yyparse(&e, scanner)
+        freesasa_yy_delete_buffer(state, scanner)
+        freesasa_yylex_destroy(scanner)
+
+        if err or e is NULL:
+            _free_expression(e)
+            raise Exception("Error parsing '%s'" % command)
+
+        _free_expression(self._c_expression)
+        self._c_expression = e
+        self._command = command
+
+    def __dealloc__(self):
+        _free_expression(self._c_expression)
+
+    def __reduce__(self):
+        return (Selection, (self._command,))
+
+    def name(self):
+        """
+        Name of the selection.
+
+        Returns:
+            str: The name (``"s1"`` in ``"s1, resn ala+arg"``)
+        """
+        assert(self._c_expression is not NULL)
+        return self._c_expression.value
+
+    def command(self):
+        """
+        The command the selection was created from.
+
+        Returns:
+            str: The command
+        """
+        return self._command
+
+    def atoms(self, structure):
+        """
+        Indices of the selected atoms.
+
+        Args:
+            structure: A :py:class:`.Structure`
+
+        Returns:
+            A read-only memoryview of the indices (format `'i'`), in
+            increasing order.
+
+        Raises:
+            Exception: Selection can't be applied (see library error
+                messages).
+        """
+        cdef carray.array indices = structure._selectionIndices(self)
+        return _array_view(indices, indices.data.as_voidptr, 'i', sizeof(int), (len(indices),))
+
+    def area(self, structure, result):
+        """
+        Sum of the areas of the selected atoms.
+
+        Args:
+            structure: A :py:class:`.Structure`
+            result: :py:class:`.Result` from SASA calculation on structure
+
+        Returns:
+            float: The area
+
+        Raises:
+            AssertionError: if the result and the structure have
+                different number of atoms
+            Exception: Selection can't be applied (see library error
+                messages).
+        """
+        cdef const int[::1] atoms = structure._selectionIndices(self)
+        cdef const freesasa_result *r = NULL
+        cdef double total = 0
+        cdef int i
+
+        result._get_address(<size_t>&r)
+        assert(r is not NULL)
+        assert(r.n_atoms == structure.nAtoms()), "Result and structure have different number of atoms"
+
+        with nogil:
+            for i in range(atoms.shape[0]):
+                total += r.sasa[atoms[i]]
+
+        return total
+
+    def areas(self, structure, areas):
+        """
+        Sums of the areas of the selected atoms, for many results.
+
+        Args:
+            structure: A :py:class:`.Structure`
+            areas: A sequence of :py:class:`.Result` objects from
+                calculations on structure (or structures with the
+                same atoms), or atom areas of shape `(F, N)`, such as
+                the first return value of :py:func:`.calcTrajectory()`,
+                where N is the number of atoms in the structure.
+                C-contiguous float64 buffers are used without copying.
+
+        Returns:
+            A read-only memoryview with the area for each result or
+            row of areas.
+
+        Raises:
+            AssertionError: if the size of the results or areas
+                doesn't match the structure
+            Exception: Selection can't be applied (see library error
+                messages).
+        """
+        cdef const int[::1] atoms = structure._selectionIndices(self)
+        cdef int n_atoms = structure.nAtoms()
+        cdef const double[::1] a
+        cdef const freesasa_result *r = NULL
+        cdef double[::1] totals
+        cdef double total
+        cdef Py_ssize_t f, n_frames, offset
+        cdef int i
+
+        try:
+            memoryview(areas)
+        except TypeError:
+            totals_array = array('d', [self.area(structure, result) for result in areas])
+        else:
+            a = _double_view(areas)
+            assert(n_atoms > 0), "No atoms"
+            assert(a.shape[0] % n_atoms == 0), \
+                "Size of areas not a multiple of %d (number of atoms)" % n_atoms
+            n_frames = a.shape[0] // n_atoms
+            totals_array = array('d', [0]) * n_frames
+            if n_frames > 0:
+                totals = totals_array
+                with nogil:
+                    for f in range(n_frames):
+                        offset = f * n_atoms
+                        total = 0
+                        for i in range(atoms.shape[0]):
+                            total += a[offset + atoms[i]]
+                        totals[f] = total
+
+        return _array_view(totals_array, (<carray.array> totals_array).data.as_voidptr,
+                           'd', sizeof(double), (len(totals_array),))
+
+    # Returns the indices of the atoms in the structure at the address
+    # that match the selection, as array('i'). Used by
+    # Structure._selectionIndices(), which caches the result.
+    def _select(self, size_t structure_address):
+        cdef const freesasa_structure *s = <const freesasa_structure*> structure_address
+        cdef int n = freesasa_structure_n(<freesasa_structure*> s)
+        cdef unsigned char *mask = <unsigned char*> calloc(n + 1, 1)
+        cdef int i, n_selected = 0
+
+        assert(self._c_expression is not NULL)
+        if mask is NULL:
+            raise MemoryError()
+        try:
+            self._selectAtoms(self._c_expression, mask, s, n)
+            for i in range(n):
+                n_selected += mask[i]
+            indices = array('i', [0]) * n_selected
+            n_selected = 0
+            for i in range(n):
+                if mask[i]:
+                    indices[n_selected] = i
+                    n_selected += 1
+        finally:
+            free(mask)
+
+        return indices
+
+    # The functions below evaluate the expression tree in the same way
+    # as select_atoms() and its helpers in the C library (selection.c).
+    # Invalid identifiers and ranges are ignored with a warning,
+    # malformed expressions raise exceptions.
+
+    cdef int _selectAtoms(self, const expression *e, unsigned char *mask,
+                          const freesasa_structure *s, int n) except -1:
+        cdef unsigned char *left = NULL
+        cdef unsigned char *right = NULL
+        cdef int i
+
+        if e is NULL:
+            raise Exception("Error parsing '%s'" % self._command)
+
+        if e.type == E_SELECTION:
+            return self._selectAtoms(e.left, mask, s, n)
+
+        if e.type in (E_SYMBOL, E_NAME, E_RESN, E_RESI, E_CHAIN):
+            return self._selectList(e.type, e.left, mask, s, n)
+
+        if e.type == E_AND or e.type == E_OR:
+            left = <unsigned char*> calloc(n + 1, 1)
+            right = <unsigned char*> calloc(n + 1, 1)
+            try:
+                if left is NULL or right is NULL:
+                    raise MemoryError()
+                self._selectAtoms(e.left, left, s, n)
+                self._selectAtoms(e.right, right, s, n)
+                if e.type == E_AND:
+                    for i in range(n):
+                        mask[i] = left[i] and right[i]
+                else:
+                    for i in range(n):
+                        mask[i] = left[i] or right[i]
+            finally:
+                free(left)
+                free(right)
+            return 0
+
+        if e.type == E_NOT:
+            self._selectAtoms(e.right, mask, s, n)
+            for i in range(n):
+                mask[i] = not mask[i]
+            return 0
+
+        raise Exception("Error parsing '%s'" % self._command)
+
+    cdef int _selectList(self, expression_type parent, const expression *e,
+                         unsigned char *mask, const freesasa_structure *s, int n) except -1:
+        if e is NULL:
+            raise Exception("Error parsing '%s'" % self._command)
+
+        if e.type == E_PLUS:
+            self._selectList(parent, e.left, mask, s, n)
+            self._selectList(parent, e.right, mask, s, n)
+        elif e.type == E_RANGE and e.left is not NULL and e.right is not NULL \
+             or e.type == E_RANGE_OPEN_L and e.left is NULL and e.right is not NULL \
+             or e.type == E_RANGE_OPEN_R and e.left is not NULL and e.right is NULL:
+            self._selectRange(e.type, parent, e.left, e.right, mask, s, n)
+        elif e.type == E_ID or e.type == E_NUMBER:
+            if self._isValidId(parent, e):
+                self._selectId(parent, e.value, mask, s, n)
+        else:
+            raise Exception("Error parsing '%s'" % self._command)
+        return 0
+
+    cdef bint _isValidId(self, expression_type parent, const expression *e) except -1:
+        cdef const char *value = e.value
+        cdef size_t length = strlen(value)
+        cdef size_t i
+        cdef bint valid = True
+
+        if parent == E_NAME:
+            valid = length <= 4
+        elif parent == E_SYMBOL:
+            valid = e.type == E_ID and length <= 2
+        elif parent == E_RESN:
+            valid = length <= 3
+        elif parent == E_RESI:
+            # numbers, or numbers with insertion code (12A)
+            if e.type == E_ID:
+                valid = 1 < length <= 5 and isalpha(value[length - 1])
+                for i in range(length - 1):
+                    valid = valid and isdigit(value[i])
+        elif parent == E_CHAIN:
+            valid = length <= 1
+
+        if not valid:
+            _warn("select: %s: '%s' invalid, will be ignored" % (_selector_names[parent], e.value))
+        return valid
+
+    cdef int _selectId(self, expression_type parent, const char *id,
+                       unsigned char *mask, const freesasa_structure *s, int n) except -1:
+        cdef int i, count = 0
+        cdef bint match
+
+        for i in range(n):
+            if parent == E_NAME:
+                match = _match_word(freesasa_structure_atom_name(s, i), id)
+            elif parent == E_SYMBOL:
+                match = _match_word(freesasa_structure_atom_symbol(s, i), id)
+            elif parent == E_RESN:
+                match = _match_word(freesasa_structure_atom_res_name(s, i), id)
+            elif parent == E_RESI:
+                match = _match_word(freesasa_structure_atom_res_number(s, i), id)
+            else:
+                match = id[0] == freesasa_structure_atom_chain(s, i)
+            if match:
+                mask[i] = 1
+                count += 1
+
+        if count == 0:
+            _warn("Found no matches to %s '%s', typo?" % (_selector_names[parent], id))
+        return 0
+
+    cdef int _selectRange(self, expression_type range_type, expression_type parent,
+                          const expression *left, const expression *right,
+                          unsigned char *mask, const freesasa_structure *s, int n) except -1:
+        cdef int lower, upper, i, j
+
+        if parent == E_RESI:
+            # residues have integer numbering
+            if (left is not NULL and left.type != E_NUMBER) or \
+               (right is not NULL and right.type != E_NUMBER):
+                _warn("select: resi: range invalid, needs to be two numbers, will be ignored")
+                return 0
+        elif parent == E_CHAIN:
+            # chains can be numbered by both letters (common) and numbers (uncommon)
+            if left is NULL or right is NULL or left.type != right.type or \
+               (left.type == E_ID and (strlen(left.value) > 1 or strlen(right.value) > 1)):
+                _warn("select: chain: range invalid, should be two letters (A-C) "
+                      "or numbers (1-5), will be ignored")
+                return 0
+        else:
+            raise Exception("Error parsing '%s', ranges can only be used with resi and chain"
+                            % self._command)
+
+        if n == 0:
+            return 0
+
+        if range_type == E_RANGE_OPEN_L:
+            lower = atoi(freesasa_structure_atom_res_number(s, 0))
+            upper = atoi(right.value)
+        elif range_type == E_RANGE_OPEN_R:
+            lower = atoi(left.value)
+            upper = atoi(freesasa_structure_atom_res_number(s, n - 1))
+        elif left.type == E_NUMBER:
+            lower = atoi(left.value)
+            upper = atoi(right.value)
+        else:
+            lower = left.value[0]
+            upper = right.value[0]
+
+        for i in range(n):
+            if parent == E_RESI:
+                j = atoi(freesasa_structure_atom_res_number(s, i))
+            else:
+                j = freesasa_structure_atom_chain(s, i)
+            if lower <= j <= upper:
+                mask[i] = 1
+        return 0
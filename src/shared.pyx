@@ -0,0 +1,302 @@
+from cfreesasa cimport *
+from libc.string cimport memcpy, strncpy
+
+cdef extern from *:
+    """
+    /* Adds an atom with the given element symbol, instead of one
+       guessed from the atom name as freesasa_structure_add_atom_wopt()
+       does. */
+    static int freesasa_py_add_atom_symbol(freesasa_structure *structure,
+                                           const char *atom_name,
+                                           const char *residue_name,
+                                           const char *residue_number,
+                                           const char *symbol,
+                                           char chain_label,
+                                           double x, double y, double z,
+                                           const freesasa_classifier *classifier,
+                                           int options)
+    {
+        freesasa_cif_atom atom = {"ATOM", chain_label, residue_number, "?",
+                                  residue_name, atom_name, "?", symbol, x, y, z};
+        return freesasa_structure_add_cif_atom(structure, &atom, classifier, options);
+    }
+    """
+    int freesasa_py_add_atom_symbol(freesasa_structure *structure,
+                                    const char *atom_name,
+                                    const char *residue_name,
+                                    const char *residue_number,
+                                    const char *symbol,
+                                    char chain_label,
+                                    double x, double y, double z,
+                                    const freesasa_classifier *classifier,
+                                    int options) nogil
+
+# Version of the binary encoding below, stored in the headers
+_state_version = 2
+
+# Width of the element symbols in the encoding
+cdef int _symbol_width = 2
+
+# The state of structures and results is a tuple (header, parts),
+# where the header is a small tuple and parts a list of byte buffers
+# that together make up the data. The data is a compact binary
+# encoding, with the doubles first so that they are aligned if the
+# data is.
+
+# Structure data: the coordinates and radii (native doubles),
+# followed by the atom names, residue names, residue numbers, chain
+# labels and element symbols as fixed-width strings (see
+# Structure.atomNames()).
+cdef object _structureState(Structure structure):
+    columns = [structure.coords(), structure.radii(),
+               structure.atomNames(), structure.residueNames(),
+               structure.residueNumbers(), structure.chainLabels()]
+    header = (_state_version, sys.byteorder, structure.nAtoms(),
+              tuple([column.itemsize for column in columns[2:]] + [_symbol_width]),
+              structure._c_options, structure._classifier)
+    return header, [bytes(column) for column in columns] + [_symbols(structure)]
+
+# The element symbols of the atoms of a structure, as read from the
+# PDB file or guessed from the atom names, padded by null bytes
+cdef bytes _symbols(Structure structure):
+    cdef const freesasa_structure *s = structure._c_structure
+    cdef int i, n = structure.nAtoms()
+    cdef bytearray symbols = bytearray(_symbol_width * n)
+    cdef char *data = symbols
+    cdef const char *symbol
+    with nogil:
+        for i in range(n):
+            symbol = freesasa_structure_atom_symbol(s, i)
+            strncpy(&data[_symbol_width * i], symbol, _symbol_width)
+    return bytes(symbols)
+
+# Splits data into columns of the given sizes
+cdef list _columns(data, sizes):
+    view = memoryview(data).cast('B')
+    assert view.nbytes >= sum(sizes), "Data is truncated"
+    columns = []
+    offset = 0
+    for size in sizes:
+        columns.append(view[offset:offset + size])
+        offset += size
+    return columns
+
+# Returns a column of doubles in native byte order
+cdef object _doubleColumn(column, byteorder):
+    if byteorder == sys.byteorder:
+        return column.cast('d')
+    values = array('d', column.tobytes())
+    values.byteswap()
+    return values
+
+# Recreates a structure from the state from _structureState(), data
+# can be any bytes-like object
+def _structureFromState(header, data):
+    cdef Structure structure
+    cdef freesasa_structure *s
+    cdef const double[::1] xyz
+    cdef const unsigned char[::1] atom_names, residue_names, residue_numbers, chain_labels, symbols
+    cdef int i, n, aw, rw, nw, cw, sw, ret = FREESASA_SUCCESS
+    cdef const freesasa_classifier *classifier = NULL
+
+    version, byteorder, n, (aw, rw, nw, cw, sw), options, c_classifier = header
+    assert version == _state_version, "Unknown format version %s" % version
+
+    columns = _columns(data, [3 * n * sizeof(double), n * sizeof(double),
+                              n * aw, n * rw, n * nw, n * cw, n * sw])
+    xyz = _doubleColumn(columns[0], byteorder)
+    radii = _doubleColumn(columns[1], byteorder)
+    atom_names, residue_names, residue_numbers, chain_labels, symbols = columns[2:]
+
+    structure = Structure(None, c_classifier)
+    s = structure._c_structure
+    classifier = structure._c_classifier
+
+    # null-terminated copies of the strings of one atom
+    buffer = bytearray(aw + rw + nw + sw + 4)
+    cdef char *atom_name = buffer
+    cdef char *residue_name = atom_name + aw + 1
+    cdef char *residue_number = residue_name + rw + 1
+    cdef char *symbol = residue_number + nw + 1
+
+    # the atoms have already passed the options once, and the radii
+    # are set explicitly below, so no atoms are skipped here, and
+    # warnings about guessed radii are suppressed (see _silence())
+    _silence()
+    try:
+        with nogil:
+            for i in range(n):
+                memcpy(atom_name, &atom_names[i*aw], aw)
+                memcpy(residue_name, &residue_names[i*rw], rw)
+                memcpy(residue_number, &residue_numbers[i*nw], nw)
+                memcpy(symbol, &symbols[i*sw], sw)
+                ret = freesasa_py_add_atom_symbol(s, atom_name, residue_name, residue_number, symbol,
+                                                  chain_labels[i*cw], xyz[3*i], xyz[3*i + 1], xyz[3*i + 2],
+                                                  classifier, 0)
+                if ret == FREESASA_FAIL or freesasa_structure_n(s) != i + 1:
+                    ret = FREESASA_FAIL
+                    break
+    finally:
+        _unsilence()
+
+    if ret == FREESASA_FAIL:
+        raise Exception("Error recreating structure.")
+    structure.setRadii(radii)
+    structure._c_options = options
+    return structure
+
+# Result data: the atom areas (native doubles), followed by the data
+# of the structure the result was calculated for, if there is one.
+# The structure is needed to build the result tree.
+cdef object _resultState(Result result):
+    assert(result._c_result is not NULL)
+    structure = result._structure
+    if result._structureChanged():
+        # the structure no longer matches the result
+        structure = None
+    parameters = Parameters()
+    (<Parameters> parameters)._c_param = result._c_result.parameters
+    (<Parameters> parameters)._error_model = result._error_model
+    structure_header, parts = _structureState(structure) if structure is not None else (None, [])
+    header = (_state_version, sys.byteorder, result.nAtoms(), result.totalArea(),
+              parameters, structure_header)
+    return header, [bytes(result.atomAreas())] + parts
+
+# Recreates a result from the state from _resultState(), data can be
+# any bytes-like object
+def _resultFromState(header, data):
+    cdef Result result = Result()
+    cdef freesasa_result c_result
+    cdef const double[::1] sasa
+    cdef Py_ssize_t size
+
+    version, byteorder, n, total, parameters, structure_header = header
+    assert version == _state_version, "Unknown format version %s" % version
+
+    size = n * sizeof(double)
+    columns = _columns(data, [size])
+    sasa = _doubleColumn(columns[0], byteorder)
+
+    c_result.n_atoms = n
+    c_result.total = total
+    c_result.sasa = <double*> &sasa[0] if n > 0 else NULL
+    c_result.parameters = (<Parameters> parameters)._c_param
+    result._error_model = (<Parameters> parameters)._error_model
+    result._c_result = freesasa_result_clone(&c_result)
+    if result._c_result is NULL:
+        raise MemoryError()
+
+    if structure_header is not None:
+        structure = _structureFromState(structure_header, memoryview(data).cast('B')[size:])
+        result._setStructure(structure)
+
+    return result
+
+
+class Shared:
+    """
+    A :py:class:`.Structure` or :py:class:`.Result` in shared memory.
+
+    Structures and results can be pickled, and thus be passed to other
+    processes, for example with :py:mod:`multiprocessing` or
+    :py:class:`concurrent.futures.ProcessPoolExecutor`. Their data is
+    then copied once per task. A :py:class:`.Shared` object instead
+    places the data in a block of shared memory
+    (:py:mod:`multiprocessing.shared_memory`, requires Python 3.8),
+    and only the name of the block is pickled. Each process can then
+    recreate the object from the shared memory with
+    :py:meth:`.Shared.get()`, without the data being sent to it.
+
+    The block is removed when the :py:class:`.Shared` object that
+    created it is closed, or used as a context manager ::
+
+        with freesasa.Shared(structure) as shared:
+            with ProcessPoolExecutor() as executor:
+                areas = list(executor.map(worker, [shared] * 10))
+
+        def worker(shared):
+            return freesasa.calc(shared.get()).totalArea()
+
+    Args:
+        obj: The :py:class:`.Structure` or :py:class:`.Result` to share.
+
+    Raises:
+        TypeError: if the object is not a structure or result
+        ImportError: if shared memory is not available
+    """
+
+    def __init__(self, obj):
+        try:
+            from multiprocessing import shared_memory
+        except ImportError:
+            raise ImportError("Shared requires multiprocessing.shared_memory (Python 3.8)")
+
+        if isinstance(obj, Structure):
+            self._restore = _structureFromState
+            header, parts = _structureState(obj)
+        elif isinstance(obj, Result):
+            self._restore = _resultFromState
+            header, parts = _resultState(obj)
+        else:
+            raise TypeError("Can't share object of type '%s'" % type(obj).__name__)
+
+        self._header = header
+        self._size = sum([len(part) for part in parts])
+        self._shm = shared_memory.SharedMemory(create=True, size=max(self._size, 1))
+        offset = 0
+        for part in parts:
+            self._shm.buf[offset:offset + len(part)] = part
+            offset += len(part)
+        self.name = self._shm.name
+
+    def get(self):
+        """
+        Recreate the shared object.
+
+        Returns:
+            A new :py:class:`.Structure` or :py:class:`.Result`, equal
+            to the one that was shared.
+
+        Raises:
+            FileNotFoundError: if the shared memory has been removed
+        """
+        from multiprocessing import shared_memory
+
+        shm = self._shm
+        if shm is None:
+            try:
+                # Python >= 3.13, the creator is responsible for the block
+                shm = shared_memory.SharedMemory(name=self.name, track=False)
+            except TypeError:
+                shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            data = shm.buf[:self._size]
+            try:
+                return self._restore(self._header, data)
+            finally:
+                data.release()
+        finally:
+            if shm is not self._shm:
+                shm.close()
+
+    def close(self):
+        """
+        Remove the shared memory, if this object created it.
+
+        Other processes can't call :py:meth:`.Shared.get()` after this.
+        """
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shm'] = None
+        return state
@@ -0,0 +1,100 @@
+from time import perf_counter as _clock
+from cfreesasa cimport *
+
+# whether statistics are collected, see setStatsEnabled()
+cdef bint _stats_enabled = False
+
+# called with each set of statistics, see setStatsCallback()
+cdef object _stats_callback = None
+
+def setStatsEnabled(enabled):
+    """
+    Enable or disable the collection of statistics.
+
+    When enabled, :py:class:`.Structure`, :py:func:`.structureArray`
+    and :py:func:`.calc` record how much time each phase of the work
+    took, and counters such as the number of neighbour pairs. These
+    are available from :py:meth:`.Structure.stats()` and
+    :py:meth:`.Result.stats()`, and are passed to the callback set by
+    :py:func:`.setStatsCallback`. Disabled by default, calculations
+    then have no additional cost.
+
+    When enabled, the neighbour list is built once more per
+    calculation to time and count it, see :py:meth:`.Result.stats()`.
+
+    Args:
+        enabled (bool): Whether to collect statistics.
+    """
+    global _stats_enabled
+    _stats_enabled = enabled
+
+def getStatsEnabled():
+    """
+    Whether statistics are collected, see :py:func:`.setStatsEnabled`.
+
+    Returns:
+        bool: True if enabled.
+    """
+    return _stats_enabled
+
+def setStatsCallback(callback):
+    """
+    Set a function to report statistics to.
+
+    While statistics are enabled (see :py:func:`.setStatsEnabled`),
+    the callback is called with two arguments when a structure has
+    been read or a calculation is done: the operation (``'structure'``
+    or ``'calc'``), and the statistics as a dict (the same as from
+    :py:meth:`.Structure.stats()` or :py:meth:`.Result.stats()`). It
+    is called in the thread that did the work.
+
+    Args:
+        callback: Function, or None to remove the callback.
+    """
+    global _stats_callback
+    assert callback is None or callable(callback), "Callback must be callable"
+    _stats_callback = callback
+
+cdef _reportStats(operation, dict stats):
+    if _stats_callback is not None:
+        _stats_callback(operation, dict(stats))
+
+# Counters for the calculation of SASA for s with parameters p, and
+# the time to build the neighbour list. The C library builds the list
+# as part of the calculation, it is built once more here to time and
+# count it.
+cdef dict _calcStats(const freesasa_structure *s, const freesasa_parameters *p):
+    cdef int i, n = freesasa_structure_n(<freesasa_structure*> s)
+    cdef const double *r = freesasa_structure_radius(s)
+    cdef long pairs = 0
+    cdef nb_list *nb = NULL
+
+    if p is NULL:
+        p = &freesasa_default_parameters
+
+    radii = array('d', [0]) * n
+    cdef double[::1] R = radii
+    for i in range(n):
+        R[i] = r[i] + p.probe_radius
+
+    start = _clock()
+    if n > 0:
+        with nogil:
+            nb = freesasa_nb_new(freesasa_structure_xyz(s), &R[0])
+    neighbourTime = _clock() - start
+    if nb is not NULL:
+        for i in range(n):
+            pairs += nb.nn[i]
+        freesasa_nb_free(nb)
+
+    stats = {'atoms' : n,
+             'threads' : max(1, min(p.n_threads, n)),
+             'neighbourPairs' : pairs // 2,
+             'neighbourTime' : neighbourTime}
+    if p.alg == FREESASA_SHRAKE_RUPLEY:
+        stats['algorithm'] = ShrakeRupley
+        stats['points'] = n * p.shrake_rupley_n_points
+    else:
+        stats['algorithm'] = LeeRichards
+        stats['slices'] = n * p.lee_richards_n_slices
+    return stats
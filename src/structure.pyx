@@ -1,8 +1,32 @@
 import string
 import warnings
 from cfreesasa cimport *
-from libc.stdio cimport FILE, fopen, fclose
+from libc.stdio cimport FILE
 from libc.stdlib cimport malloc, realloc
+from libc.string cimport memcpy, memset, strlen
+from cpython.bytes cimport PyBytes_FromStringAndSize, PyBytes_AS_STRING
+
+# Warnings from the C library are suppressed while structures are
+# read for pure Python classifiers (radii are assigned afterwards).
+# The verbosity is global, so concurrent readers count how many are in
+# progress, and the last one restores the verbosity. These functions
+# don't release the GIL, i.e. they are atomic with respect to other
+# threads, and the reading itself can be done without the GIL.
+cdef int _silenced = 0
+cdef freesasa_verbosity _saved_verbosity = FREESASA_V_NORMAL
+
+cdef void _silence():
+    global _silenced, _saved_verbosity
+    if _silenced == 0:
+        _saved_verbosity = freesasa_get_verbosity()
+        freesasa_set_verbosity(FREESASA_V_SILENT)
+    _silenced += 1
+
+cdef void _unsilence():
+    global _silenced
+    _silenced -= 1
+    if _silenced == 0:
+        freesasa_set_verbosity(_saved_verbosity)
 
 cdef class Structure:
     """
@@ -40,6 +64,28 @@ cdef class Structure:
     cdef const freesasa_classifier* _c_classifier
     cdef int _c_options
 
+    # the Classifier _c_classifier belongs to (None for the default)
+    cdef object _classifier
+
+    # class indices of the atoms for the last classifier used in
+    # classifyResults(), see _classIndices()
+    cdef object _class_cache
+
+    # atom indices selected by Selection objects, see _selectionIndices()
+    cdef object _selection_cache
+
+    # number of views of the coordinates and radii in use, atoms
+    # can't be added (which reallocates the arrays) while there are any
+    cdef Py_ssize_t _exports
+
+    # statistics from reading the structure, see stats()
+    cdef dict _stats
+
+    # number of changes to the atoms, coordinates or radii, results
+    # compare it to decide if they can still build their tree from
+    # the structure, see Result._rootNode()
+    cdef unsigned long _changes
+
     defaultOptions = {
         'hetatm' : False,
         'hydrogen' : False,
@@ -65,8 +111,18 @@ cdef class Structure:
         structure with the given classifier and options. Atoms will then
         have to be added manually using `:py:meth:`.Structure.addAtom()`.
 
+        The PDB input can be a file name (`str`, `bytes` or a path
+        object, as for `open()`), the contents of a file in a buffer
+        (`bytearray`, `memoryview`, `mmap.mmap`, ...) or a file-like
+        object with a `read()` method. Buffers are parsed in place, a
+        memory-mapped file is thus parsed without copying it. To
+        parse the contents of a `bytes` object, wrap it in a
+        `memoryview`. Gzip and bzip2 compressed input is recognized
+        and decompressed in memory.
+
         Args:
-            fileName (str): PDB file (if `None` empty structure generated).
+            fileName: PDB file name, contents or file object (if `None`
+                empty structure generated).
             classifier: An optional :py:class:`.Classifier` to calculate atomic
                 radii, uses default if none provided.
                 This classifier will also be used in calls to :py:meth:`.Structure.addAtom()`
@@ -92,6 +148,7 @@ cdef class Structure:
             classifier = Classifier()
         if classifier._isCClassifier():
             classifier._get_address(<size_t>&self._c_classifier)
+            self._classifier = classifier
 
         Structure._validate_options(options)
         self._c_options = Structure._get_bitfield_from_options(options)
@@ -102,23 +159,30 @@ cdef class Structure:
             self._initFromFile(fileName, classifier)
 
     def _initFromFile(self, fileName, classifier):
-        cdef FILE *input
-        input = fopen(fileName,'rb')
-        if input is NULL:
-            raise IOError("File '%s' could not be opened." % fileName)
-
-        if not classifier._isCClassifier(): # supress warnings
-            setVerbosity(silent)
-
-        self._c_structure = freesasa_structure_from_pdb(input, self._c_classifier, self._c_options)
-
-        if not classifier._isCClassifier():
-            setVerbosity(normal)
-
-        fclose(input)
+        cdef bint collect = _stats_enabled
+        if collect:
+            start = _clock()
+        cdef _Input source = _Input(fileName)
+        cdef FILE *input = source.file()
+        cdef freesasa_structure *c_structure
+        cdef bint silence = not classifier._isCClassifier()
+
+        if silence:
+            _silence()
+        with nogil:
+            c_structure = freesasa_structure_from_pdb(input, self._c_classifier, self._c_options)
+        if silence:
+            _unsilence()
+        source.close()
+
+        self._c_structure = c_structure
 
         if self._c_structure is NULL:
-            raise Exception("Error reading '%s'." % fileName)
+            raise Exception("Error reading '%s'." % source.name)
+
+        if collect:
+            self._stats = {'atoms' : self.nAtoms(), 'parseTime' : _clock() - start}
+            start = _clock()
 
         # for pure Python classifiers we use the default
         # classifier above to initialize the structure and then
@@ -126,6 +190,11 @@ cdef class Structure:
         if (not classifier._isCClassifier()):
             self.setRadiiWithClassifier(classifier)
 
+        if collect:
+            # with C classifiers the radii are assigned while parsing
+            self._stats['radiiTime'] = _clock() - start
+            _reportStats('structure', self.stats())
+
 
     def addAtom(self, atomName, residueName, residueNumber, chainLabel, x, y, z):
         """
@@ -154,8 +223,13 @@ cdef class Structure:
 
         Raises:
             Exception: Residue-number invalid
+            BufferError: views from :py:meth:`.Structure.coords()` or
+                :py:meth:`.Structure.radii()` are in use
             AssertionError:
         """
+        if self._exports > 0:
+            raise BufferError("Can't add atoms while views of the coordinates or radii are in use")
+
         if (type(residueNumber) is str):
             resnum = residueNumber
         elif (type(residueNumber) is int):
@@ -172,11 +246,24 @@ cdef class Structure:
             self._c_classifier, self._c_options)
 
         assert(ret != FREESASA_FAIL)
+        self._class_cache = None
+        self._selection_cache = None
+        self._changes += 1
 
     def addAtoms(self, atomNames, residueNames, residueNumbers, chainLabels, xs, ys, zs):
         """
         Add multiple atoms to structure.
 
+        Works like :py:meth:`.Structure.addAtom()` for each atom, but
+        the atoms are added in one pass in C. Coordinates can be
+        given as lists or as buffers, such as NumPy arrays, names as
+        lists or as fixed-width byte arrays (NumPy arrays with dtype
+        ``'S4'`` or the arrays returned by :py:meth:`.Structure.atomNames()`
+        etc), which are read without conversion.
+
+        Atoms that can't be added (see :py:meth:`.Structure.addAtom()`)
+        are skipped, and their indices returned.
+
         Args:
             atomNames (list): list of atom name (e.g. `["CA"]`)
             residueNames (list): list of residue name (e.g. `["ALA"]`)
@@ -186,15 +273,75 @@ cdef class Structure:
             chainLabels (list): list of 1-character string with chain label (e.g. ['A'])
                 xs,ys,zs (list): list of coordinates
 
+        Returns:
+            list: Indices of the atoms that were not added (empty if
+            all were added).
+
         Raises:
             AssertionError: inconsistent size of input args
+            Exception: Names or residue numbers of invalid type
+            BufferError: views from :py:meth:`.Structure.coords()` or
+                :py:meth:`.Structure.radii()` are in use
         """
-        assert(len(set([len(atomNames), len(residueNames), len(residueNumbers), \
-            len(chainLabels), len(xs), len(ys), len(zs)])) == 1), "Inconsistent size of input args"
-
-        for i in range(len(atomNames)):
-            self.addAtom(atomNames[i], residueNames[i], residueNumbers[i], \
-                chainLabels[i], xs[i], ys[i], zs[i])
+        assert(self._c_structure is not NULL)
+        if self._exports > 0:
+            raise BufferError("Can't add atoms while views of the coordinates or radii are in use")
+
+        atom_data, atom_width = _string_array(atomNames)
+        res_data, res_width = _string_array(residueNames)
+        number_data, number_width = _string_array(residueNumbers, allow_int=True)
+        chain_data, chain_width = _string_array(chainLabels)
+
+        cdef const unsigned char[::1] atom_names = atom_data
+        cdef const unsigned char[::1] residue_names = res_data
+        cdef const unsigned char[::1] residue_numbers = number_data
+        cdef const unsigned char[::1] chain_labels = chain_data
+        cdef const double[::1] x = _double_view(xs)
+        cdef const double[::1] y = _double_view(ys)
+        cdef const double[::1] z = _double_view(zs)
+        cdef Py_ssize_t n = x.shape[0]
+        cdef int aw = atom_width, rw = res_width, nw = number_width, cw = chain_width
+
+        assert(len(set([atom_names.shape[0] // aw, residue_names.shape[0] // rw,
+                        residue_numbers.shape[0] // nw, chain_labels.shape[0] // cw,
+                        n, y.shape[0], z.shape[0]])) == 1), "Inconsistent size of input args"
+
+        cdef freesasa_structure *s = self._c_structure
+        cdef const freesasa_classifier *classifier = self._c_classifier
+        cdef int options = self._c_options
+        cdef Py_ssize_t i
+        cdef int n_before, ret
+        rejected_array = array('B', [0]) * n
+        cdef unsigned char[::1] rejected = rejected_array
+
+        # null-terminated copies of the strings of one atom
+        buffer = bytearray(aw + rw + nw + 3)
+        cdef char *atom_name = buffer
+        cdef char *residue_name = atom_name + aw + 1
+        cdef char *residue_number = residue_name + rw + 1
+
+        self._class_cache = None
+        self._selection_cache = None
+        self._changes += 1
+
+        if n > 0:
+            with nogil:
+                for i in range(n):
+                    memcpy(atom_name, &atom_names[i*aw], aw)
+                    memcpy(residue_name, &residue_names[i*rw], rw)
+                    memcpy(residue_number, &residue_numbers[i*nw], nw)
+                    n_before = freesasa_structure_n(s)
+                    ret = freesasa_structure_add_atom_wopt(s, atom_name, residue_name, residue_number,
+                                                           chain_labels[i*cw], x[i], y[i], z[i],
+                                                           classifier, options)
+                    if ret == FREESASA_FAIL or freesasa_structure_n(s) == n_before:
+                        rejected[i] = 1
+
+        rejected_rows = []
+        for i in range(n):
+            if rejected[i]:
+                rejected_rows.append(i)
+        return rejected_rows
 
     def setRadiiWithClassifier(self,classifier):
         """
@@ -207,11 +354,30 @@ cdef class Structure:
             AssertionError: if structure not properly initialized
         """
         assert(self._c_structure is not NULL)
-        n = self.nAtoms()
-        r = []
-        for i in range(0,n):
-            r.append(classifier.radius(self.residueName(i), self.atomName(i)))
-        self.setRadii(r)
+        cdef Classifier c
+        cdef const freesasa_classifier *c_classifier = NULL
+        cdef const freesasa_structure *s = self._c_structure
+        cdef int i, n = self.nAtoms()
+        if not isinstance(classifier, Classifier):
+            # any object with a radius() method
+            self.setRadii([classifier.radius(self.residueName(i), self.atomName(i))
+                           for i in range(n)])
+            return
+        c = classifier
+        c_classifier = c._c_classifier
+        radii = array('d', [0]) * n
+        cdef double[::1] r = radii
+        if c._isCClassifier():
+            with nogil:
+                for i in range(n):
+                    r[i] = freesasa_classifier_radius(c_classifier,
+                                                      freesasa_structure_atom_res_name(s, i),
+                                                      freesasa_structure_atom_name(s, i))
+        else:
+            for i in range(n):
+                r[i] = c._cachedRadius(freesasa_structure_atom_res_name(s, i),
+                                       freesasa_structure_atom_name(s, i))
+        self.setRadii(radii)
 
     def setRadii(self,radiusArray):
         """
@@ -226,14 +392,14 @@ cdef class Structure:
                 negative radii (not properly classified?)
         """
         assert(self._c_structure is not NULL)
-        n = self.nAtoms()
-        assert len(radiusArray) == n
-        cdef double *r = <double *>malloc(sizeof(double)*n)
-        assert(r is not NULL)
+        cdef int i, n = self.nAtoms()
+        cdef const double[::1] r = _double_view(radiusArray)
+        assert r.shape[0] == n
         for i in range(0,n):
-            r[i] = radiusArray[i]
             assert(r[i] >= 0), "Error: Radius is <= 0 (" + str(r[i]) + ") for the residue: " + self.residueName(i) + ", atom: " + self.atomName(i)
-        freesasa_structure_set_radius(self._c_structure, r)
+        if n > 0:
+            freesasa_structure_set_radius(self._c_structure, &r[0])
+        self._changes += 1
 
     def nAtoms(self):
         """
@@ -283,6 +449,7 @@ cdef class Structure:
         assert(atomIndex >= 0 and atomIndex < self.nAtoms())
         assert(radius >= 0)
         freesasa_structure_atom_set_radius(self._c_structure, atomIndex, radius)
+        self._changes += 1
 
     def atomName(self,i):
         """
@@ -375,6 +542,218 @@ cdef class Structure:
         cdef const double *coord = freesasa_structure_coord_array(self._c_structure)
         return [coord[3*i], coord[3*i+1], coord[3*i+2]]
 
+    def setCoords(self, coords):
+        """
+        Replace the coordinates of all atoms.
+
+        Everything else about the structure (atoms, residues, radii)
+        is unchanged, which makes this useful for calculations on
+        several conformations of the same molecule (see also
+        :py:func:`.calcTrajectory`).
+
+        Args:
+            coords: array of size 3*N with the new coordinates
+                `(x1, y1, z1, ..., x_N, y_N, z_N)`, or of shape `(N, 3)`,
+                where N is the number of atoms. C-contiguous float64
+                buffers (NumPy arrays, `array.array('d')`) are read
+                without intermediate copies.
+
+        Raises:
+            AssertionError: if size of array doesn't match number of atoms
+                or Structure not properly initialized
+            ValueError: multidimensional array that isn't C-contiguous float64
+        """
+        assert(self._c_structure is not NULL)
+        cdef const double[::1] c = _double_view(coords)
+        cdef int n = self.nAtoms()
+        assert(c.shape[0] == 3*n), "Expected %d coordinates, got %d" % (3*n, c.shape[0])
+        if n > 0:
+            memcpy(<double*> freesasa_structure_coord_array(self._c_structure), &c[0], 3*n*sizeof(double))
+        self._changes += 1
+
+    def coords(self):
+        """
+        Get coordinates of all atoms.
+
+        The returned read-only view refers directly to the coordinates
+        stored in the structure, i.e. it reflects later calls to
+        :py:meth:`.Structure.setCoords()`. Atoms can't be added to the
+        structure while the view is in use. The view supports the
+        buffer protocol, e.g. ``numpy.asarray(structure.coords())``.
+
+        Returns:
+            memoryview: coordinates with shape `(N, 3)`
+
+        Raises:
+            AssertionError: if Structure not properly initialized
+        """
+        assert(self._c_structure is not NULL)
+        return _array_view(self, freesasa_structure_coord_array(self._c_structure),
+                           'd', sizeof(double), (self.nAtoms(), 3), &self._exports)
+
+    def radii(self):
+        """
+        Get radii of all atoms.
+
+        The returned read-only view refers directly to the radii
+        stored in the structure (see :py:meth:`.Structure.coords()`).
+
+        Returns:
+            memoryview: radii with shape `(N,)`
+
+        Raises:
+            AssertionError: if Structure not properly initialized
+        """
+        assert(self._c_structure is not NULL)
+        return _array_view(self, freesasa_structure_radius(self._c_structure),
+                           'd', sizeof(double), (self.nAtoms(),), &self._exports)
+
+    def atomNames(self):
+        """
+        Get names of all atoms.
+
+        The names are copied into one fixed-width byte array, where
+        each element is as wide as the longest name, and shorter names
+        are padded by null bytes. The names are not stripped, i.e. the
+        elements are the same as the values returned by
+        :py:meth:`.Structure.atomName()`, but as bytes. The array
+        supports the buffer protocol, e.g.
+        ``numpy.asarray(structure.atomNames())`` gives an array with
+        dtype ``'S4'`` for names from PDB files.
+
+        Returns:
+            memoryview: with struct format `'<width>s'` and shape `(N,)`
+
+        Raises:
+            AssertionError: if Structure not properly initialized
+        """
+        assert(self._c_structure is not NULL)
+        return _string_column(self._c_structure, freesasa_structure_atom_name)
+
+    def residueNames(self):
+        """
+        Get residue names of all atoms.
+
+        See :py:meth:`.Structure.atomNames()` for format.
+
+        Returns:
+            memoryview: with struct format `'<width>s'` and shape `(N,)`
+
+        Raises:
+            AssertionError: if Structure not properly initialized
+        """
+        assert(self._c_structure is not NULL)
+        return _string_column(self._c_structure, freesasa_structure_atom_res_name)
+
+    def residueNumbers(self):
+        """
+        Get residue numbers of all atoms.
+
+        See :py:meth:`.Structure.atomNames()` for format.
+
+        Returns:
+            memoryview: with struct format `'<width>s'` and shape `(N,)`
+
+        Raises:
+            AssertionError: if Structure not properly initialized
+        """
+        assert(self._c_structure is not NULL)
+        return _string_column(self._c_structure, freesasa_structure_atom_res_number)
+
+    def chainLabels(self):
+        """
+        Get chain labels of all atoms.
+
+        Returns:
+            memoryview: with struct format `'1s'` and shape `(N,)`
+
+        Raises:
+            AssertionError: if Structure not properly initialized
+        """
+        assert(self._c_structure is not NULL)
+        cdef const freesasa_structure *s = self._c_structure
+        cdef int i, n = freesasa_structure_n(<freesasa_structure*> s)
+        column = PyBytes_FromStringAndSize(NULL, n)
+        cdef char *data = PyBytes_AS_STRING(column)
+        for i in range(n):
+            data[i] = freesasa_structure_atom_chain(s, i)
+        return _array_view(column, data, '1s', 1, (n,))
+
+    # Returns the class names and an array with the index of the
+    # class of each atom (in the list of names) for the given
+    # classifier. Names are in order of first appearance. The arrays
+    # are cached for the last classifier used. For C classifiers
+    # everything is done in C, pure Python classifiers are looked up
+    # through their cache (see Classifier._cachedClass()), other
+    # objects with a classify() method directly.
+    def _classIndices(self, classifier):
+        assert(self._c_structure is not NULL)
+        cdef const freesasa_classifier *c_classifier = NULL
+        cdef const freesasa_structure *s = self._c_structure
+        cdef int n = self.nAtoms()
+        cdef int i, k = 0
+        cdef int first_seen[3]
+        cdef int[::1] indices
+
+        if isinstance(classifier, Classifier) and classifier._isCClassifier():
+            classifier._get_address(<size_t>&c_classifier)
+            key = <size_t> c_classifier
+        else:
+            key = id(classifier)
+
+        cache = self._class_cache
+        if cache is not None and cache[1] == key and len(cache[3]) == n:
+            return cache[2], cache[3]
+
+        index_array = array('i', [0]) * n
+        indices = index_array
+        names = []
+
+        if c_classifier is not NULL:
+            # map the C classes to their order of appearance
+            first_seen[:] = [-1, -1, -1]
+            with nogil:
+                for i in range(n):
+                    indices[i] = freesasa_classifier_class(c_classifier,
+                                                           freesasa_structure_atom_res_name(s, i),
+                                                           freesasa_structure_atom_name(s, i))
+                    if first_seen[indices[i]] < 0:
+                        first_seen[indices[i]] = k
+                        k += 1
+                    indices[i] = first_seen[indices[i]]
+            names = [None] * k
+            for i in range(3):
+                if first_seen[i] >= 0:
+                    names[first_seen[i]] = freesasa_classifier_class2str(<freesasa_atom_class> i)
+        else:
+            name_index = dict()
+            for i in range(n):
+                if isinstance(classifier, Classifier):
+                    name = (<Classifier> classifier)._cachedClass(freesasa_structure_atom_res_name(s, i),
+                                                                  freesasa_structure_atom_name(s, i))
+                else:
+                    name = classifier.classify(self.residueName(i), self.atomName(i))
+                index = name_index.setdefault(name, len(names))
+                if index == len(names):
+                    names.append(name)
+                indices[i] = index
+
+        # keep a reference to pure Python classifiers, so that the id isn't reused
+        self._class_cache = (classifier, key, names, index_array)
+        return names, index_array
+
+    # Returns the indices of the atoms selected by selection as
+    # array('i'), cached per selection until atoms are added
+    def _selectionIndices(self, selection):
+        assert(self._c_structure is not NULL)
+        if self._selection_cache is None:
+            self._selection_cache = dict()
+        indices = self._selection_cache.get(selection)
+        if indices is None:
+            indices = selection._select(<size_t> self._c_structure)
+            self._selection_cache[selection] = indices
+        return indices
+
     @staticmethod
     def _validate_options(param):
         # check validity of options
@@ -412,6 +791,33 @@ cdef class Structure:
             options |= FREESASA_HALT_AT_UNKNOWN
         return options
 
+    def stats(self):
+        """
+        Statistics from reading the structure.
+
+        Only collected while enabled by :py:func:`.setStatsEnabled`.
+        Times are in seconds. The keys are
+
+        - ``'atoms'``: number of atoms,
+        - ``'parseTime'``: time to read and parse the input (for
+          :py:func:`.structureArray`, the time to read all structures
+          in the input),
+        - ``'radiiTime'``: time to assign radii with a Python
+          classifier (C classifiers assign them while parsing),
+        - ``'structures'``: number of structures read from the input,
+          only for :py:func:`.structureArray`.
+
+        Returns:
+            dict: The statistics, or `None` if not collected.
+        """
+        if self._stats is None:
+            return None
+        return dict(self._stats)
+
+    def __reduce__(self):
+        header, parts = _structureState(self)
+        return (_structureFromState, (header, b''.join(parts)))
+
     def _get_address(self, size_t ptr2ptr):
         cdef freesasa_structure **p = <freesasa_structure**> ptr2ptr
         p[0] = self._c_structure
@@ -419,6 +825,9 @@ cdef class Structure:
     def _set_address(self, size_t ptr2ptr):
         cdef freesasa_structure **p = <freesasa_structure**> ptr2ptr
         self._c_structure = p[0]
+        self._class_cache = None
+        self._selection_cache = None
+        self._changes += 1
 
     ## The destructor
     def __dealloc__(self):
@@ -426,6 +835,38 @@ cdef class Structure:
             freesasa_structure_free(self._c_structure)
 
 
+# Returns the strings returned by get() for each atom in s as a
+# read-only fixed-width byte array, see Structure.atomNames()
+cdef object _string_column(const freesasa_structure *s,
+                           const char* (*get)(const freesasa_structure*, int)):
+    cdef int i, n = freesasa_structure_n(<freesasa_structure*> s)
+    cdef size_t length, width = 1
+    for i in range(n):
+        width = max(width, strlen(get(s, i)))
+
+    column = PyBytes_FromStringAndSize(NULL, n * width)
+    cdef char *data = PyBytes_AS_STRING(column)
+    memset(data, 0, n * width)
+    for i in range(n):
+        length = strlen(get(s, i))
+        memcpy(data + i * width, get(s, i), length)
+
+    return _array_view(column, data, '%ds' % width, width, (n,))
+
+# Reads all models/chains (separate != 0) or the first model from
+# input. Returns NULL on failure, n is set to the number of
+# structures.
+cdef freesasa_structure** _readStructureArray(FILE *input, int *n, bint separate, int options) nogil:
+    cdef freesasa_structure** sArray
+    if separate:
+        sArray = freesasa_structure_array(input, n, NULL, options)
+    else:
+        sArray = <freesasa_structure **> malloc(sizeof(freesasa_structure *))
+        if sArray is not NULL:
+            sArray[0] = freesasa_structure_from_pdb(input, NULL, options)
+            n[0] = 1
+    return sArray
+
 def structureArray(fileName,
                    options = Structure.defaultStructureArrayOptions,
                    classifier = None):
@@ -437,7 +878,8 @@ def structureArray(fileName,
     structure and/or grouping chains.
 
     Args:
-        fileName (str): The PDB file.
+        fileName: The PDB file name, contents or file object, see
+            :py:class:`.Structure` for the types supported.
         options (dict): Specification for how to read the PDB-file
             (see :py:attr:`.Structure.defaultStructureArrayOptions` for
             options and default value).
@@ -464,62 +906,141 @@ def structureArray(fileName,
 
     Structure._validate_options(options)
     structure_options = Structure._get_bitfield_from_options(options)
-    cdef FILE *input
-    input = fopen(fileName,'rb')
-    if input is NULL:
-        raise IOError("File '%s' could not be opened." % fileName)
-
-    verbosity = getVerbosity()
-
-    if classifier is not None:
-        setVerbosity(silent)
-
+    cdef _Input source = _Input(fileName)
+    cdef FILE *input = source.file()
     cdef int n
+    cdef int c_options = structure_options
+    cdef bint separate = options.get('separate-chains', False) or options.get('separate-models', False)
     cdef freesasa_structure** sArray
-    if options.get('separate-chains', False) or options.get('separate-models', False):
-        sArray = freesasa_structure_array(input,&n,NULL,structure_options)
-    else:
-        sArray = <freesasa_structure **> malloc(sizeof(freesasa_structure *))
-        sArray[0] = freesasa_structure_from_pdb(input, NULL, structure_options)
-        n = 1
-    fclose(input)
-
-    if sArray is NULL:
-        raise Exception("Problems reading structures in '%s'." % fileName)
-    if sArray[0] is NULL:
-        free(sArray)
-        raise Exception("Problems reading structures in '%s'." % fileName)
+    cdef bint collect = _stats_enabled
+    if collect:
+        start = _clock()
 
     cdef freesasa_structure* group
-    if options.get('chain-groups', False):
-        # Add groups from each model
-        chain_groups = options['chain-groups'].split('+')
-        n_groups = len(chain_groups)
-        n_total = n * (1 + n_groups)
-        sArray = <freesasa_structure**> realloc(sArray, n_total * sizeof(freesasa_structure*))
-        if sArray is NULL:
-            raise Exception("Out of memory when allocating '%i' structures from '%s'." % (n_total, fileName))
-        for i in range(0, n):
-            for j, chainID_group in enumerate(chain_groups):
-                idx = j + (i * n_groups) + n
-                group = freesasa_structure_get_chains(sArray[i], chainID_group, NULL, structure_options)
-                sArray[idx] = group
-        n = n_total
-
-    if classifier is not None:
-        setVerbosity(verbosity)
+    cdef freesasa_structure* model
+    cdef const char *c_chains
+
+    # supress warnings for pure Python classifiers (see _silence())
+    cdef bint silence = classifier is not None
+    if silence:
+        _silence()
+    try:
+        with nogil:
+            sArray = _readStructureArray(input, &n, separate, c_options)
+        source.close()
 
+        if sArray is NULL:
+            raise Exception("Problems reading structures in '%s'." % source.name)
+        if sArray[0] is NULL:
+            free(sArray)
+            raise Exception("Problems reading structures in '%s'." % source.name)
+
+        if options.get('chain-groups', False):
+            # Add groups from each model
+            chain_groups = options['chain-groups'].split('+')
+            n_groups = len(chain_groups)
+            n_total = n * (1 + n_groups)
+            sArray = <freesasa_structure**> realloc(sArray, n_total * sizeof(freesasa_structure*))
+            if sArray is NULL:
+                raise Exception("Out of memory when allocating '%i' structures from '%s'." % (n_total, source.name))
+            for i in range(0, n):
+                for j, chainID_group in enumerate(chain_groups):
+                    idx = j + (i * n_groups) + n
+                    chains = chainID_group.encode('ascii')
+                    c_chains = chains
+                    model = sArray[i]
+                    with nogil:
+                        group = freesasa_structure_get_chains(model, c_chains, NULL, c_options)
+                    sArray[idx] = group
+            n = n_total
+    finally:
+        if silence:
+            _unsilence()
+
+    if collect:
+        parseTime = _clock() - start
+
+    cdef Structure structure
     structures = []
     for i in range(0, n):
-        structures.append(Structure())
-        structures[-1]._set_address(<size_t> &sArray[i])
+        structure = Structure()
+        structure._set_address(<size_t> &sArray[i])
+        if collect:
+            start = _clock()
         if classifier is not None:
-            structures[-1].setRadiiWithClassifier(classifier)
+            structure.setRadiiWithClassifier(classifier)
+        if collect:
+            # the input is parsed once for all structures
+            structure._stats = {'atoms' : structure.nAtoms(),
+                                'parseTime' : parseTime,
+                                'structures' : n,
+                                'radiiTime' : _clock() - start}
+        structures.append(structure)
     free(sArray)
 
+    if collect:
+        for structure in structures:
+            _reportStats('structure', structure.stats())
+
     return structures
 
 
+def iterStructures(source,
+                   options = Structure.defaultStructureArrayOptions,
+                   classifier = None):
+    """
+    Iterate over the structures in a PDB file.
+
+    Generates the same structures as :py:func:`.structureArray()`,
+    but reads the input one MODEL at a time, and yields the structures
+    of each model before the next model is read. Memory use is
+    therefore bounded by the size of a single model, also for files
+    with thousands of models, as long as the consumer doesn't keep the
+    structures. Structures are freed when they are no longer
+    referenced.
+
+    Uncompressed files are memory-mapped, compressed files and
+    file-like objects are decompressed and read incrementally. With
+    the option `'join-models'` all models are read at once.
+
+    The order of structures is the same as for
+    :py:func:`.structureArray()` if there is only one model. With
+    several models and `'chain-groups'`, the chain groups of each model
+    follow directly after the model.
+
+    Args:
+        source: The PDB file name, contents or file object, see
+            :py:class:`.Structure` for the types supported.
+        options (dict): Specification for how to read the PDB-file
+            (see :py:attr:`.Structure.defaultStructureArrayOptions` for
+            options and default value).
+        classifier: :py:class:`.Classifier` to assign atoms radii, default is used
+            if none specified.
+
+    Yields:
+        :py:class:`.Structure`
+
+    Raises:
+        The same exceptions as :py:func:`.structureArray()`, when
+        the model causing them is read.
+    """
+    assert source is not None
+
+    if options.get('join-models', False):
+        models = [source]
+    elif options.get('separate-models', False):
+        models = _iterModels(source)
+    else:
+        models = itertools.islice(_iterModels(source), 1)
+
+    for model in models:
+        structures = structureArray(model, options, classifier)
+        model = None
+        structures.reverse()
+        while structures:
+            yield structures.pop()
+
+
 def structureFromBioPDB(bioPDBStructure, classifier=None, options = Structure.defaultOptions):
     """
     Create a freesasa structure from a Bio.PDB structure
@@ -528,6 +1049,11 @@ def structureFromBioPDB(bioPDBStructure, classifier=None, options = Structure.de
     Structures generated this way will not preserve whitespace in residue numbers, etc,
     as in :py:class:`.Structure`.
 
+    The atoms are collected in one pass over the Bio.PDB structure,
+    and then added to the structure in bulk (see
+    :py:meth:`.Structure.addAtoms()`). Radii and unknown atoms are
+    handled as when reading a PDB file with :py:class:`.Structure`.
+
     Args:
         bioPDBStructure: a `Bio.PDB` structure
         classifier: an optional :py:class:`.Classifier` to specify atomic radii
@@ -539,47 +1065,69 @@ def structureFromBioPDB(bioPDBStructure, classifier=None, options = Structure.de
     Raises:
         Exception: if option 'halt-at-unknown' is selected and
             unknown atoms are encountered. Passes on exceptions from
-            :py:meth:`.Structure.addAtom()` and
+            :py:meth:`.Structure.addAtoms()` and
             :py:meth:`.Structure.setRadiiWithClassifier()`.
     """
-    structure = Structure()
     if (classifier is None):
         classifier = Classifier()
     Structure._validate_options(options)
     optbitfield = Structure._get_bitfield_from_options(options)
+    include_hetatm = optbitfield & FREESASA_INCLUDE_HETATM
+    include_hydrogen = optbitfield & FREESASA_INCLUDE_HYDROGEN
 
-    atoms = bioPDBStructure.get_atoms()
-
+    models = bioPDBStructure.get_models()
     if (not optbitfield & FREESASA_JOIN_MODELS):
-        models = bioPDBStructure.get_models()
-        atoms = next(models).get_atoms()
-
-    for a in atoms:
-        r = a.get_parent()
-        s = r.get_parent()
-        hetflag, resseq, icode = r.get_id()
-        resname = r.get_resname()
-        atomname = a.get_fullname()
-        element = a.element
-
-        if (hetflag is not ' ' and not (optbitfield & FREESASA_INCLUDE_HETATM)):
-            continue
-        if (((element == "H") or (element == "D")) and not (optbitfield & FREESASA_INCLUDE_HYDROGEN)):
-            continue
-
-        c = r.get_parent()
-        v = a.get_vector()
-        if (icode):
-            resseq = str(resseq) + str(icode)
-
-        if (classifier.classify(resname, atomname) is 'Unknown'):
-            if (optbitfield & FREESASA_SKIP_UNKNOWN):
-                continue
+        models = [next(models)]
+
+    atomNames = []
+    residueNames = []
+    residueNumbers = []
+    chainLabels = []
+    xyz = array('d')
+
+    for model in models:
+        for chain in model:
+            chainLabel = chain.id
+            for residue in chain:
+                hetflag, resseq, icode = residue.id
+                if (hetflag != ' ' and not include_hetatm):
+                    continue
+                residueName = residue.resname
+                residueNumber = str(resseq) + str(icode) if icode else str(resseq)
+
+                for atom in residue:
+                    element = atom.element
+                    if (((element == "H") or (element == "D")) and not include_hydrogen):
+                        continue
+                    atomNames.append(atom.fullname)
+                    residueNames.append(residueName)
+                    residueNumbers.append(residueNumber)
+                    chainLabels.append(chainLabel)
+                    xyz.extend(atom.coord)
+
+    if classifier._isCClassifier():
+        # radii and unknown atoms are handled by the C library as atoms are added
+        structure = Structure(None, classifier, options)
+        rejected = structure.addAtoms(atomNames, residueNames, residueNumbers, chainLabels,
+                                      xyz[0::3], xyz[1::3], xyz[2::3])
+        if (rejected and optbitfield & FREESASA_HALT_AT_UNKNOWN):
+            raise Exception("Halting at unknown atom")
+        return structure
+
+    # pure Python classifiers decide which atoms are unknown
+    if (optbitfield & (FREESASA_SKIP_UNKNOWN | FREESASA_HALT_AT_UNKNOWN)):
+        keep = [(<Classifier> classifier)._cachedClass(residueNames[i], atomNames[i]) != 'Unknown'
+                for i in range(len(atomNames))]
+        if (not all(keep)):
             if (optbitfield & FREESASA_HALT_AT_UNKNOWN):
                 raise Exception("Halting at unknown atom")
+            atomNames, residueNames, residueNumbers, chainLabels = \
+                [[v for v, k in zip(column, keep) if k]
+                 for column in (atomNames, residueNames, residueNumbers, chainLabels)]
+            xyz = array('d', [v for i, v in enumerate(xyz) if keep[i // 3]])
 
-        structure.addAtom(atomname, r.get_resname(), resseq, c.get_id(),
-                          v[0], v[1], v[2])
-
+    structure = Structure()
+    structure.addAtoms(atomNames, residueNames, residueNumbers, chainLabels,
+                       xyz[0::3], xyz[1::3], xyz[2::3])
     structure.setRadiiWithClassifier(classifier)
     return structure
@@ -0,0 +1,172 @@
+from cfreesasa cimport *
+
+# Memory used per atom by a calculation (mostly the neighbour lists),
+# in bytes, measured for proteins with both algorithms
+_tile_bytes_per_atom = 4096
+
+# The atoms of a structure sorted into a grid of cubic cells, and
+# divided into tiles, boxes of cells. The areas of the atoms in a tile
+# are calculated together with the atoms outside it that overlap them.
+# The cells are at least as large as the largest distance at which two
+# atoms can overlap, 2 * (max radius + probe), so these atoms are all
+# in the cells around the tile.
+cdef class _Tiling:
+    cdef const double *xyz
+    cdef const double *radii
+    cdef carray.array R
+    cdef carray.array mask
+    cdef _CellList cells
+
+    # number of atoms in the cells [0, i) x [0, j) x [0, k), at
+    # ((i * (shape[1] + 1)) + j) * (shape[2] + 1) + k
+    cdef carray.array prefix
+
+    cdef long _index(self, int i, int j, int k):
+        return (i * (self.cells._shape[1] + 1) + j) * <long> (self.cells._shape[2] + 1) + k
+
+    # Number of atoms in the cells of a box, the box is clamped to
+    # the grid
+    cdef long count(self, box):
+        cdef int lower[3]
+        cdef int upper[3]
+        cdef const long *p = self.prefix.data.as_longs
+        cdef int k
+        for k in range(3):
+            lower[k] = max(box[2*k], 0)
+            upper[k] = min(box[2*k + 1], self.cells._shape[k])
+            if upper[k] <= lower[k]:
+                return 0
+        return p[self._index(upper[0], upper[1], upper[2])] \
+            - p[self._index(lower[0], upper[1], upper[2])] \
+            - p[self._index(upper[0], lower[1], upper[2])] \
+            - p[self._index(upper[0], upper[1], lower[2])] \
+            + p[self._index(lower[0], lower[1], upper[2])] \
+            + p[self._index(lower[0], upper[1], lower[2])] \
+            + p[self._index(upper[0], lower[1], lower[2])] \
+            - p[self._index(lower[0], lower[1], lower[2])]
+
+    # Splits the box of cells until the atoms of each tile and their
+    # padding are at most max_atoms, or the tile is a single cell.
+    # Appends the tiles that contain atoms to tiles.
+    cdef void split(self, box, long max_atoms, list tiles) except *:
+        cdef int k, longest = 0
+        if self.count(box) == 0:
+            return
+        expanded = [box[k] + (-1 if k % 2 == 0 else 1) for k in range(6)]
+        if self.count(expanded) <= max_atoms or \
+           all([box[2*k + 1] - box[2*k] == 1 for k in range(3)]):
+            tiles.append(box)
+            return
+        for k in range(3):
+            if box[2*k + 1] - box[2*k] > box[2*longest + 1] - box[2*longest]:
+                longest = k
+        middle = (box[2*longest] + box[2*longest + 1]) // 2
+        lower, upper = list(box), list(box)
+        lower[2*longest + 1] = middle
+        upper[2*longest] = middle
+        self.split(tuple(lower), max_atoms, tiles)
+        self.split(tuple(upper), max_atoms, tiles)
+
+    # The coordinates, radii and indices of the atoms of a tile,
+    # followed by the atoms outside the tile that overlap them, and
+    # the number of atoms in the tile. The atoms that overlap atoms in
+    # the tile are found among the cells around it, and marked in
+    # self.mask, which is cleared again before returning.
+    cdef tuple atoms(self, box):
+        cdef const int *start = self.cells._start.data.as_ints
+        cdef const int *cell_atoms = self.cells._atoms.data.as_ints
+        cdef const double *R = self.R.data.as_doubles
+        cdef unsigned char *mask = self.mask.data.as_uchars
+        cdef int i, j, k, p, a, c, n = 0, n_tile = 0
+        cdef int *index
+        cdef double *xyz
+        cdef double *radii
+        cdef bint inside, padding
+
+        n_max = self.count([box[k] + (-1 if k % 2 == 0 else 1) for k in range(6)])
+        index_array = array('i', [0]) * n_max
+        index = (<carray.array> index_array).data.as_ints
+
+        for padding in (False, True):
+            for i in range(max(box[0] - 1, 0), min(box[1] + 1, self.cells._shape[0])):
+                for j in range(max(box[2] - 1, 0), min(box[3] + 1, self.cells._shape[1])):
+                    for k in range(max(box[4] - 1, 0), min(box[5] + 1, self.cells._shape[2])):
+                        inside = box[0] <= i < box[1] and box[2] <= j < box[3] and box[4] <= k < box[5]
+                        if inside == padding:
+                            continue
+                        c = (i * self.cells._shape[1] + j) * self.cells._shape[2] + k
+                        for p in range(start[c], start[c + 1]):
+                            a = cell_atoms[p]
+                            if not padding or mask[a]:
+                                index[n] = a
+                                n += 1
+            if not padding:
+                n_tile = n
+                for p in range(n_tile):
+                    a = index[p]
+                    self.cells.mark(&self.xyz[3*a], R[a], R, mask)
+
+        xyz_array = array('d', [0]) * (3 * n)
+        radii_array = array('d', [0]) * n
+        xyz = (<carray.array> xyz_array).data.as_doubles
+        radii = (<carray.array> radii_array).data.as_doubles
+        for p in range(n):
+            a = index[p]
+            xyz[3*p] = self.xyz[3*a]
+            xyz[3*p + 1] = self.xyz[3*a + 1]
+            xyz[3*p + 2] = self.xyz[3*a + 2]
+            radii[p] = self.radii[a]
+            mask[a] = 0
+        carray.resize(index_array, n_tile)
+
+        return xyz_array, radii_array, index_array
+
+# Tiling of n atoms with coordinates xyz and radii, for the given
+# probe radius. The arrays are not copied.
+cdef _Tiling _tiling(const double *xyz, const double *radii, int n, double probe):
+    cdef _Tiling tiling = _Tiling()
+    cdef double R_max = 0
+    cdef int i, j, k, c
+    cdef long *prefix
+    cdef const int *start
+
+    tiling.xyz = xyz
+    tiling.radii = radii
+    tiling.R = array('d', [0]) * n
+    tiling.mask = array('B', [0]) * (n + 1)
+    for i in range(n):
+        tiling.R.data.as_doubles[i] = radii[i] + probe
+        R_max = max(R_max, tiling.R.data.as_doubles[i])
+    tiling.cells = _cell_list(xyz, n, 2 * R_max)
+
+    shape = [tiling.cells._shape[k] for k in range(3)]
+    tiling.prefix = array('l', [0]) * ((shape[0] + 1) * (shape[1] + 1) * (shape[2] + 1))
+    prefix = tiling.prefix.data.as_longs
+    start = tiling.cells._start.data.as_ints
+    for i in range(shape[0]):
+        for j in range(shape[1]):
+            for k in range(shape[2]):
+                c = (i * shape[1] + j) * shape[2] + k
+                prefix[tiling._index(i + 1, j + 1, k + 1)] = start[c + 1] - start[c] \
+                    + prefix[tiling._index(i, j + 1, k + 1)] \
+                    + prefix[tiling._index(i + 1, j, k + 1)] \
+                    + prefix[tiling._index(i + 1, j + 1, k)] \
+                    - prefix[tiling._index(i, j, k + 1)] \
+                    - prefix[tiling._index(i, j + 1, k)] \
+                    - prefix[tiling._index(i + 1, j, k)] \
+                    + prefix[tiling._index(i, j, k)]
+    return tiling
+
+# Areas of the first n_tile atoms of a tile, runs in worker processes
+# for calcTiled(..., processes=True)
+def _tileAreas(xyz, radii, n_tile, parameters):
+    result = calcCoord(xyz, radii, parameters)
+    with result.atomAreas() as areas:
+        return array('d', areas[:n_tile])
+
+# Copies the areas of the atoms of a tile to sasa
+cdef void _store_tile(double[::1] sasa, carray.array index, carray.array areas) except *:
+    cdef int i
+    assert len(index) == len(areas)
+    for i in range(len(index)):
+        sasa[index.data.as_ints[i]] = areas.data.as_doubles[i]
@@ -1,8 +1,16 @@
 from freesasa import *
+from freesasa import aio
 import unittest
+import asyncio
 import math
 import os
 import faulthandler
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from array import array
 
 # this class tests using derived classes to create custom Classifiers
 class DerivedClassifier(Classifier):
@@ -54,6 +62,7 @@ class FreeSASATestCase(unittest.TestCase):
         r = Result()
         self.assertRaises(AssertionError,lambda: r.totalArea())
         self.assertRaises(AssertionError,lambda: r.atomArea(0))
+        self.assertRaises(AssertionError,lambda: r.atomAreas())
 
     def testClassifier(self):
         c = Classifier()
@@ -82,6 +91,86 @@ class FreeSASATestCase(unittest.TestCase):
         self.assertTrue(c.radius("ABCDEFG","HIJKLMNO") == 10)
         self.assertTrue(c.classify("ABCDEFG","HIJKLMNO") == "bla")
 
+    def testClassifierCache(self):
+        class CountingClassifier(Classifier):
+            purePython = True
+            radiusCalls = 0
+
+            def radius(self, residueName, atomName):
+                self.radiusCalls += 1
+                return 1.5 + 0.01 * len(residueName.strip() + atomName.strip())
+
+        structure = Structure("lib/tests/data/1ubq.pdb")
+        n = structure.nAtoms()
+        n_names = len(set((structure.residueName(i), structure.atomName(i)) for i in range(n)))
+
+        # off by default
+        classifier = CountingClassifier()
+        self.assertEqual(classifier.cacheInfo(), {'hits' : 0, 'misses' : 0, 'size' : 0, 'maxSize' : 0})
+        structure.setRadiiWithClassifier(classifier)
+        self.assertEqual(classifier.radiusCalls, n)
+        self.assertEqual(classifier.cacheInfo(), {'hits' : 0, 'misses' : n, 'size' : 0, 'maxSize' : 0})
+
+        classifier = CountingClassifier()
+        classifier.cacheSize = 10000
+        self.assertEqual(classifier.cacheInfo(), {'hits' : 0, 'misses' : 0, 'size' : 0, 'maxSize' : 10000})
+        structure.setRadiiWithClassifier(classifier)
+        structure.setRadiiWithClassifier(classifier)
+        self.assertEqual(classifier.radiusCalls, n_names)
+        self.assertEqual(classifier.cacheInfo(), {'hits' : 2*n - n_names, 'misses' : n_names,
+                                                  'size' : n_names, 'maxSize' : 10000})
+        for i in range(n):
+            self.assertEqual(structure.radius(i), classifier.radius(structure.residueName(i),
+                                                                    structure.atomName(i)))
+
+        # classes are cached in the same table
+        classifyResults(calc(structure), structure, classifier)
+        self.assertEqual(classifier.cacheInfo()['size'], n_names)
+        self.assertEqual(classifier.cacheInfo()['misses'], 2*n_names)
+
+        classifier.clearCache()
+        self.assertEqual(classifier.cacheInfo(), {'hits' : 0, 'misses' : 0, 'size' : 0, 'maxSize' : 10000})
+
+        # bounded size, least recently used atoms are dropped
+        classifier = CountingClassifier()
+        classifier.cacheSize = 10
+        structure.setRadiiWithClassifier(classifier)
+        self.assertEqual(classifier.cacheInfo()['size'], min(10, n_names))
+        self.assertEqual(classifier.cacheInfo()['hits'] + classifier.cacheInfo()['misses'], n)
+        for i in range(n):
+            self.assertEqual(structure.radius(i), classifier.radius(structure.residueName(i),
+                                                                    structure.atomName(i)))
+        classifier.cacheSize = 2
+        classifier.clearCache()
+        s = Structure()
+        for name in (' N  ', ' CA ', ' N  ', ' C  ', ' N  ', ' CA '):
+            s.addAtom(name, 'ALA', '1', 'A', 0, 0, 0)
+        s.setRadiiWithClassifier(classifier)
+        # CA is dropped when C is added, N is kept since it was used last
+        self.assertEqual(classifier.cacheInfo(), {'hits' : 2, 'misses' : 4, 'size' : 2, 'maxSize' : 2})
+
+        # or disabled
+        classifier.cacheSize = 0
+        classifier.clearCache()
+        structure.setRadiiWithClassifier(classifier)
+        self.assertEqual(classifier.cacheInfo(), {'hits' : 0, 'misses' : n, 'size' : 0, 'maxSize' : 0})
+
+        # C classifiers don't use the cache
+        classifier = Classifier()
+        structure.setRadiiWithClassifier(classifier)
+        self.assertEqual(classifier.cacheInfo()['misses'], 0)
+
+        # objects that aren't classifiers, but have the methods of one
+        class DuckClassifier:
+            def radius(self, residueName, atomName):
+                return 1.5
+            def classify(self, residueName, atomName):
+                return 'duck'
+        structure.setRadiiWithClassifier(DuckClassifier())
+        self.assertEqual(structure.radius(0), 1.5)
+        classes = classifyResults(calc(structure), structure, DuckClassifier())
+        self.assertEqual(list(classes.keys()), ['duck'])
+
     def testStructure(self):
         self.assertRaises(IOError,lambda: Structure("xyz#$%"))
         setVerbosity(silent)
@@ -192,6 +281,158 @@ class FreeSASATestCase(unittest.TestCase):
         self.assertEqual(s.radius(0), 1.87)
 
 
+    def testStructureColumns(self):
+        structure = Structure("lib/tests/data/1ubq.pdb")
+        n = structure.nAtoms()
+
+        coords = structure.coords()
+        radii = structure.radii()
+        self.assertEqual(coords.shape, (n, 3))
+        self.assertEqual(radii.shape, (n,))
+        self.assertTrue(coords.readonly and radii.readonly)
+        for i in range(n):
+            self.assertEqual([coords[i, 0], coords[i, 1], coords[i, 2]], structure.coord(i))
+            self.assertEqual(radii[i], structure.radius(i))
+
+        # views refer to the structure
+        structure.setRadius(0, 3.5)
+        self.assertEqual(radii[0], 3.5)
+        structure.setCoords([0] * (3*n))
+        self.assertEqual(coords[n-1, 2], 0)
+
+        # and block adding atoms while in use
+        self.assertRaises(BufferError, lambda: structure.addAtom(' CA ', 'ALA', '   1', 'A', 0, 0, 0))
+        coords.release()
+        radii.release()
+        structure.addAtom(' CA ', 'ALA', '   1', 'A', 0, 0, 0)
+        n += 1
+
+        for column, get in ((structure.atomNames(), structure.atomName),
+                            (structure.residueNames(), structure.residueName),
+                            (structure.residueNumbers(), structure.residueNumber),
+                            (structure.chainLabels(), structure.chainLabel)):
+            self.assertEqual(len(column), n)
+            width = column.itemsize
+            self.assertEqual(column.format, '%ds' % width)
+            data = column.tobytes()
+            for i in range(n):
+                self.assertEqual(data[i*width:(i+1)*width].rstrip(b'\0').decode(), get(i))
+        self.assertEqual(structure.atomNames().itemsize, 4)
+        self.assertEqual(structure.chainLabels().itemsize, 1)
+
+        structure = Structure()
+        self.assertEqual(structure.coords().shape, (0, 3))
+        self.assertEqual(len(structure.atomNames()), 0)
+        structure.addAtom(' CA ', 'ALA', '12345678', 'A', 1, 2, 3)
+        self.assertEqual(structure.residueNumbers().tobytes(), b'12345678')
+        self.assertEqual(structure.coords().tolist(), [[1, 2, 3]])
+
+        try:
+            import numpy
+        except ImportError:
+            print("Can't import numpy, tests skipped")
+        else:
+            structure = Structure("lib/tests/data/1ubq.pdb")
+            self.assertEqual(numpy.asarray(structure.coords()).shape, (structure.nAtoms(), 3))
+            names = numpy.asarray(structure.atomNames())
+            self.assertEqual(names.dtype, numpy.dtype('S4'))
+            self.assertEqual(names[1].decode(), structure.atomName(1))
+
+    def testAddAtoms(self):
+        structure = Structure("lib/tests/data/1ubq.pdb")
+        n = structure.nAtoms()
+        coords = structure.coords()
+        xs, ys, zs = [array('d', [coords[i, k] for i in range(n)]) for k in range(3)]
+
+        # from the fixed-width arrays of another structure
+        copy = Structure()
+        rejected = copy.addAtoms(structure.atomNames(), structure.residueNames(),
+                                 structure.residueNumbers(), structure.chainLabels(),
+                                 xs, ys, zs)
+        self.assertEqual(rejected, [])
+        self.assertEqual(copy.nAtoms(), n)
+        for i in range(n):
+            self.assertEqual(copy.atomName(i), structure.atomName(i))
+            self.assertEqual(copy.residueName(i), structure.residueName(i))
+            self.assertEqual(copy.residueNumber(i), structure.residueNumber(i))
+            self.assertEqual(copy.chainLabel(i), structure.chainLabel(i))
+            self.assertEqual(copy.coord(i), structure.coord(i))
+            self.assertEqual(copy.radius(i), structure.radius(i))
+        self.assertEqual(calc(copy).totalArea(), calc(structure).totalArea())
+
+        # rejected atoms are reported
+        options = dict(Structure.defaultOptions)
+        options['skip-unknown'] = True
+        s = Structure(options=options)
+        setVerbosity(silent)
+        rejected = s.addAtoms([' CA ', ' XX ', ' CB ', ' YY '], ['ALA'] * 4, [1, 1, '   1', 1],
+                              'AAAA', [0, 1, 2, 3], [0] * 4, [0] * 4)
+        setVerbosity(normal)
+        self.assertEqual(rejected, [1, 3])
+        self.assertEqual(s.nAtoms(), 2)
+        self.assertEqual(s.atomName(1), ' CB ')
+        self.assertEqual(s.coord(1), [2, 0, 0])
+
+        self.assertEqual(s.addAtoms([], [], [], [], [], [], []), [])
+        self.assertRaises(AssertionError, lambda: s.addAtoms([' CA '], ['ALA'], [1], ['A'], [0, 1], [0], [0]))
+        self.assertRaises(Exception, lambda: s.addAtoms([' CA '], ['ALA'], [1.5], ['A'], [0], [0], [0]))
+
+        try:
+            import numpy
+        except ImportError:
+            print("Can't import numpy, tests skipped")
+        else:
+            xyz = numpy.asarray(structure.coords())
+            copy = Structure()
+            rejected = copy.addAtoms(numpy.asarray(structure.atomNames()),
+                                     numpy.array([structure.residueName(i) for i in range(n)]),
+                                     numpy.asarray(structure.residueNumbers()),
+                                     numpy.asarray(structure.chainLabels()),
+                                     xyz[:, 0], xyz[:, 1], xyz[:, 2])
+            self.assertEqual(rejected, [])
+            self.assertEqual(numpy.asarray(copy.coords()).tolist(), xyz.tolist())
+
+    def testInput(self):
+        import gzip, bz2, io, mmap
+        fileName = "lib/tests/data/1ubq.pdb"
+        with open(fileName, 'rb') as f:
+            data = f.read()
+        reference = Structure(fileName)
+
+        with open(fileName, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        sources = (lambda: os.fsencode(fileName), lambda: bytearray(data), lambda: memoryview(data),
+                   lambda: mapped, lambda: memoryview(gzip.compress(data)),
+                   lambda: bytearray(bz2.compress(data)),
+                   lambda: io.BytesIO(data), lambda: io.StringIO(data.decode()),
+                   lambda: io.BytesIO(gzip.compress(data)), lambda: open(fileName))
+        for source in sources:
+            s = Structure(source())
+            self.assertEqual(s.nAtoms(), reference.nAtoms())
+            self.assertEqual(bytes(s.coords()), bytes(reference.coords()))
+            self.assertEqual(bytes(s.atomNames()), bytes(reference.atomNames()))
+            self.assertEqual(len(structureArray(source(), {'separate-models' : True})), 1)
+        mapped.close()
+
+        self.assertRaises(Exception, lambda: Structure(bytearray()))
+        self.assertRaises(Exception, lambda: Structure(memoryview(b"not a PDB file")))
+        # bytes are a file name, like for open()
+        self.assertRaises(IOError, lambda: Structure(b"not a PDB file"))
+        self.assertRaises(TypeError, lambda: Structure(1))
+
+        config = b"name: test\ntypes:\nC 1.0 apolar\nO 2.0 polar\natoms:\nANY C C\nANY O O\n"
+        for source in (bytearray(config), io.BytesIO(config), memoryview(gzip.compress(config))):
+            c = Classifier(source)
+            self.assertEqual(c.radius("ALA", "O"), 2.0)
+            self.assertEqual(c.classify("ALA", "C"), apolar)
+        self.assertRaises(Exception, lambda: Classifier(memoryview(b"name: test\n")))
+        with tempfile.TemporaryDirectory() as directory:
+            configFile = os.path.join(directory, 'test.config')
+            with open(configFile, 'wb') as f:
+                f.write(config)
+            self.assertEqual(Classifier(os.fsencode(configFile)).radius("ALA", "O"), 2.0)
+
     def testStructureArray(self):
         # default separates chains, only uses first model (129 atoms per chain)
         ss = structureArray("lib/tests/data/2jo4.pdb", {"separate-chains": False,
@@ -248,6 +489,35 @@ class FreeSASATestCase(unittest.TestCase):
                                                  {'hydrogen' : True}))
         setVerbosity(normal)
 
+    def testIterStructures(self):
+        import gzip, io
+        def signature(structures):
+            return [(s.nAtoms(), bytes(s.chainLabels()), bytes(s.coords())) for s in structures]
+
+        fileName = "lib/tests/data/2jo4.pdb"
+        with open(fileName, 'rb') as f:
+            data = f.read()
+
+        for options in ({'separate-models' : True},
+                        {'separate-chains' : True},
+                        {'separate-models' : True, 'separate-chains' : True},
+                        {'chain-groups' : 'A'},
+                        {'separate-chains' : True, 'join-models' : True}):
+            reference = signature(structureArray(fileName, options))
+            for source in (fileName, os.fsencode(fileName), memoryview(data), io.BytesIO(data),
+                           memoryview(gzip.compress(data))):
+                self.assertEqual(signature(iterStructures(source, options)), reference)
+
+        # models are read lazily, structures can be freed as they are consumed
+        structures = iterStructures(io.BytesIO(data), {'separate-models' : True})
+        s = next(structures)
+        self.assertEqual(s.nAtoms(), structureArray(fileName, {'separate-models' : True})[0].nAtoms())
+        structures.close()
+
+        self.assertRaises(IOError, lambda: list(iterStructures("")))
+        self.assertRaises(Exception, lambda: list(iterStructures(bytearray())))
+        self.assertRaises(TypeError, lambda: list(iterStructures(1)))
+
     def testCalc(self):
         # test default settings
         structure = Structure("lib/tests/data/1ubq.pdb")
@@ -315,6 +585,253 @@ class FreeSASATestCase(unittest.TestCase):
 
         self.assertRaises(AssertionError,
                           lambda: calcCoord(radii, radii))
+        self.assertRaises(AssertionError,
+                          lambda: calcCoord([], []))
+
+        # buffers are passed on without copying
+        result2 = calcCoord(array('d', coord), memoryview(array('d', radii)), parameters)
+        self.assertEqual(result.totalArea(), result2.totalArea())
+
+        # integer buffers are converted
+        result2 = calcCoord(array('i', coord), array('i', radii), parameters)
+        self.assertEqual(result.totalArea(), result2.totalArea())
+
+        # 2-dimensional coordinate array
+        coord2d = memoryview(array('d', coord)).cast('B').cast('d', (2, 3))
+        result2 = calcCoord(coord2d, radii, parameters)
+        self.assertEqual(result.totalArea(), result2.totalArea())
+
+        try:
+            import numpy
+        except ImportError:
+            print("Can't import numpy, tests skipped")
+        else:
+            xyz = numpy.array(coord, dtype=numpy.float64).reshape((2, 3))
+            result2 = calcCoord(xyz, numpy.array(radii, dtype=numpy.float64), parameters)
+            self.assertEqual(result.totalArea(), result2.totalArea())
+            self.assertRaises(ValueError, lambda: calcCoord(xyz.T, radii, parameters))
+            areas = numpy.asarray(result.atomAreas())
+            self.assertEqual(areas.shape, (2,))
+            self.assertTrue(math.fabs(areas.sum() - result.totalArea()) < 1e-10)
+
+        # the view refers to the stored results and keeps them alive
+        areas = calcCoord(coord, radii, parameters).atomAreas()
+        self.assertEqual(len(areas), 2)
+        self.assertTrue(areas.readonly)
+        self.assertEqual(areas[0], result.atomArea(0))
+        self.assertEqual(areas[1], result.atomArea(1))
+        self.assertTrue(math.fabs(sum(areas) - result.totalArea()) < 1e-10)
+
+    def testThreads(self):
+        # calculations running concurrently, sharing Parameters,
+        # Classifier and Structure objects, should give the same
+        # results as serial ones
+        from concurrent.futures import ThreadPoolExecutor
+        classifier = Classifier()
+        parameters = Parameters({'algorithm' : ShrakeRupley})
+        structure = Structure("lib/tests/data/1ubq.pdb", classifier)
+        result = calc(structure, parameters)
+        sasa_classes = classifyResults(result, structure, classifier)
+        n_chains = len(structureArray("lib/tests/data/2jo4.pdb"))
+
+        def work(i):
+            if i % 3 == 0:
+                s = Structure("lib/tests/data/1ubq.pdb", classifier)
+            else:
+                s = structure
+            r = calc(s, parameters)
+            ss = structureArray("lib/tests/data/2jo4.pdb") if i % 4 == 0 else None
+            return r.totalArea(), classifyResults(r, s, classifier), ss
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for total, classes, ss in executor.map(work, range(64)):
+                self.assertEqual(total, result.totalArea())
+                self.assertEqual(classes, sasa_classes)
+                if ss is not None:
+                    self.assertEqual(len(ss), n_chains)
+
+        coord = [0,0,0, 2,2,2]
+        radii = [1,1]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            totals = list(executor.map(lambda i: calcCoord(coord, radii, parameters).totalArea(),
+                                       range(64)))
+        self.assertEqual(totals, [calcCoord(coord, radii, parameters).totalArea()] * 64)
+
+        # concurrent reads with pure Python classifiers silence the C
+        # library, the verbosity is restored when all are done
+        derived = DerivedClassifier()
+        def read(i):
+            if i % 2 == 0:
+                return Structure("lib/tests/data/1ubq.pdb", derived).nAtoms()
+            return len(structureArray("lib/tests/data/2jo4.pdb", classifier=derived))
+        self.assertEqual(getVerbosity(), normal)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(read, range(64)))
+        self.assertEqual(getVerbosity(), normal)
+
+    def testResidueAreaColumns(self):
+        structure = Structure("lib/tests/data/1ubq.pdb")
+        result = calc(structure, Parameters({'algorithm' : ShrakeRupley}))
+        columns = result.residueAreaColumns()
+        residueAreas = result.residueAreas()
+        fields = ('total', 'mainChain', 'sideChain', 'polar', 'apolar',
+                  'relativeTotal', 'relativeMainChain', 'relativeSideChain',
+                  'relativePolar', 'relativeApolar')
+
+        n = sum(len(residues) for residues in residueAreas.values())
+        self.assertEqual(set(columns.keys()),
+                         set(fields + ('chain', 'residueNumber', 'residueType', 'hasRelativeAreas')))
+        for key in columns:
+            self.assertEqual(len(columns[key]), n)
+        self.assertTrue(columns['total'].readonly)
+        self.assertAlmostEqual(sum(columns['total']), result.totalArea(), places=6)
+
+        for k in range(n):
+            area = residueAreas[columns['chain'][k]][columns['residueNumber'][k]]
+            self.assertEqual(area.residueType, columns['residueType'][k])
+            self.assertEqual(area.hasRelativeAreas, columns['hasRelativeAreas'][k])
+            for field in fields:
+                if area.hasRelativeAreas or not field.startswith('relative'):
+                    self.assertTrue(getattr(area, field) == columns[field][k] or
+                                    (math.isnan(getattr(area, field)) and math.isnan(columns[field][k])))
+                else:
+                    self.assertTrue(math.isnan(columns[field][k]))
+
+        # cached, but not shared with the caller
+        columns['total'] = None
+        self.assertTrue(result.residueAreaColumns()['total'] is not None)
+
+        # no structure
+        self.assertRaises(AssertionError, lambda: calcCoord([0,0,0], [1]).residueAreaColumns())
+        self.assertRaises(AssertionError, lambda: calcCoord([0,0,0], [1]).residueAreas())
+
+    def testClassifyResults(self):
+        class CountingClassifier(Classifier):
+            purePython = True
+            calls = 0
+
+            def classify(self, residueName, atomName):
+                self.calls += 1
+                return residueName.strip()
+
+        structure = Structure("lib/tests/data/1ubq.pdb")
+        result = calc(structure, Parameters({'algorithm' : ShrakeRupley}))
+        n = structure.nAtoms()
+
+        # same as summing atom by atom, classes in order of appearance
+        for classifier in (None, Classifier.getStandardClassifier('naccess'), CountingClassifier()):
+            reference = dict()
+            c = classifier if classifier is not None else Classifier()
+            for i in range(n):
+                name = c.classify(structure.residueName(i), structure.atomName(i))
+                reference[name] = reference.get(name, 0) + result.atomArea(i)
+            sasa_classes = classifyResults(result, structure, classifier)
+            self.assertEqual(list(sasa_classes.keys()), list(reference.keys()))
+            for name in reference:
+                self.assertAlmostEqual(sasa_classes[name], reference[name], places=8)
+            self.assertEqual(classifyResults(result, structure, classifier), sasa_classes)
+
+        # pure Python classifiers with a cache are called once per
+        # residue and atom name
+        classifier = CountingClassifier()
+        classifier.cacheSize = 10000
+        sasa_classes = classifyResults(result, structure, classifier)
+        n_names = len(set((structure.residueName(i), structure.atomName(i)) for i in range(n)))
+        self.assertEqual(classifier.calls, n_names)
+        classifyResults(result, structure, classifier)
+        self.assertEqual(classifier.calls, n_names)
+
+        # adding atoms invalidates cached classes
+        structure = Structure()
+        structure.addAtom(' CA ', 'ALA', '   1', 'A', 0, 0, 0)
+        self.assertEqual(list(classifyResults(calc(structure), structure, classifier)), ['ALA'])
+        structure.addAtom(' CA ', 'GLY', '   2', 'A', 1, 1, 1)
+        result = calc(structure)
+        self.assertEqual(list(classifyResults(result, structure, classifier)), ['ALA', 'GLY'])
+        self.assertRaises(AssertionError, lambda: classifyResults(calcCoord([0,0,0], [1]), structure))
+
+    def testCalcMany(self):
+        parameters = Parameters({'algorithm' : ShrakeRupley})
+        fileNames = ["lib/tests/data/1ubq.pdb", "lib/tests/data/1d3z.pdb",
+                     "lib/tests/data/2jo4.pdb", "lib/tests/data/1ubq.pdb"]
+        structure = Structure("lib/tests/data/1ubq.pdb")
+        inputs = fileNames + [structure, "lib/tests/data/nofile.pdb"]
+        reference = dict((f, calc(Structure(f), parameters).totalArea()) for f in fileNames)
+
+        results = list(calcMany(inputs, parameters, workers=3))
+        self.assertEqual(len(results), len(inputs))
+        self.assertEqual(sorted(map(id, inputs)), sorted(id(i) for i, r in results))
+
+        for i, r in results:
+            if i is structure:
+                self.assertEqual(r.totalArea(), reference["lib/tests/data/1ubq.pdb"])
+            elif i == "lib/tests/data/nofile.pdb":
+                self.assertTrue(isinstance(r, IOError))
+            else:
+                self.assertEqual(r.totalArea(), reference[i])
+                self.assertTrue(len(r.residueAreas()) > 0)
+
+        # in processes, with results and exceptions sent back
+        results = list(calcMany(inputs, parameters, workers=2, processes=True))
+        self.assertEqual(sorted(map(id, inputs)), sorted(id(i) for i, r in results))
+        for i, r in results:
+            if i == "lib/tests/data/nofile.pdb":
+                self.assertTrue(isinstance(r, IOError))
+            else:
+                self.assertEqual(r.totalArea(), reference["lib/tests/data/1ubq.pdb" if i is structure else i])
+                self.assertTrue(len(r.residueAreas()) > 0)
+
+        # inputs are read as needed
+        drawn = []
+        def generate():
+            for i in range(1000):
+                drawn.append(i)
+                yield fileNames[i % len(fileNames)]
+        results = calcMany(generate(), parameters, workers=1)
+        next(results)
+        self.assertTrue(len(drawn) < 10)
+        results.close()
+
+        # stopping early and empty input
+        self.assertEqual(len(next(calcMany(fileNames, parameters, workers=1))), 2)
+        self.assertEqual(list(calcMany([])), [])
+        self.assertRaises(AssertionError, lambda: list(calcMany(fileNames, workers=0)))
+
+    def testTrajectory(self):
+        parameters = Parameters({'algorithm' : ShrakeRupley})
+        structure = Structure("lib/tests/data/1ubq.pdb")
+        n = structure.nAtoms()
+        coord = array('d', [x for i in range(n) for x in structure.coord(i)])
+        shifted = array('d', [x + 0.2 * (i % 7 == 0) for i, x in enumerate(coord)])
+        frames = coord + shifted + coord
+
+        structure.setCoords(shifted)
+        self.assertEqual(structure.coord(0), list(shifted[0:3]))
+        shifted_result = calc(structure, parameters)
+        structure.setCoords(memoryview(coord).cast('B').cast('d', (n, 3)))
+        self.assertEqual(structure.coord(n-1), list(coord[-3:]))
+        result = calc(structure, parameters)
+        self.assertRaises(AssertionError, lambda: structure.setCoords(coord[3:]))
+
+        for workers in (1, 2, 5):
+            areas, residue_areas = calcTrajectory(structure, frames, parameters, workers=workers)
+            self.assertEqual(areas.shape, (3, n))
+            self.assertEqual(residue_areas.shape[0], 3)
+            self.assertTrue(areas.readonly)
+            for f, r in enumerate((result, shifted_result, result)):
+                self.assertEqual([areas[f, i] for i in range(n)], list(r.atomAreas()))
+                self.assertAlmostEqual(sum(residue_areas[f, i] for i in range(residue_areas.shape[1])),
+                                       r.totalArea(), places=6)
+
+        # residues in same order as in the structure
+        residues = [a.total for c in result.residueAreas().values() for a in c.values()]
+        self.assertEqual(len(residues), residue_areas.shape[1])
+        for i, a in enumerate(residues):
+            self.assertAlmostEqual(residue_areas[0, i], a, places=6)
+
+        self.assertRaises(AssertionError, lambda: calcTrajectory(structure, coord[3:]))
+        self.assertRaises(AssertionError, lambda: calcTrajectory(structure, []))
+        self.assertRaises(AssertionError, lambda: calcTrajectory(Structure(), coord))
 
     def testSelectArea(self):
         structure = Structure("lib/tests/data/1ubq.pdb")
@@ -325,6 +842,671 @@ class FreeSASATestCase(unittest.TestCase):
         self.assertTrue(math.fabs(selections['s1'] - 118.35) < 0.1)
         self.assertTrue(math.fabs(selections['s2'] - 50.77) < 0.1)
 
+    def testSelection(self):
+        structure = Structure("lib/tests/data/1ubq.pdb")
+        result = calc(structure,Parameters({'algorithm' : ShrakeRupley}))
+        commands = ('s1, resn ala', 's2, resi 1', 's3, chain A and resi 1-5',
+                    's4, symbol O+N and not resi 10-', 's5, name CA or resn gly+arg',
+                    's6, resi -3', 's7, resn xyz')
+        reference = selectArea(commands, structure, result)
+
+        selections = [Selection(c) for c in commands]
+        self.assertEqual([s.name() for s in selections], ['s1', 's2', 's3', 's4', 's5', 's6', 's7'])
+        self.assertEqual(selections[0].command(), commands[0])
+        for s in selections:
+            self.assertAlmostEqual(s.area(structure, result), reference[s.name()])
+        self.assertEqual(selectArea(selections, structure, result), reference)
+
+        # atom indices, cached until atoms are added
+        atoms = selections[1].atoms(structure)
+        self.assertEqual(atoms.format, 'i')
+        self.assertEqual(list(atoms), [i for i in range(structure.nAtoms())
+                                       if structure.residueNumber(i).strip() == '1'])
+        self.assertTrue(structure._selectionIndices(selections[1]) is structure._selectionIndices(selections[1]))
+        self.assertEqual(len(selections[6].atoms(structure)), 0)
+        s = Structure()
+        s.addAtom(' CA ', 'ALA', '1', 'A', 0, 0, 0)
+        self.assertEqual(list(selections[0].atoms(s)), [0])
+        s.addAtom(' CB ', 'ALA', '1', 'A', 1, 1, 1)
+        self.assertEqual(list(selections[0].atoms(s)), [0, 1])
+
+        # many results and trajectories
+        results = [result, calc(structure)]
+        areas = selections[0].areas(structure, results)
+        self.assertEqual(list(areas), [selections[0].area(structure, r) for r in results])
+        frames = array('d', bytes(structure.coords())) * 2
+        atom_areas, residue_areas = calcTrajectory(structure, frames)
+        areas = selections[0].areas(structure, atom_areas)
+        self.assertEqual(len(areas), 2)
+        self.assertAlmostEqual(areas[0], selections[0].area(structure, calc(structure)))
+        self.assertRaises(AssertionError, lambda: selections[0].areas(structure, array('d', [1, 2, 3])))
+
+        self.assertRaises(Exception, lambda: Selection("s1, foo ala"))
+        self.assertRaises(Exception, lambda: Selection(""))
+
+    def testSelectionSameAsC(self):
+        # Selection evaluates the parsed expression itself, it should
+        # select the same atoms as selectArea() does in C for commands
+        commands = ('s1, resn ala', 's2, resn ALA+gly+xyz', 's3, name CA+CB',
+                    's4, name ca and not resn gly', 's5, symbol C', 's6, symbol O+N+S',
+                    's7, symbol se', 's8, resi 1', 's9, resi 1-10', 's10, resi 10-',
+                    's11, resi -10', 's12, resi 2-1', 's13, resi 5+7+12-15',
+                    's14, resi -5-3', 's15, resi 12A+3B', 's16, resi 1A-3',
+                    's17, chain A', 's18, chain A-B', 's19, chain b+C',
+                    's20, chain A-Z and not chain B', 's21, chain 1-3', 's22, chain AB',
+                    's23, resn xyz', 's24, name ABCDE', 's25, resn ABCD',
+                    's26, not resn ala and (resi 1-20 or chain B)',
+                    's27, (resn ala or resn gly) and not (name CA or symbol O)',
+                    's28, not not resi 3-8', 's29, resi 1-5 and resi 3-8 or resn lys')
+
+        structure = Structure()
+        for i, (name, residueName, residueNumber, chain) in \
+            enumerate([(' N  ', 'ALA', '   1', 'A'), (' CA ', 'ALA', '   1', 'A'),
+                       (' CB ', 'ALA', '  1A', 'A'), (' O  ', 'GLY', '   2', 'A'),
+                       (' SG ', 'CYS', '  3B', 'B'), (' CA ', 'LYS', '  -4', 'B'),
+                       (' N  ', 'LYS', '  12', 'C'), (' CA ', 'GLY', '  13', '2')]):
+            structure.addAtom(name, residueName, residueNumber, chain, 1.5*i, 0.5*i, 0)
+        structures = [structure]
+        for fileName in ("lib/tests/data/1ubq.pdb", "lib/tests/data/2jo4.pdb",
+                         "lib/tests/data/1d3z.pdb"):
+            structures.append(Structure(fileName))
+        structures.append(structureArray("lib/tests/data/2jo4.pdb", {'separate-chains' : True})[1])
+
+        verbosity = getVerbosity()
+        setVerbosity(silent)
+        try:
+            for structure in structures:
+                result = calc(structure)
+                for command in commands + ('s30, resi 1-2-3', 's31, name 1-3', 's32, resn'):
+                    try:
+                        reference = selectArea([command], structure, result)
+                    except Exception:
+                        # fails in both, when parsed or when applied
+                        self.assertRaises(Exception,
+                                          lambda: selectArea([Selection(command)], structure, result))
+                        continue
+                    area = selectArea([Selection(command)], structure, result)
+                    self.assertEqual(list(area.keys()), list(reference.keys()))
+                    self.assertAlmostEqual(list(area.values())[0], list(reference.values())[0],
+                                           places=8, msg=command)
+        finally:
+            setVerbosity(verbosity)
+
+    def testIncremental(self):
+        for algorithm in (ShrakeRupley, LeeRichards):
+            parameters = Parameters({'algorithm' : algorithm})
+            structure = Structure("lib/tests/data/1ubq.pdb")
+            result = calc(structure, parameters, incremental=True)
+
+            def assertSameAsCalc():
+                reference = calc(structure, parameters)
+                self.assertEqual(list(result.atomAreas()), list(reference.atomAreas()))
+                self.assertAlmostEqual(result.totalArea(), reference.totalArea())
+                columns, reference_columns = result.residueAreaColumns(), reference.residueAreaColumns()
+                for key, column in reference_columns.items():
+                    if isinstance(column, tuple):
+                        self.assertEqual(columns[key], column)
+                    else:
+                        # compared as bytes, relative areas can be NaN
+                        self.assertEqual(bytes(columns[key]), bytes(column))
+                self.assertEqual(classifyResults(result, structure), classifyResults(reference, structure))
+
+            # nothing changed
+            self.assertEqual(len(result.update(structure)), 0)
+
+            # move a few atoms
+            coords = array('d', bytes(structure.coords()))
+            for i in (0, 100, 101, 400):
+                coords[3*i] += 1.5
+                coords[3*i + 2] -= 0.5
+            structure.setCoords(coords)
+            atoms = result.update(structure)
+            self.assertEqual(atoms.format, 'i')
+            self.assertTrue(0 < len(atoms) < structure.nAtoms())
+            self.assertTrue(set((0, 100, 101, 400)) <= set(atoms))
+            assertSameAsCalc()
+
+            # change a radius
+            structure.setRadius(200, structure.radius(200) + 0.5)
+            self.assertTrue(200 in result.update(structure))
+            assertSameAsCalc()
+
+            # add an atom
+            structure.addAtom(' OXT', 'GLY', ' 76', 'A', coords[0], coords[1], coords[2] + 2)
+            self.assertTrue(structure.nAtoms() - 1 in result.update(structure))
+            assertSameAsCalc()
+
+            # results can't grow while their areas are in use
+            areas = result.atomAreas()
+            structure.addAtom(' CA ', 'ALA', ' 77', 'A', coords[300], coords[301] + 3, coords[302])
+            self.assertRaises(BufferError, lambda: result.update(structure))
+            del areas
+            result.update(structure)
+            assertSameAsCalc()
+
+        self.assertRaises(AssertionError, lambda: calc(structure).update(structure))
+
+    def testPickle(self):
+        def assertSameStructure(s1, s2):
+            self.assertEqual(s1.nAtoms(), s2.nAtoms())
+            for column in ('coords', 'radii', 'atomNames', 'residueNames', 'residueNumbers', 'chainLabels'):
+                self.assertEqual(bytes(getattr(s1, column)()), bytes(getattr(s2, column)()))
+
+        config = b"name: test\ntypes:\nC 1.8 apolar\nO 1.5 polar\nN 1.6 polar\natoms:\nANY C C\nANY CA C\nANY O O\nANY N N\n"
+        for classifier in (None, Classifier.getStandardClassifier('naccess'),
+                           Classifier(memoryview(config)), DerivedClassifier()):
+            structure = Structure("lib/tests/data/1ubq.pdb", classifier)
+            copy = pickle.loads(pickle.dumps(structure))
+            assertSameStructure(structure, copy)
+            result = calc(structure)
+            self.assertEqual(calc(copy).totalArea(), result.totalArea())
+            self.assertEqual(classifyResults(result, structure, classifier),
+                             classifyResults(calc(copy), copy, classifier))
+
+            result_copy = pickle.loads(pickle.dumps(result))
+            self.assertEqual(result_copy.totalArea(), result.totalArea())
+            self.assertEqual(bytes(result_copy.atomAreas()), bytes(result.atomAreas()))
+            columns = result_copy.residueAreaColumns()
+            for key, column in result.residueAreaColumns().items():
+                if isinstance(column, tuple):
+                    self.assertEqual(columns[key], column)
+                else:
+                    self.assertEqual(bytes(columns[key]), bytes(column))
+
+        classifier = pickle.loads(pickle.dumps(Classifier(memoryview(config))))
+        self.assertEqual(classifier.radius("ALA", "CA"), 1.8)
+        self.assertEqual(pickle.loads(pickle.dumps(Classifier.getStandardClassifier('oons'))).radius("ALA", "CB"),
+                         Classifier.getStandardClassifier('oons').radius("ALA", "CB"))
+        self.assertTrue(pickle.loads(pickle.dumps(DerivedClassifier())).purePython)
+
+        parameters = pickle.loads(pickle.dumps(Parameters({'algorithm' : ShrakeRupley, 'n-points' : 200, 'probe-radius' : 1.2})))
+        self.assertEqual((parameters.algorithm(), parameters.nPoints(), parameters.probeRadius()),
+                         (ShrakeRupley, 200, 1.2))
+        self.assertEqual(pickle.loads(pickle.dumps(Selection("s1, resn ala"))).command(), "s1, resn ala")
+
+        # results without structure
+        result = calcCoord([0, 0, 0, 2, 2, 2], [1.5, 1.5])
+        self.assertEqual(pickle.loads(pickle.dumps(result)).totalArea(), result.totalArea())
+
+        # empty structures
+        self.assertEqual(pickle.loads(pickle.dumps(Structure())).nAtoms(), 0)
+
+        # element symbols from the PDB file are kept, not guessed from the atom name again
+        pdb = b"HETATM    1  CA   CA A   1       0.000   0.000   0.000  1.00  0.00          CA\n" \
+              b"ATOM      2  CA  ALA A   2       1.500   0.000   0.000  1.00  0.00           C\n"
+        verbosity = getVerbosity()
+        setVerbosity(silent)
+        structure = Structure(memoryview(pdb), None, {'hetatm' : True})
+        setVerbosity(verbosity)
+        calcium = Selection("calcium, symbol ca")
+        self.assertEqual(list(calcium.atoms(structure)), [0])
+        self.assertEqual(list(calcium.atoms(pickle.loads(pickle.dumps(structure)))), [0])
+
+        # shared memory
+        structure = Structure("lib/tests/data/1ubq.pdb")
+        try:
+            shared = Shared(structure)
+        except ImportError:
+            print("Can't test shared memory")
+            return
+        with shared:
+            handle = pickle.loads(pickle.dumps(shared))
+            self.assertTrue(len(pickle.dumps(shared)) < 1000)
+            assertSameStructure(handle.get(), structure)
+            assertSameStructure(shared.get(), structure)
+        self.assertRaises(FileNotFoundError, handle.get)
+        with Shared(calc(structure)) as shared:
+            result = pickle.loads(pickle.dumps(shared)).get()
+            self.assertEqual(result.totalArea(), calc(structure).totalArea())
+            self.assertEqual(len(result.residueAreas()['A']), len(calc(structure).residueAreas()['A']))
+        self.assertRaises(TypeError, lambda: Shared(Parameters()))
+
+    def testForTolerance(self):
+        s = Structure("lib/tests/data/1ubq.pdb")
+        reference = calc(s, Parameters({'n-slices' : 1000}))
+
+        for level in ('total', 'residue'):
+            previous = None
+            for tolerance in (1e-2, 1e-3, 3e-4) if level == 'total' else (2, 0.5, 0.1):
+                p = Parameters.forTolerance(tolerance, s, level)
+                error = p.estimatedError(s)
+                self.assertTrue(error[level] <= tolerance)
+                result = calc(s, p)
+                self.assertEqual(result.estimatedError(), error)
+                if level == 'total':
+                    self.assertTrue(math.fabs(result.totalArea() - reference.totalArea())
+                                    <= tolerance * reference.totalArea())
+                if previous is not None:
+                    self.assertTrue(error[level] < previous[level])
+                previous = error
+
+        # larger structures need lower resolution for the same relative error
+        small = Parameters.forTolerance(1e-3, 500)
+        large = Parameters.forTolerance(1e-3, 500000)
+        self.assertTrue(large.estimatedError(500000)['total'] <= 1e-3)
+        self.assertTrue(small.estimatedError(500000)['total'] < small.estimatedError(500)['total'])
+
+        # unreachable targets give the most accurate parameters
+        p = Parameters.forTolerance(1e-9, s)
+        self.assertTrue(p.estimatedError(s)['total'] > 1e-9)
+
+        # a tighter tolerance never gives a larger error or, for the
+        # same algorithm, a lower resolution
+        for n in (500, 5000, 50000, 500000, 5000000):
+            for level, tolerances in (('total', (1e-2, 3e-3, 1e-3, 3e-4, 1e-4, 3e-5)),
+                                      ('residue', (5, 2, 1, 0.5, 0.2, 0.1, 0.05))):
+                previous = None
+                for tolerance in tolerances:
+                    p = Parameters.forTolerance(tolerance, n, level)
+                    resolution = p.nSlices() if p.algorithm() == LeeRichards else p.nPoints()
+                    error = p.estimatedError(n)[level]
+                    if previous is not None:
+                        self.assertTrue(error <= previous[2], (n, level, tolerance))
+                        if p.algorithm() == previous[0]:
+                            self.assertTrue(resolution >= previous[1], (n, level, tolerance))
+                    previous = (p.algorithm(), resolution, error)
+
+        # the estimate is for the default probe radius
+        p = Parameters.forTolerance(1e-3, s, param={'probe-radius' : 1.2})
+        self.assertEqual(p.probeRadius(), 1.2)
+        self.assertIsNone(p.estimatedError(s))
+        p = Parameters.forTolerance(1e-3, s, param={'probe-radius' : Parameters().probeRadius()})
+        self.assertIsNotNone(p.estimatedError(s))
+        self.assertEqual(pickle.loads(pickle.dumps(p)).estimatedError(s), p.estimatedError(s))
+        self.assertEqual(pickle.loads(pickle.dumps(calc(s, p))).estimatedError(), p.estimatedError(s))
+        p.setNSlices(10)
+        self.assertIsNone(p.estimatedError(s))
+        self.assertIsNone(calc(s, p).estimatedError())
+        self.assertIsNone(calc(s).estimatedError())
+
+        self.assertRaises(AssertionError, lambda: Parameters.forTolerance(0, s))
+        self.assertRaises(AssertionError, lambda: Parameters.forTolerance(1e-3, s, 'atom'))
+        self.assertRaises(AssertionError, lambda: Parameters.forTolerance(1e-3, s, param={'n-slices' : 10}))
+
+    def testInterface(self):
+        fileName = "lib/tests/data/2jo4.pdb"
+        s = Structure(fileName)
+        chains = [s.chainLabel(i) for i in range(s.nAtoms())]
+
+        for algorithm in (LeeRichards, ShrakeRupley):
+            p = Parameters({'algorithm' : algorithm})
+            areas = calcInterface(s, 'A+B+C', p)
+            self.assertEqual(sorted(areas), [('A', 'B'), ('A', 'C'), ('B', 'C')])
+
+            # same areas as separate calculations for each group
+            def groupAreas(group):
+                result = calc(structureArray(fileName, {'chain-groups' : group})[-1], p)
+                atoms = [i for i in range(s.nAtoms()) if chains[i] in group]
+                return dict(zip(atoms, result.atomAreas()))
+            isolated = {}
+            for group in ('A', 'B', 'C'):
+                isolated.update(groupAreas(group))
+
+            for (a, b), area in areas.items():
+                self.assertEqual(area.groups, (a, b))
+                pair = groupAreas(a + b)
+                for i in range(s.nAtoms()):
+                    self.assertAlmostEqual(area.atomAreas[i], isolated[i] - pair[i] if i in pair else 0)
+                self.assertAlmostEqual(area.total, sum(area.atomAreas))
+                self.assertAlmostEqual(area.total, area.groupAreas[a] + area.groupAreas[b])
+                residueTotal = sum([sum(residues.values()) for residues in area.residueAreas.values()])
+                self.assertAlmostEqual(area.total, residueTotal)
+                self.assertTrue(set(area.residueAreas) <= set(a + b))
+            self.assertTrue(max([area.total for area in areas.values()]) > 0)
+
+        # a list of groups, chains that aren't in a group are ignored
+        areas = calcInterface(s, ['AB', 'C'])
+        self.assertEqual(list(areas), [('AB', 'C')])
+        self.assertEqual(areas['AB', 'C'].total, calcInterface(s, 'AB+C')['AB', 'C'].total)
+
+        self.assertRaises(AssertionError, lambda: calcInterface(s, 'AB'))
+        self.assertRaises(AssertionError, lambda: calcInterface(s, 'AB+X'))
+        self.assertRaises(AssertionError, lambda: calcInterface(s, 'AB+BC'))
+        self.assertRaises(AssertionError, lambda: calcInterface(s, ['AB', '']))
+
+    def testTiled(self):
+        s = Structure("lib/tests/data/1ubq.pdb")
+        n = s.nAtoms()
+
+        for algorithm in (LeeRichards, ShrakeRupley):
+            p = Parameters({'algorithm' : algorithm})
+            reference = list(calc(s, p).atomAreas())
+            # small tiles, one tile, threads and processes
+            for maxMemory, workers, processes in ((100*4096, 1, False), (2**30, 1, False),
+                                                  (200*4096, 3, False), (200*4096, 2, True)):
+                areas = calcTiled(s, p, maxMemory=maxMemory, workers=workers, processes=processes)
+                self.assertEqual(len(areas), n)
+                for i in range(n):
+                    self.assertAlmostEqual(areas[i], reference[i])
+
+        # preallocated output, as doubles or bytes
+        reference = calc(s).atomAreas()
+        out = array('d', [0]) * n
+        self.assertTrue(calcTiled(s, maxMemory=100*4096, out=out) is out)
+        self.assertEqual(list(out), list(reference))
+        out = bytearray(8 * n)
+        calcTiled(s, maxMemory=100*4096, out=out)
+        self.assertEqual(list(memoryview(out).cast('d')), list(reference))
+
+        self.assertRaises(AssertionError, lambda: calcTiled(s, out=array('d', [0]) * (n - 1)))
+        self.assertRaises(AssertionError, lambda: calcTiled(s, maxMemory=0))
+        self.assertRaises(AssertionError, lambda: calcTiled(s, workers=0))
+        self.assertRaises(AssertionError, lambda: calcTiled(Structure()))
+
+    def testAio(self):
+        s = Structure("lib/tests/data/1ubq.pdb")
+        reference = calc(s)
+
+        async def calculations():
+            structure = await aio.loadStructure("lib/tests/data/1ubq.pdb")
+            result = await aio.calc(structure)
+            self.assertEqual(result.totalArea(), reference.totalArea())
+            residues = await aio.residueAreas(result)
+            self.assertEqual(list(residues['A']), list(reference.residueAreas()['A']))
+            for number, area in residues['A'].items():
+                self.assertEqual(area.total, reference.residueAreas()['A'][number].total)
+            self.assertEqual(await aio.classifyResults(result, structure), classifyResults(reference, s))
+            self.assertEqual(await aio.selectArea(['a, resn ala'], structure, result),
+                             selectArea(['a, resn ala'], s, reference))
+            result = await aio.calcCoord([1, 2, 3, 2, 2, 3], [2, 2])
+            self.assertEqual(result.totalArea(), calcCoord([1, 2, 3, 2, 2, 3], [2, 2]).totalArea())
+            with self.assertRaises(IOError):
+                await aio.loadStructure("xyz#$%")
+        asyncio.run(calculations())
+
+        # at most two calculations in progress at a time
+        in_flight = [0, 0]
+        lock = threading.Lock()
+        def work():
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+            return True
+        async def bounded():
+            return await asyncio.gather(*[aio.run(work) for i in range(6)])
+        aio.setMaxInFlight(2)
+        try:
+            self.assertEqual(aio.getMaxInFlight(), 2)
+            self.assertEqual(asyncio.run(bounded()), [True] * 6)
+            self.assertEqual(in_flight[1], 2)
+
+            # timeouts, and work that is cancelled before it starts isn't done
+            started = []
+            async def cancelled():
+                with self.assertRaises(asyncio.TimeoutError):
+                    await aio.run(time.sleep, 0.2, timeout=0.01)
+                busy = [asyncio.ensure_future(aio.run(time.sleep, 0.1)) for i in range(2)]
+                waiting = asyncio.ensure_future(aio.run(started.append, 1))
+                await asyncio.sleep(0.01)
+                waiting.cancel()
+                await asyncio.gather(*busy)
+                with self.assertRaises(asyncio.CancelledError):
+                    await waiting
+            asyncio.run(cancelled())
+            self.assertEqual(started, [])
+
+            # the timeout includes waiting for a free slot
+            async def saturated():
+                busy = [asyncio.ensure_future(aio.run(time.sleep, 1)) for i in range(2)]
+                await asyncio.sleep(0.01)
+                start = time.time()
+                with self.assertRaises(asyncio.TimeoutError):
+                    await aio.run(time.sleep, 0, timeout=0.2)
+                self.assertTrue(time.time() - start < 0.9)
+                await asyncio.gather(*busy)
+            asyncio.run(saturated())
+        finally:
+            aio.setMaxInFlight(None)
+        self.assertRaises(AssertionError, lambda: aio.setMaxInFlight(0))
+
+    def testColumns(self):
+        directory = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(directory, 'areas.npz')
+            # narrow names first, so that spilled chunks are padded
+            small = Structure()
+            small.addAtom('C', 'ALA', '1', 'A', 0, 0, 0)
+            small.addAtom('N', 'ALA', '1', 'A', 1, 0, 0)
+            structures = [small, Structure("lib/tests/data/1ubq.pdb"), Structure("lib/tests/data/2jo4.pdb")]
+            results = [calc(structure) for structure in structures]
+            with ColumnWriter(fileName, chunkSize=1000) as writer:
+                for i, result in enumerate(results):
+                    writer.add(result, None if i == 0 else "s%d" % i)
+            self.assertEqual(os.listdir(directory), ['areas.npz'])
+            self.assertRaises(AssertionError, lambda: writer.add(results[0]))
+
+            columns = readColumns(fileName)
+            self.assertEqual(sorted(columns), ['atoms', 'residues', 'structures'])
+            def strings(column):
+                width = column.itemsize
+                data = column.tobytes()
+                return [data[i*width:(i+1)*width].rstrip(b'\0').decode() for i in range(len(column))]
+
+            structureTable = columns['structures']
+            self.assertEqual(strings(structureTable['name']), ['0', 's1', 's2'])
+            self.assertEqual(structureTable['nAtoms'].tolist(), [s.nAtoms() for s in structures])
+            self.assertEqual(structureTable['totalArea'].tolist(), [r.totalArea() for r in results])
+
+            atoms = columns['atoms']
+            n = sum([s.nAtoms() for s in structures])
+            for column in atoms.values():
+                self.assertEqual(len(column), n)
+            self.assertEqual(atoms['area'].tolist(), sum([list(r.atomAreas()) for r in results], []))
+            self.assertEqual(atoms['radius'].tolist(), sum([list(s.radii()) for s in structures], []))
+            self.assertEqual(strings(atoms['atomName']),
+                             [s.atomName(i) for s in structures for i in range(s.nAtoms())])
+            self.assertEqual(atoms['structure'].tolist(),
+                             sum([[k] * s.nAtoms() for k, s in enumerate(structures)], []))
+
+            residues = columns['residues']
+            first = structureTable['firstResidue'].tolist()
+            for k, result in enumerate(results):
+                expected = result.residueAreaColumns()
+                rows = slice(first[k], first[k] + structureTable['nResidues'][k])
+                self.assertEqual(strings(residues['residueType'][rows]), list(expected['residueType']))
+                self.assertEqual(strings(residues['residueNumber'][rows]), list(expected['residueNumber']))
+                self.assertEqual(residues['total'][rows].tolist(), expected['total'].tolist())
+                self.assertEqual(residues['hasRelativeAreas'][rows].tolist(),
+                                 expected['hasRelativeAreas'].tolist())
+
+            try:
+                import numpy
+            except ImportError:
+                print("Can't import numpy, tests skipped")
+            else:
+                with numpy.load(fileName) as data:
+                    self.assertEqual(data['atoms.area'].tolist(), atoms['area'].tolist())
+                    self.assertEqual(data['atoms.atomName'].dtype, numpy.dtype('S4'))
+                    self.assertEqual(data['residues.hasRelativeAreas'].dtype, numpy.dtype('bool'))
+                self.assertTrue(numpy.asarray(atoms['area']).flags['ALIGNED'])
+
+            # nothing is written if the block fails
+            with self.assertRaises(TypeError):
+                with ColumnWriter(os.path.join(directory, 'failed.npz')) as writer:
+                    writer.add(results[0])
+                    writer.add(calcCoord([1, 2, 3], [2]).totalArea())
+            self.assertEqual(os.listdir(directory), ['areas.npz'])
+            self.assertRaises(AssertionError, lambda: ColumnWriter(fileName, chunkSize=0))
+            del columns, atoms, residues, structureTable
+        finally:
+            shutil.rmtree(directory)
+
+    def testCache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            s = Structure("lib/tests/data/1ubq.pdb")
+            cache = Cache(directory)
+            self.assertIsNone(cache.get(s))
+            result = calc(s)
+            cache.put(s, None, result)
+            cached = cache.get(s)
+            self.assertEqual(cached.totalArea(), result.totalArea())
+            self.assertEqual(bytes(cached.atomAreas()), bytes(result.atomAreas()))
+            self.assertEqual(cached.residueAreaColumns()['total'].tobytes(),
+                             result.residueAreaColumns()['total'].tobytes())
+            self.assertEqual(cache.cacheInfo()['hits'], 1)
+            self.assertEqual(cache.cacheInfo()['misses'], 1)
+            self.assertEqual(cache.cacheInfo()['entries'], 1)
+
+            # the key depends on everything that changes the areas
+            # or the residue summary, but not on the number of threads
+            keys = set([cache.key(s), cache.key(s, Parameters({'probe-radius' : 1.2})),
+                        cache.key(s, Parameters({'n-slices' : 10})),
+                        cache.key(s, Parameters({'algorithm' : ShrakeRupley})),
+                        cache.key(Structure("lib/tests/data/1ubq.pdb",
+                                            Classifier.getStandardClassifier('naccess')))])
+            self.assertEqual(len(keys), 5)
+            self.assertEqual(cache.key(s), cache.key(s, Parameters({'n-points' : 10, 'n-threads' : 2})))
+            self.assertEqual(cache.key(s), cache.key(Structure("lib/tests/data/1ubq.pdb")))
+            s2 = Structure("lib/tests/data/1ubq.pdb")
+            s2.setRadii([2] * s2.nAtoms())
+            self.assertNotEqual(cache.key(s), cache.key(s2))
+
+            # calc() uses the cache once set
+            setCache(cache)
+            try:
+                self.assertIs(getCache(), cache)
+                p = Parameters({'n-slices' : 10})
+                result = calc(s, p)
+                self.assertEqual(cache.cacheInfo()['entries'], 2)
+                cached = calc(s, p, incremental=True, tree=True)
+                self.assertEqual(cache.cacheInfo()['hits'], 2)
+                self.assertEqual(bytes(cached.atomAreas()), bytes(result.atomAreas()))
+                self.assertEqual(cached.update(s).tolist(), [])
+
+                # unreadable entries are misses
+                with open(cache._path(cache.key(s, p)), 'wb') as f:
+                    f.write(b'not a result')
+                self.assertEqual(bytes(calc(s, p).atomAreas()), bytes(result.atomAreas()))
+                self.assertEqual(cache.cacheInfo()['misses'], 3)
+            finally:
+                setCache(None)
+            self.assertIsNone(getCache())
+
+            # the least recently used entries are evicted
+            entrySize = cache.cacheInfo()['size'] // 2
+            cache = pickle.loads(pickle.dumps(Cache(directory, maxSize=int(2.5 * entrySize))))
+            cache.get(s)
+            os.utime(cache._path(cache.key(s, p)), (0, 0))
+            cache.put(s, Parameters({'n-slices' : 30}), result)
+            self.assertEqual(cache.cacheInfo()['entries'], 2)
+            self.assertIsNone(cache.get(s, p))
+            self.assertIsNotNone(cache.get(s))
+
+            # replacing an entry doesn't count twice
+            cache.clear()
+            cache.put(s, None, result)
+            cache.put(s, p, result)
+            for i in range(3):
+                cache.put(s, p, result)
+            self.assertEqual(cache.cacheInfo()['entries'], 2)
+
+            # caches sharing a directory evict each other's entries
+            cache.clear()
+            caches = [Cache(directory, maxSize=int(3.5 * entrySize)) for i in range(3)]
+            for n in range(10, 30):
+                caches[n % 3].put(s, Parameters({'n-slices' : n}), result)
+                self.assertTrue(cache.cacheInfo()['size'] <= caches[0].maxSize)
+
+            cache.clear()
+            self.assertEqual(cache.cacheInfo(), {'hits' : 0, 'misses' : 0, 'entries' : 0,
+                                                 'size' : 0, 'maxSize' : cache.maxSize})
+            self.assertRaises(AssertionError, lambda: Cache(directory, maxSize=0))
+            self.assertRaises(AssertionError, lambda: setCache(directory))
+        finally:
+            shutil.rmtree(directory)
+
+    def testTree(self):
+        s = Structure("lib/tests/data/1ubq.pdb")
+        lazy, direct = calc(s, tree=False), calc(s)
+        self.assertEqual(lazy.residueAreaColumns()['total'].tobytes(),
+                         direct.residueAreaColumns()['total'].tobytes())
+        number = list(direct.residueAreas()['A'])[0]
+        self.assertEqual(lazy.residueAreas()['A'][number].total, direct.residueAreas()['A'][number].total)
+
+        # the result keeps the structure alive
+        result = calc(Structure("lib/tests/data/1ubq.pdb"), tree=False)
+        self.assertEqual(result.residueAreas()['A'][number].total, direct.residueAreas()['A'][number].total)
+
+        # the lazy tree can't be built once the structure has changed
+        for change in (lambda s: s.addAtom(' CA ', 'ALA', '   1', 'B', 0, 0, 0),
+                       lambda s: s.setRadius(0, s.radius(0) + 1),
+                       lambda s: s.setRadii(array('d', bytes(s.radii()))),
+                       lambda s: s.setCoords(array('d', bytes(s.coords())))):
+            s = Structure("lib/tests/data/1ubq.pdb")
+            lazy, direct = calc(s, tree=False), calc(s)
+            change(s)
+            self.assertRaises(AssertionError, lambda: lazy.residueAreas())
+            self.assertRaises(AssertionError, lambda: lazy.write_pdb(os.devnull))
+            self.assertEqual(len(direct.residueAreas()), 1)
+            self.assertEqual(direct.residueAreas()['A'][number].total,
+                             calc(Structure("lib/tests/data/1ubq.pdb")).residueAreas()['A'][number].total)
+            # a pickled lazy result has no structure to build the tree from
+            self.assertRaises(AssertionError, lambda: pickle.loads(pickle.dumps(lazy)).residueAreas())
+
+        # updated results can build the tree again
+        s = Structure("lib/tests/data/1ubq.pdb")
+        lazy = calc(s, incremental=True, tree=False)
+        s.setRadius(0, s.radius(0) + 1)
+        lazy.update(s)
+        self.assertAlmostEqual(lazy.residueAreas()['A'][number].total,
+                               calc(s).residueAreas()['A'][number].total)
+
+    def testStats(self):
+        s = Structure("lib/tests/data/1ubq.pdb")
+        self.assertIsNone(s.stats())
+        self.assertIsNone(calc(s).stats())
+        self.assertFalse(getStatsEnabled())
+
+        reported = []
+        setStatsEnabled(True)
+        setStatsCallback(lambda operation, stats: reported.append((operation, stats)))
+        try:
+            self.assertTrue(getStatsEnabled())
+            s = Structure("lib/tests/data/1ubq.pdb")
+            stats = s.stats()
+            self.assertEqual(stats['atoms'], s.nAtoms())
+            self.assertTrue(stats['parseTime'] >= 0)
+            self.assertTrue(stats['radiiTime'] >= 0)
+            self.assertEqual(reported, [('structure', stats)])
+
+            for algorithm, counter, n in ((LeeRichards, 'slices', 20), (ShrakeRupley, 'points', 100)):
+                result = calc(s, Parameters({'algorithm' : algorithm}), tree=False)
+                stats = result.stats()
+                self.assertEqual(stats['algorithm'], algorithm)
+                self.assertEqual(stats['atoms'], s.nAtoms())
+                self.assertEqual(stats['threads'], 1)
+                self.assertEqual(stats[counter], n * s.nAtoms())
+                self.assertTrue(stats['neighbourPairs'] > s.nAtoms())
+                for key in ('parseTime', 'radiiTime', 'neighbourTime', 'sasaTime'):
+                    self.assertTrue(stats[key] >= 0)
+                self.assertEqual(reported[-1], ('calc', stats))
+
+                # the tree is built when first used
+                self.assertFalse('treeTime' in stats)
+                result.residueAreas()
+                self.assertTrue(result.stats()['treeTime'] >= 0)
+                self.assertTrue(calc(s).stats()['treeTime'] >= 0)
+
+            # the two neighbour lists are the same
+            self.assertEqual(calc(s).stats()['neighbourPairs'], stats['neighbourPairs'])
+
+            structures = structureArray("lib/tests/data/2jo4.pdb",
+                                        {'separate-models' : True}, classifier=DerivedClassifier())
+            self.assertEqual(len(reported), 6 + len(structures))
+            for structure in structures:
+                self.assertEqual(structure.stats()['structures'], len(structures))
+                self.assertEqual(structure.stats()['atoms'], structure.nAtoms())
+
+            self.assertRaises(AssertionError, lambda: setStatsCallback(1))
+        finally:
+            setStatsEnabled(False)
+            setStatsCallback(None)
+        self.assertIsNone(calc(s).stats())
+
     def testBioPDB(self):
         try:
             from Bio.PDB import PDBParser
@@ -364,10 +1546,11 @@ class FreeSASATestCase(unittest.TestCase):
             self.assertTrue(math.fabs(residue_areas['L']['2'].total - 43.714) < 1e-2)
 
             faulthandler.enable()
-            result, sasa_classes = calcBioPDB(bp_structure, Parameters({'algorithm' : LeeRichards, 'n-slices' : 20}))
+            result, sasa_classes, residue_areas = calcBioPDB(bp_structure, Parameters({'algorithm' : LeeRichards, 'n-slices' : 20}))
             self.assertTrue(math.fabs(result.totalArea() - 18923.280586) < 1e-3)
             self.assertTrue(math.fabs(sasa_classes['Polar'] - 9143.066411) < 1e-3)
             self.assertTrue(math.fabs(sasa_classes['Apolar'] - 9780.2141746) < 1e-3)
+            self.assertTrue(math.fabs(residue_areas['L']['2'].total - 43.714) < 1e-2)
             residue_areas = result.residueAreas()
             self.assertTrue(math.fabs(residue_areas['L']['2'].total - 43.714) < 1e-2)
 
@@ -384,6 +1567,55 @@ class FreeSASATestCase(unittest.TestCase):
             fsfrombp = structureFromBioPDB(bp_structure, classifier, options)
             self.assertEqual(fs_structure.nAtoms(), fsfrombp.nAtoms())
 
+    def testBioPDBConversion(self):
+        try:
+            from Bio.PDB import PDBParser
+        except ImportError:
+            print("Can't import Bio.PDB, tests skipped")
+        else:
+            parser = PDBParser(QUIET=True)
+            bp_structure = parser.get_structure("1ubq", "lib/tests/data/1ubq.pdb")
+            parameters = Parameters({'algorithm' : ShrakeRupley})
+
+            for classifier in (None, Classifier.getStandardClassifier('naccess')):
+                s1 = structureFromBioPDB(bp_structure, classifier)
+                s2 = Structure("lib/tests/data/1ubq.pdb", classifier)
+                self.assertEqual(s1.nAtoms(), s2.nAtoms())
+                for i in range(s2.nAtoms()):
+                    self.assertEqual(s1.atomName(i), s2.atomName(i))
+                    self.assertEqual(s1.residueName(i), s2.residueName(i))
+                    self.assertEqual(s1.chainLabel(i), s2.chainLabel(i))
+                    self.assertIn(s1.residueNumber(i).strip(), s2.residueNumber(i))
+                    self.assertEqual(s1.radius(i), s2.radius(i))
+                    for a, b in zip(s1.coord(i), s2.coord(i)):
+                        self.assertTrue(math.fabs(a - b) < 1e-5)
+
+            # pure Python classifiers
+            s1 = structureFromBioPDB(bp_structure, DerivedClassifier())
+            self.assertEqual(s1.nAtoms(), s2.nAtoms())
+            self.assertEqual(s1.radius(0), 10)
+
+            class NoOxygenClassifier(DerivedClassifier):
+                def classify(self, residueName, atomName):
+                    return 'Unknown' if atomName.strip().startswith('O') else 'bla'
+
+            options = dict(Structure.defaultOptions)
+            options['skip-unknown'] = True
+            s1 = structureFromBioPDB(bp_structure, NoOxygenClassifier(), options)
+            n_oxygens = len([i for i in range(s2.nAtoms()) if s2.atomName(i).strip().startswith('O')])
+            self.assertEqual(s1.nAtoms(), s2.nAtoms() - n_oxygens)
+            options['halt-at-unknown'] = True
+            self.assertRaises(Exception, lambda: structureFromBioPDB(bp_structure, NoOxygenClassifier(), options))
+
+            # residue areas returned directly
+            s2 = Structure("lib/tests/data/1ubq.pdb")
+            result, sasa_classes, residue_areas = calcBioPDB(bp_structure, parameters)
+            self.assertAlmostEqual(result.totalArea(), calc(s2, parameters).totalArea())
+            self.assertEqual(sasa_classes, classifyResults(result, s2))
+            for chain in residue_areas:
+                for number, area in residue_areas[chain].items():
+                    self.assertEqual(area.total, result.residueAreas()[chain][number].total)
+
 if __name__ == '__main__':
     # make sure we're in the right directory (if script is called from
     # outside the directory)